@@ -137,12 +137,13 @@ class RackSerializer(CustomFieldModelSerializer):
     role = NestedRackRoleSerializer()
     type = ChoiceFieldSerializer(choices=RACK_TYPE_CHOICES)
     width = ChoiceFieldSerializer(choices=RACK_WIDTH_CHOICES)
+    utilization = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Rack
         fields = [
             'id', 'name', 'facility_id', 'display_name', 'site', 'group', 'tenant', 'role', 'type', 'width', 'u_height',
-            'desc_units', 'comments', 'custom_fields',
+            'desc_units', 'utilization', 'comments', 'custom_fields',
         ]
 
 
@@ -194,6 +195,14 @@ class NestedDeviceSerializer(serializers.ModelSerializer):
         fields = ['id', 'url', 'name', 'display_name']
 
 
+class AvailableSpaceRackSerializer(NestedRackSerializer):
+    site = NestedSiteSerializer()
+    available_units = serializers.ListField(child=serializers.IntegerField(), read_only=True)
+
+    class Meta(NestedRackSerializer.Meta):
+        fields = ['id', 'url', 'name', 'display_name', 'site', 'u_height', 'available_units']
+
+
 class RackUnitSerializer(serializers.Serializer):
     """
     A rack unit is an abstraction formed by the set (rack, position, face); it does not exist as a row in the database.
@@ -1,20 +1,24 @@
 from __future__ import unicode_literals
 from collections import OrderedDict
 
-from rest_framework.decorators import detail_route
+from rest_framework import status
+from rest_framework.decorators import detail_route, list_route
+from rest_framework.filters import DjangoFilterBackend, OrderingFilter
 from rest_framework.mixins import ListModelMixin
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet, ModelViewSet, ViewSet
 
 from django.conf import settings
-from django.http import HttpResponseBadRequest, HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
 from django.shortcuts import get_object_or_404
 
+from dcim.constants import RACK_FACE_FRONT, RACK_FACE_REAR
+from dcim.elevations import get_elevation_svg
 from dcim.models import (
     ConsolePort, ConsolePortTemplate, ConsoleServerPort, ConsoleServerPortTemplate, Device, DeviceBay,
     DeviceBayTemplate, DeviceRole, DeviceType, Interface, InterfaceConnection, InterfaceTemplate, Manufacturer,
     InventoryItem, Platform, PowerOutlet, PowerOutletTemplate, PowerPort, PowerPortTemplate, Rack, RackGroup,
-    RackReservation, RackRole, Region, Site,
+    RackReservation, RackRole, Region, Site, annotate_available_units,
 )
 from dcim import filters
 from extras.api.serializers import RenderedGraphSerializer
@@ -83,10 +87,12 @@ class RackRoleViewSet(ModelViewSet):
 #
 
 class RackViewSet(WritableSerializerMixin, CustomFieldModelViewSet):
-    queryset = Rack.objects.select_related('site', 'group__site', 'tenant')
+    queryset = Rack.objects.annotate_utilization().select_related('site', 'group__site', 'tenant')
     serializer_class = serializers.RackSerializer
     write_serializer_class = serializers.WritableRackSerializer
+    filter_backends = (DjangoFilterBackend, OrderingFilter)
     filter_class = filters.RackFilter
+    ordering_fields = ('name', 'facility_id', 'u_height', 'utilization')
 
     @detail_route()
     def units(self, request, pk=None):
@@ -108,6 +114,69 @@ class RackViewSet(WritableSerializerMixin, CustomFieldModelViewSet):
             rack_units = serializers.RackUnitSerializer(page, many=True, context={'request': request})
             return self.get_paginated_response(rack_units.data)
 
+    @detail_route()
+    def elevation(self, request, pk=None):
+        """
+        Render the given face of a rack (face, default 0) as an SVG image. Rendered images are cached until the rack,
+        its devices, or its reservations change.
+        """
+        rack = get_object_or_404(Rack, pk=pk)
+        face = request.query_params.get('face', str(RACK_FACE_FRONT))
+        if face not in (str(RACK_FACE_FRONT), str(RACK_FACE_REAR)):
+            return Response(
+                {
+                    "detail": "The face must be {} (front) or {} (rear).".format(RACK_FACE_FRONT, RACK_FACE_REAR)
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return HttpResponse(get_elevation_svg(rack, int(face)), content_type='image/svg+xml')
+
+    @list_route(url_path='available-space')
+    def available_space(self, request):
+        """
+        Find all racks within a site, group, or region with room for a device of the given height in units (height,
+        default 1) on the given face (omit face for a full depth device), along with the units at which it may be
+        installed. Any other rack filters may also be applied. The devices within all racks are retrieved with a single
+        query.
+        """
+        if not any(request.query_params.get(name) for name in (
+            'site_id', 'site', 'group_id', 'group', 'region_id', 'region'
+        )):
+            raise MissingFilterException(detail='Request must include a site, group, or region filter.')
+
+        try:
+            height = int(request.query_params.get('height', 1))
+        except ValueError:
+            height = 0
+        if height < 1:
+            return Response(
+                {
+                    "detail": "The height must be a positive integer."
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        face = request.query_params.get('face')
+        if face not in (None, str(RACK_FACE_FRONT), str(RACK_FACE_REAR)):
+            return Response(
+                {
+                    "detail": "The face must be {} (front) or {} (rear).".format(RACK_FACE_FRONT, RACK_FACE_REAR)
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        racks = list(self.filter_queryset(Rack.objects.select_related('site')).filter(u_height__gte=height))
+        annotate_available_units(racks, height, int(face) if face is not None else None)
+        racks = [rack for rack in racks if rack.available_units]
+
+        page = self.paginate_queryset(racks)
+        if page is not None:
+            serializer = serializers.AvailableSpaceRackSerializer(page, many=True, context={'request': request})
+            return self.get_paginated_response(serializer.data)
+
+        serializer = serializers.AvailableSpaceRackSerializer(racks, many=True, context={'request': request})
+        return Response(serializer.data)
+
 
 #
 # Rack reservations
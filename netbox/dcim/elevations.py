@@ -0,0 +1,130 @@
+from __future__ import unicode_literals
+
+import hashlib
+
+from django.core.cache import cache
+from django.db import connection
+from django.utils.html import escape
+
+from .constants import RACK_FACE_FRONT
+
+
+# Dimensions (in pixels) of the rendered elevation
+UNIT_WIDTH = 230
+UNIT_HEIGHT = 22
+LEGEND_WIDTH = 30
+MARGIN = 5
+
+# Cached elevations expire after this many seconds, so that changes which do not alter the fingerprint of a Rack (e.g.
+# to the color of a DeviceRole) are eventually reflected
+ELEVATION_CACHE_TIMEOUT = 3600
+
+FINGERPRINT_SQL = """
+SELECT
+    (SELECT COUNT(*) FROM dcim_device WHERE rack_id = %(rack)s),
+    (SELECT MAX(last_updated) FROM dcim_device WHERE rack_id = %(rack)s),
+    (SELECT MD5(COALESCE(STRING_AGG(id || ':' || units::text || ':' || description, ',' ORDER BY id), ''))
+     FROM dcim_rackreservation WHERE rack_id = %(rack)s)
+"""
+
+
+def get_fingerprint(rack):
+    """
+    Return a string which changes whenever the Rack, any of its Devices, or any of its reservations is created,
+    modified, or deleted. Only aggregates of the Devices are retrieved (using a single query).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(FINGERPRINT_SQL, {'rack': rack.pk})
+        device_count, devices_updated, reservations = cursor.fetchone()
+    return '{}:{}:{}:{}:{}'.format(rack.last_updated, rack.u_height, device_count, devices_updated, reservations)
+
+
+def render_elevation(rack, face=RACK_FACE_FRONT):
+    """
+    Render the given face of a Rack as an SVG image. Devices mounted on the face are shown in the color of their role
+    and link to the Device; full depth Devices mounted on the opposite face are shown in grey. Reserved units are
+    shaded.
+    """
+    units = rack.get_rack_units(face=face, remove_redundant=True)
+    reserved_units = rack.get_reserved_units()
+    width = LEGEND_WIDTH + UNIT_WIDTH + 2 * MARGIN
+    height = rack.u_height * UNIT_HEIGHT + 2 * MARGIN
+
+    elements = []
+    y = MARGIN
+    for unit in units:
+        device = unit['device']
+        unit_count = device.device_type.u_height if device else 1
+        box_height = unit_count * UNIT_HEIGHT
+        x = MARGIN + LEGEND_WIDTH
+
+        # Label each unit occupied (from the top down)
+        for row in range(unit_count):
+            label = unit['id'] + row if rack.desc_units else unit['id'] + unit_count - 1 - row
+            elements.append('<text class="unit" x="{}" y="{}">{}</text>'.format(
+                MARGIN + LEGEND_WIDTH - 4, y + row * UNIT_HEIGHT + UNIT_HEIGHT / 2, label
+            ))
+
+        if device is None:
+            reservation = reserved_units.get(unit['id'])
+            if reservation:
+                elements.append(
+                    '<rect class="reserved" x="{}" y="{}" width="{}" height="{}"><title>{}</title></rect>'.format(
+                        x, y, UNIT_WIDTH, box_height, escape(reservation.description)
+                    )
+                )
+            else:
+                elements.append('<rect class="slot" x="{}" y="{}" width="{}" height="{}" />'.format(
+                    x, y, UNIT_WIDTH, box_height
+                ))
+        else:
+            name = device.name or str(device.device_role)
+            if device.face == face:
+                fill = '#{}'.format(device.device_role.color)
+                elements.append(
+                    '<a xlink:href="{}"><rect class="device" x="{}" y="{}" width="{}" height="{}" style="fill: {}">'
+                    '<title>{} ({} {}U)</title></rect>'
+                    '<text class="device" x="{}" y="{}">{}</text></a>'.format(
+                        device.get_absolute_url(), x, y, UNIT_WIDTH, box_height, fill,
+                        escape(device.device_role), escape(device.device_type.full_name), device.device_type.u_height,
+                        x + UNIT_WIDTH / 2, y + box_height / 2, escape(name)
+                    )
+                )
+            else:
+                elements.append(
+                    '<rect class="blocked" x="{}" y="{}" width="{}" height="{}" />'
+                    '<text class="blocked" x="{}" y="{}">{}</text>'.format(
+                        x, y, UNIT_WIDTH, box_height, x + UNIT_WIDTH / 2, y + box_height / 2, escape(name)
+                    )
+                )
+        y += box_height
+
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+        'width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+        '<style>'
+        'rect {{ stroke: #ffffff; stroke-width: 1px; }} '
+        'rect.slot {{ fill: #f7f7f7; }} '
+        'rect.reserved {{ fill: #f5deb3; }} '
+        'rect.blocked {{ fill: #e0e0e0; }} '
+        'text {{ font-family: sans-serif; font-size: 12px; dominant-baseline: middle; }} '
+        'text.unit {{ fill: #999999; text-anchor: end; }} '
+        'text.device, text.blocked {{ fill: #333333; text-anchor: middle; }}'
+        '</style>'
+        '{elements}'
+        '</svg>'
+    ).format(width=width, height=height, elements=''.join(elements))
+
+
+def get_elevation_svg(rack, face=RACK_FACE_FRONT):
+    """
+    Return the SVG elevation of the given face of a Rack, rendering it only if the Rack has changed since it was last
+    cached.
+    """
+    fingerprint = hashlib.md5(get_fingerprint(rack).encode('utf-8')).hexdigest()
+    key = 'dcim_rack_elevation_{}_{}_{}'.format(rack.pk, face, fingerprint)
+    svg = cache.get(key)
+    if svg is None:
+        svg = render_elevation(rack, face)
+        cache.set(key, svg, ELEVATION_CACHE_TIMEOUT)
+    return svg
@@ -115,6 +115,17 @@ class RackFilter(CustomFieldFilterSet, django_filters.FilterSet):
         label='Search',
     )
     facility_id = NullableCharFieldFilter()
+    region_id = django_filters.ModelMultipleChoiceFilter(
+        name='site__region',
+        queryset=Region.objects.all(),
+        label='Region (ID)',
+    )
+    region = django_filters.ModelMultipleChoiceFilter(
+        name='site__region__slug',
+        queryset=Region.objects.all(),
+        to_field_name='slug',
+        label='Region (slug)',
+    )
     site_id = django_filters.ModelMultipleChoiceFilter(
         queryset=Site.objects.all(),
         label='Site (ID)',
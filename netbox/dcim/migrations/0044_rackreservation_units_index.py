@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dcim', '0043_device_component_name_lengths'),
+    ]
+
+    operations = [
+        # A GIN index supports the overlap operator (&&) used to find reservations which conflict with a set of units
+        migrations.RunSQL(
+            sql='CREATE INDEX dcim_rackreservation_units_gin ON dcim_rackreservation USING GIN (units)',
+            reverse_sql='DROP INDEX dcim_rackreservation_units_gin',
+        ),
+    ]
@@ -3,16 +3,18 @@ from collections import OrderedDict
 from itertools import count, groupby
 
 from mptt.models import MPTTModel, TreeForeignKey
+from psycopg2.extras import NumericRange
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericRelation
-from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.fields import ArrayField, IntegerRangeField
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from django.db.models import Count, Q, ObjectDoesNotExist
+from django.db.models import Count, F, Func, Q, ObjectDoesNotExist
+from django.db.models.expressions import RawSQL
 from django.urls import reverse
 from django.utils.encoding import python_2_unicode_compatible
 
@@ -186,6 +188,20 @@ class RackManager(NaturalOrderByManager):
     def get_queryset(self):
         return self.natural_order_by('site__name', 'name')
 
+    def annotate_utilization(self):
+        """
+        Annotate each Rack with its utilization as a percentage, as returned by get_utilization(). The number of units
+        occupied by positioned Devices is counted within the database; units occupied by more than one Device (e.g.
+        half depth Devices mounted on opposite faces) are counted once.
+        """
+        return self.get_queryset().annotate(utilization=RawSQL(
+            "SELECT COUNT(DISTINCT u) * 100 / dcim_rack.u_height FROM dcim_device AS d "
+            "INNER JOIN dcim_devicetype AS dt ON dt.id = d.device_type_id "
+            "CROSS JOIN GENERATE_SERIES(d.position, d.position + dt.u_height - 1) AS u "
+            "WHERE d.rack_id = dcim_rack.id AND d.position >= 1 AND u <= dcim_rack.u_height",
+            [], output_field=models.IntegerField()
+        ))
+
 
 @python_2_unicode_compatible
 class Rack(CreatedUpdatedModel, CustomFieldModel):
@@ -295,24 +311,33 @@ class Rack(CreatedUpdatedModel, CustomFieldModel):
         :param remove_redundant: If True, rack units occupied by a device already listed will be omitted
         """
 
+        devices = []
+        if self.pk:
+            devices = Device.objects.for_elevation()\
+                .exclude(pk=exclude)\
+                .filter(rack=self, position__gt=0)\
+                .filter(Q(face=face) | Q(device_type__is_full_depth=True))
+
+        return self.build_rack_units(devices, face, remove_redundant)
+
+    def build_rack_units(self, devices, face=RACK_FACE_FRONT, remove_redundant=False):
+        """
+        Return a list of rack units as get_rack_units() does, populated with the given Devices (which must already be
+        limited to those racked on the given face or full depth).
+        """
         elevation = OrderedDict()
         for u in self.units:
             elevation[u] = {'id': u, 'name': 'U{}'.format(u), 'face': face, 'device': None}
 
         # Add devices to rack units list
-        if self.pk:
-            for device in Device.objects.select_related('device_type__manufacturer', 'device_role')\
-                    .annotate(devicebay_count=Count('device_bays'))\
-                    .exclude(pk=exclude)\
-                    .filter(rack=self, position__gt=0)\
-                    .filter(Q(face=face) | Q(device_type__is_full_depth=True)):
-                if remove_redundant:
-                    elevation[device.position]['device'] = device
-                    for u in range(device.position + 1, device.position + device.device_type.u_height):
-                        elevation.pop(u, None)
-                else:
-                    for u in range(device.position, device.position + device.device_type.u_height):
-                        elevation[u]['device'] = device
+        for device in devices:
+            if remove_redundant:
+                elevation[device.position]['device'] = device
+                for u in range(device.position + 1, device.position + device.device_type.u_height):
+                    elevation.pop(u, None)
+            else:
+                for u in range(device.position, device.position + device.device_type.u_height):
+                    elevation[u]['device'] = device
 
         return [u for u in elevation.values()]
 
@@ -334,28 +359,30 @@ class Rack(CreatedUpdatedModel, CustomFieldModel):
         """
 
         # Gather all devices which consume U space within the rack
-        devices = self.devices.select_related('device_type').filter(position__gte=1).exclude(pk__in=exclude)
+        devices = self.devices.filter(position__gte=1).exclude(pk__in=exclude).values_list(*OCCUPANCY_FIELDS)
 
-        # Initialize the rack unit skeleton
-        units = list(range(1, self.u_height + 1))
+        occupied = get_occupancy_bitmap(devices, rack_face)
+        return list(reversed(get_free_positions(occupied, self.u_height, u_height)))
 
-        # Remove units consumed by installed devices
-        for d in devices:
-            if rack_face is None or d.face == rack_face or d.device_type.is_full_depth:
-                for u in range(d.position, d.position + d.device_type.u_height):
-                    try:
-                        units.remove(u)
-                    except ValueError:
-                        # Found overlapping devices in the rack!
-                        pass
-
-        # Remove units without enough space above them to accommodate a device of the specified height
-        available_units = []
-        for u in units:
-            if set(range(u, u + u_height)).issubset(units):
-                available_units.append(u)
+    def get_conflicting_devices(self, position, u_height=1, rack_face=None, exclude=list()):
+        """
+        Return the devices within the rack which occupy any of the units required to install a device of the given U
+        height at the given position. The units occupied by each device are compared as integer ranges by a single
+        query.
 
-        return list(reversed(available_units))
+        :param position: The lowest unit to be occupied
+        :param u_height: Number of units to be occupied
+        :param rack_face: The face of the rack (front or rear) required; 'None' if device is full depth
+        :param exclude: List of devices IDs to exclude (useful when moving a device within a rack)
+        """
+        devices = self.devices.annotate(
+            unit_range=UnitRange(F('position'), F('position') + F('device_type__u_height'))
+        ).filter(
+            position__gte=1, unit_range__overlap=NumericRange(position, position + max(u_height, 1))
+        ).exclude(pk__in=exclude)
+        if rack_face is not None:
+            devices = devices.filter(Q(face=rack_face) | Q(device_type__is_full_depth=True))
+        return devices
 
     def get_reserved_units(self):
         """
@@ -375,7 +402,87 @@ class Rack(CreatedUpdatedModel, CustomFieldModel):
         Determine the utilization rate of the rack and return it as a percentage.
         """
         u_available = len(self.get_available_units())
-        return int(float(self.u_height - u_available) / self.u_height * 100)
+        return (self.u_height - u_available) * 100 // self.u_height
+
+
+class UnitRange(Func):
+    """
+    The units occupied by a device, expressed as a PostgreSQL int4range from its position (inclusive) to its position
+    plus its height (exclusive).
+    """
+    function = 'INT4RANGE'
+
+    def __init__(self, *expressions, **extra):
+        extra.setdefault('output_field', IntegerRangeField())
+        super(UnitRange, self).__init__(*expressions, **extra)
+
+
+# The fields of each Device needed to determine the units it occupies, as expected by get_occupancy_bitmap()
+OCCUPANCY_FIELDS = ('position', 'device_type__u_height', 'face', 'device_type__is_full_depth')
+
+
+def get_occupancy_bitmap(devices, rack_face=None):
+    """
+    Return a bitmap (as an integer) of the rack units occupied by the given devices, each represented as a tuple of
+    OCCUPANCY_FIELDS. Bit n is set if unit n + 1 is occupied. If a rack face is given, only devices mounted on that face
+    or which are full depth are counted.
+    """
+    occupied = 0
+    for position, u_height, face, is_full_depth in devices:
+        if rack_face is None or face == rack_face or is_full_depth:
+            occupied |= ((1 << u_height) - 1) << (position - 1)
+    return occupied
+
+
+def get_free_positions(occupied, rack_height, u_height=1):
+    """
+    Return the units (in ascending order) at which a device of the given height may be installed within a rack of the
+    given height, given the bitmap of its occupied units.
+    """
+    free = ~occupied & ((1 << rack_height) - 1)
+    # Bit n of fits remains set only if units n + 1 through n + u_height are all free
+    fits = free
+    for i in range(1, u_height):
+        fits &= free >> i
+    positions = []
+    while fits:
+        lowest = fits & -fits
+        positions.append(lowest.bit_length())
+        fits ^= lowest
+    return positions
+
+
+def annotate_available_units(racks, u_height=1, rack_face=None):
+    """
+    Assign to each of the given Racks the list of units available to accommodate a device of the given height (as
+    returned by get_available_units()) as available_units. The racked Devices of all Racks are retrieved with a single
+    query.
+    """
+    devices = {rack.pk: [] for rack in racks}
+    for device in Device.objects.filter(rack__in=list(devices), position__gte=1).values_list(
+        'rack_id', *OCCUPANCY_FIELDS
+    ):
+        devices[device[0]].append(device[1:])
+    for rack in racks:
+        occupied = get_occupancy_bitmap(devices[rack.pk], rack_face)
+        rack.available_units = list(reversed(get_free_positions(occupied, rack.u_height, u_height)))
+
+
+def annotate_rack_elevations(racks):
+    """
+    Assign to each of the given Racks its front and rear elevations (as returned by get_front_elevation() and
+    get_rear_elevation()) as front_elevation and rear_elevation. The racked Devices of all Racks are retrieved with a
+    single query.
+    """
+    devices = {rack.pk: [] for rack in racks}
+    for device in Device.objects.for_elevation().filter(rack__in=list(devices), position__gt=0):
+        devices[device.rack_id].append(device)
+    for rack in racks:
+        rack.front_elevation, rack.rear_elevation = [
+            rack.build_rack_units([
+                device for device in devices[rack.pk] if device.face == face or device.device_type.is_full_depth
+            ], face, remove_redundant=True) for face in (RACK_FACE_FRONT, RACK_FACE_REAR)
+        ]
 
 
 @python_2_unicode_compatible
@@ -409,10 +516,13 @@ class RackReservation(models.Model):
                     ),
                 })
 
-            # Check that none of the units has already been reserved for this Rack.
-            reserved_units = []
-            for resv in self.rack.reservations.exclude(pk=self.pk):
-                reserved_units += resv.units
+            # Check that none of the units has already been reserved for this Rack. Only overlapping reservations are
+            # retrieved.
+            reserved_units = set()
+            for units in self.rack.reservations.exclude(pk=self.pk).filter(units__overlap=self.units).values_list(
+                'units', flat=True
+            ):
+                reserved_units.update(units)
             conflicting_units = [u for u in self.units if u in reserved_units]
             if conflicting_units:
                 raise ValidationError({
@@ -768,6 +878,15 @@ class DeviceManager(NaturalOrderByManager):
     def get_queryset(self):
         return self.natural_order_by('name')
 
+    def for_elevation(self):
+        """
+        Return Devices along with the related objects and counts displayed within a rack elevation.
+        """
+        return self.get_queryset().select_related('device_type__manufacturer', 'device_role').annotate(
+            devicebay_count=Count('device_bays'),
+            child_count=Count('device_bays__installed_device')
+        )
+
 
 @python_2_unicode_compatible
 class Device(CreatedUpdatedModel, CustomFieldModel):
@@ -876,10 +995,12 @@ class Device(CreatedUpdatedModel, CustomFieldModel):
                 rack_face = self.face if not self.device_type.is_full_depth else None
                 exclude_list = [self.pk] if self.pk else []
                 try:
-                    available_units = self.rack.get_available_units(
-                        u_height=self.device_type.u_height, rack_face=rack_face, exclude=exclude_list
-                    )
-                    if self.position and self.position not in available_units:
+                    if self.position and (
+                        self.position + self.device_type.u_height - 1 > self.rack.u_height or
+                        self.rack.get_conflicting_devices(
+                            self.position, self.device_type.u_height, rack_face=rack_face, exclude=exclude_list
+                        ).exists()
+                    ):
                         raise ValidationError({
                             'position': "U{} is already occupied or does not have sufficient space to accommodate a(n) "
                                         "{} ({}U).".format(self.position, self.device_type, self.device_type.u_height)
@@ -218,11 +218,11 @@ class RackTable(BaseTable):
 
 class RackDetailTable(RackTable):
     devices = tables.Column(accessor=Accessor('device_count'))
-    get_utilization = tables.TemplateColumn(UTILIZATION_GRAPH, orderable=False, verbose_name='Utilization')
+    utilization = tables.TemplateColumn(UTILIZATION_GRAPH, verbose_name='Utilization')
 
     class Meta(RackTable.Meta):
         fields = (
-            'pk', 'name', 'site', 'group', 'facility_id', 'tenant', 'role', 'u_height', 'devices', 'get_utilization'
+            'pk', 'name', 'site', 'group', 'facility_id', 'tenant', 'role', 'u_height', 'devices', 'utilization'
         )
 
 
@@ -10,7 +10,8 @@ from dcim.models import (
     ConsolePort, ConsolePortTemplate, ConsoleServerPort, ConsoleServerPortTemplate, Device, DeviceBay,
     DeviceBayTemplate, DeviceRole, DeviceType, IFACE_FF_LAG, Interface, InterfaceConnection, InterfaceTemplate,
     Manufacturer, InventoryItem, Platform, PowerPort, PowerPortTemplate, PowerOutlet, PowerOutletTemplate, Rack, RackGroup,
-    RackReservation, RackRole, Region, Site, SUBDEVICE_ROLE_CHILD, SUBDEVICE_ROLE_PARENT,
+    RACK_FACE_FRONT, RACK_FACE_REAR, RackReservation, RackRole, Region, Site, SUBDEVICE_ROLE_CHILD,
+    SUBDEVICE_ROLE_PARENT,
 )
 from extras.models import Graph, GRAPH_TYPE_INTERFACE, GRAPH_TYPE_SITE
 from users.models import Token
@@ -360,6 +361,36 @@ class RackTest(HttpStatusMixin, APITestCase):
 
         self.assertEqual(response.data['count'], 42)
 
+    def test_get_rack_elevation(self):
+
+        manufacturer = Manufacturer.objects.create(name='Test Manufacturer 1', slug='test-manufacturer-1')
+        devicetype = DeviceType.objects.create(manufacturer=manufacturer, model='Test Device Type 1', u_height=2)
+        devicerole = DeviceRole.objects.create(name='Test Device Role 1', slug='test-device-role-1', color='ff0000')
+        device = Device.objects.create(
+            device_type=devicetype, device_role=devicerole, name='Test Device 1', site=self.site1, rack=self.rack1,
+            position=10, face=RACK_FACE_FRONT
+        )
+        url = reverse('dcim-api:rack-elevation', kwargs={'pk': self.rack1.pk})
+
+        response = self.client.get(url, **self.header)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn('Test Device 1', response.content.decode('utf-8'))
+
+        # Modifying a device invalidates the cached elevation
+        device.name = 'Test Device 2'
+        device.save()
+        response = self.client.get(url, **self.header)
+        self.assertIn('Test Device 2', response.content.decode('utf-8'))
+
+        # The device is shown (unlinked) on the rear face
+        response = self.client.get('{}?face={}'.format(url, RACK_FACE_REAR), **self.header)
+        self.assertNotIn('xlink:href', response.content.decode('utf-8'))
+        self.assertIn('Test Device 2', response.content.decode('utf-8'))
+
+        response = self.client.get('{}?face=2'.format(url), **self.header)
+        self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+
     def test_list_racks(self):
 
         url = reverse('dcim-api:rack-list')
@@ -367,6 +398,72 @@ class RackTest(HttpStatusMixin, APITestCase):
 
         self.assertEqual(response.data['count'], 3)
 
+    def test_list_racks_by_utilization(self):
+
+        manufacturer = Manufacturer.objects.create(name='Test Manufacturer 1', slug='test-manufacturer-1')
+        devicetype = DeviceType.objects.create(manufacturer=manufacturer, model='Test Device Type 1', u_height=21)
+        devicerole = DeviceRole.objects.create(name='Test Device Role 1', slug='test-device-role-1', color='ff0000')
+        Device.objects.create(device_type=devicetype, device_role=devicerole, site=self.site1, rack=self.rack2,
+                              position=1, face=RACK_FACE_FRONT)
+
+        url = reverse('dcim-api:rack-list')
+        response = self.client.get('{}?ordering=-utilization'.format(url), **self.header)
+
+        self.assertEqual(
+            [(rack['name'], rack['utilization']) for rack in response.data['results']][0], ('Test Rack 2', 50)
+        )
+        self.assertEqual([rack['utilization'] for rack in response.data['results']], [50, 0, 0])
+
+    def test_available_space(self):
+
+        manufacturer = Manufacturer.objects.create(name='Test Manufacturer 1', slug='test-manufacturer-1')
+        full_depth = DeviceType.objects.create(
+            manufacturer=manufacturer, model='Full Depth', slug='full-depth', u_height=2
+        )
+        half_depth = DeviceType.objects.create(
+            manufacturer=manufacturer, model='Half Depth', slug='half-depth', u_height=40, is_full_depth=False
+        )
+        devicerole = DeviceRole.objects.create(name='Test Device Role 1', slug='test-device-role-1', color='ff0000')
+        for rack, device_type, position, face in [
+            (self.rack1, full_depth, 1, RACK_FACE_FRONT),
+            (self.rack1, half_depth, 3, RACK_FACE_FRONT),
+            (self.rack2, half_depth, 2, RACK_FACE_REAR),
+        ]:
+            Device.objects.create(
+                device_type=device_type, device_role=devicerole, site=self.site1, rack=rack, position=position,
+                face=face
+            )
+        Rack.objects.create(site=self.site2, name='Test Rack 4', u_height=42)
+        url = reverse('dcim-api:rack-available-space')
+
+        # Rack 1 has no room on its front face; rack 2 has no room on its rear face
+        response = self.client.get('{}?site_id={}&height=2&face={}'.format(url, self.site1.pk, RACK_FACE_FRONT),
+                                   **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        self.assertEqual(
+            [(rack['name'], rack['available_units'][:3]) for rack in response.data['results']],
+            [('Test Rack 2', [41, 40, 39]), ('Test Rack 3', [41, 40, 39])]
+        )
+        response = self.client.get('{}?group_id={}&height=2&face={}'.format(url, self.rackgroup1.pk, RACK_FACE_REAR),
+                                   **self.header)
+        self.assertEqual([rack['name'] for rack in response.data['results']], ['Test Rack 1', 'Test Rack 3'])
+        self.assertEqual(response.data['results'][0]['available_units'], list(range(41, 2, -1)))
+
+        # A full depth device requires room on both faces
+        response = self.client.get('{}?site={}&height=2'.format(url, self.site1.slug), **self.header)
+        self.assertEqual([rack['name'] for rack in response.data['results']], ['Test Rack 3'])
+        self.assertEqual(
+            response.data['results'][0]['available_units'], self.rack3.get_available_units(u_height=2)
+        )
+
+        # A scope is required and the height must be valid
+        response = self.client.get(url, **self.header)
+        self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('{}?site_id={}&height=0'.format(url, self.site1.pk), **self.header)
+        self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('{}?site_id={}&face=2'.format(url, self.site1.pk), **self.header)
+        self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+
     def test_create_rack(self):
 
         data = {
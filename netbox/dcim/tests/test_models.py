@@ -98,3 +98,141 @@ class RackTestCase(TestCase):
             face=None,
         )
         self.assertTrue(pdu)
+
+    def test_annotate_rack_elevations(self):
+
+        half_depth = DeviceType.objects.create(
+            manufacturer=self.manufacturer,
+            model='HalfDepth 1000',
+            slug='hd1000',
+            u_height=2,
+            is_full_depth=False,
+            subdevice_role=SUBDEVICE_ROLE_PARENT
+        )
+        rack2 = Rack.objects.create(name='TestRack2', site=self.site, u_height=10, desc_units=True)
+        for name, rack, device_type, position, face in [
+            ('TestSwitch1', self.rack, self.device_type['ff2048'], 10, RACK_FACE_REAR),
+            ('TestServer1', self.rack, half_depth, 20, RACK_FACE_FRONT),
+            ('TestServer2', rack2, half_depth, 1, RACK_FACE_REAR),
+            ('TestPDU', rack2, self.device_type['cc5000'], None, None),
+        ]:
+            Device.objects.create(
+                name=name, device_type=device_type, device_role=self.role['Server'], site=self.site, rack=rack,
+                position=position, face=face
+            )
+        DeviceBay.objects.create(device=Device.objects.get(name='TestServer1'), name='Bay 1')
+
+        racks = list(Rack.objects.filter(pk__in=[self.rack.pk, rack2.pk]))
+        with self.assertNumQueries(1):
+            annotate_rack_elevations(racks)
+        for rack in racks:
+            self.assertEqual(rack.front_elevation, rack.get_front_elevation())
+            self.assertEqual(rack.rear_elevation, rack.get_rear_elevation())
+        units = {u['id']: u['device'] for u in racks[0].front_elevation}
+        self.assertEqual((units[20].name, units[20].devicebay_count, units[20].child_count), ('TestServer1', 1, 0))
+        self.assertNotIn(21, units)
+        self.assertEqual([u['device'] for u in racks[1].front_elevation], [None] * 10)
+        self.assertEqual(racks[1].rear_elevation[0]['device'].name, 'TestServer2')
+
+    def test_get_available_units(self):
+
+        self.assertEqual(get_free_positions(0b0100010, 7, 2), [3, 4])
+        self.assertEqual(get_free_positions(0, 3, 4), [])
+
+        device1 = Device.objects.create(
+            name='TestSwitch1',
+            device_type=self.device_type['ff2048'],
+            device_role=self.role['Switch'],
+            site=self.site,
+            rack=self.rack,
+            position=40,
+            face=RACK_FACE_FRONT,
+        )
+        self.assertEqual(self.rack.get_available_units(u_height=2), [41] + list(reversed(range(1, 39))))
+        self.assertEqual(self.rack.get_available_units(exclude=[device1.pk]), list(reversed(range(1, 43))))
+        self.assertEqual(self.rack.get_utilization(), 2)
+
+    def test_get_conflicting_devices(self):
+
+        half_depth = DeviceType.objects.create(
+            manufacturer=self.manufacturer,
+            model='HalfDepth 1000',
+            slug='hd1000',
+            u_height=2,
+            is_full_depth=False
+        )
+        device1 = Device.objects.create(
+            name='TestSwitch1',
+            device_type=half_depth,
+            device_role=self.role['Switch'],
+            site=self.site,
+            rack=self.rack,
+            position=10,
+            face=RACK_FACE_FRONT,
+        )
+        self.assertEqual(list(self.rack.get_conflicting_devices(11, 2)), [device1])
+        self.assertEqual(list(self.rack.get_conflicting_devices(12, 2)), [])
+        self.assertEqual(list(self.rack.get_conflicting_devices(9, 1, rack_face=RACK_FACE_FRONT)), [])
+        self.assertEqual(list(self.rack.get_conflicting_devices(10, 1, rack_face=RACK_FACE_REAR)), [])
+        self.assertEqual(list(self.rack.get_conflicting_devices(10, 1, exclude=[device1.pk])), [])
+
+        # Devices may not overlap one another, nor extend beyond the top of the rack
+        for position, face in [(11, RACK_FACE_FRONT), (42, RACK_FACE_REAR)]:
+            device2 = Device(
+                name='TestSwitch2',
+                device_type=half_depth,
+                device_role=self.role['Switch'],
+                site=self.site,
+                rack=self.rack,
+                position=position,
+                face=face,
+            )
+            with self.assertRaises(ValidationError):
+                device2.clean()
+        device2.position = 10
+        device2.clean()
+
+    def test_reservation_conflicts(self):
+
+        user = User.objects.create(username='testuser')
+        RackReservation.objects.create(rack=self.rack, units=[1, 2, 3], user=user, description='Reservation 1')
+        RackReservation.objects.create(rack=self.rack, units=[10], user=user, description='Reservation 2')
+
+        reservation = RackReservation(rack=self.rack, units=[3, 4, 10], user=user, description='Reservation 3')
+        with self.assertRaises(ValidationError) as cm:
+            reservation.clean()
+        self.assertEqual(
+            cm.exception.message_dict['units'], ['The following units have already been reserved: 3, 10']
+        )
+        reservation.units = [4, 5]
+        reservation.clean()
+
+    def test_annotate_utilization(self):
+
+        half_depth = DeviceType.objects.create(
+            manufacturer=self.manufacturer,
+            model='HalfDepth 1000',
+            slug='hd1000',
+            u_height=2,
+            is_full_depth=False
+        )
+        rack2 = Rack.objects.create(name='TestRack2', site=self.site, u_height=10)
+        for rack, device_type, position, face in [
+            (self.rack, self.device_type['ff2048'], 42, RACK_FACE_FRONT),
+            (self.rack, self.device_type['cc5000'], None, None),
+            (rack2, half_depth, 1, RACK_FACE_FRONT),
+            (rack2, half_depth, 2, RACK_FACE_REAR),
+            (rack2, half_depth, 10, RACK_FACE_REAR),
+        ]:
+            Device.objects.create(
+                device_type=device_type, device_role=self.role['Server'], site=self.site, rack=rack,
+                position=position, face=face
+            )
+        Rack.objects.create(name='TestRack3', site=self.site, u_height=1)
+
+        # Overlapping units are counted once, and units beyond the top of the rack are ignored
+        with self.assertNumQueries(1):
+            utilization = {rack.name: rack.utilization for rack in Rack.objects.annotate_utilization()}
+        self.assertEqual(utilization, {'TestRack1': 2, 'TestRack2': 40, 'TestRack3': 0})
+        for rack in Rack.objects.annotate_utilization():
+            self.assertEqual(rack.utilization, rack.get_utilization())
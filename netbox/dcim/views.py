@@ -30,7 +30,7 @@ from .models import (
     CONNECTION_STATUS_CONNECTED, ConsolePort, ConsolePortTemplate, ConsoleServerPort, ConsoleServerPortTemplate, Device,
     DeviceBay, DeviceBayTemplate, DeviceRole, DeviceType, Interface, InterfaceConnection, InterfaceTemplate,
     Manufacturer, InventoryItem, Platform, PowerOutlet, PowerOutletTemplate, PowerPort, PowerPortTemplate, Rack,
-    RackGroup, RackReservation, RackRole, Region, Site,
+    RackGroup, RackReservation, RackRole, Region, Site, annotate_rack_elevations,
 )
 
 
@@ -352,10 +352,8 @@ class RackRoleBulkDeleteView(PermissionRequiredMixin, BulkDeleteView):
 #
 
 class RackListView(ObjectListView):
-    queryset = Rack.objects.select_related(
+    queryset = Rack.objects.annotate_utilization().select_related(
         'site', 'group', 'tenant', 'role'
-    ).prefetch_related(
-        'devices__device_type'
     ).annotate(
         device_count=Count('devices', distinct=True)
     )
@@ -375,7 +373,7 @@ class RackElevationListView(View):
         racks = Rack.objects.select_related(
             'site', 'group', 'tenant', 'role'
         ).prefetch_related(
-            'devices__device_type'
+            'reservations__user'
         )
         racks = filters.RackFilter(request.GET, racks).qs
         total_count = racks.count()
@@ -390,6 +388,9 @@ class RackElevationListView(View):
         except EmptyPage:
             page = paginator.page(paginator.num_pages)
 
+        # Compute the elevations of all racks on the page at once
+        annotate_rack_elevations(page.object_list)
+
         # Determine rack face
         if request.GET.get('face') == '1':
             face_id = 1
@@ -0,0 +1,184 @@
+from __future__ import unicode_literals
+
+import netaddr
+import numpy as np
+
+from django.db import connection
+
+from .intervals import interval_to_networks
+
+
+# The maximum number of blocks into which a parent prefix may be divided for analysis
+MAX_BLOCKS = 2 ** 20
+
+HISTOGRAM_BINS = 10
+
+
+def _load(sql, params, columns):
+    """
+    Execute the given SQL and return each of its (integer) result columns as a numpy array.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    if not rows:
+        return [np.empty(0, dtype=np.uint32) for _ in range(columns)]
+    return [np.array(column, dtype=np.uint32) for column in zip(*rows)]
+
+
+def _merge(firsts, lasts):
+    """
+    Merge intervals (sorted by their first value) into disjoint intervals, returning their starts and ends as int64
+    arrays. Intervals which overlap or abut one another are combined.
+    """
+    if not len(firsts):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    firsts = firsts.astype(np.int64)
+    reach = np.maximum.accumulate(lasts.astype(np.int64))
+    breaks = np.ones(len(firsts), dtype=bool)
+    breaks[1:] = firsts[1:] > reach[:-1] + 1
+    indices = np.flatnonzero(breaks)
+    return firsts[indices], reach[np.append(indices[1:] - 1, len(firsts) - 1)]
+
+
+def _count_covered(starts, ends, bounds):
+    """
+    Return the number of addresses covered by the disjoint intervals starts-ends which fall below each of the given
+    bounds.
+    """
+    if not len(starts):
+        return np.zeros(len(bounds), dtype=np.int64)
+    cumulative = np.concatenate(([0], np.cumsum(ends - starts + 1)))
+    i = np.searchsorted(starts, bounds, side='right')
+    # Addresses in all intervals entirely below each bound, plus the portion of the interval in which it falls
+    previous = np.maximum(i - 1, 0)
+    partial = np.clip(bounds - starts[previous], 0, ends[previous] - starts[previous] + 1)
+    return np.where(i > 0, cumulative[previous] + partial, 0)
+
+
+class IPv4Space(object):
+    """
+    The IPv4 addresses and prefixes of a VRF (or of the global table) held as sorted uint32 arrays, for vectorized
+    analysis of address space. addresses holds the integer value of each IP address, and prefix_firsts/prefix_lasts the
+    first and last integer addresses of each prefix (sorted by first address).
+    """
+
+    def __init__(self, addresses, prefix_firsts, prefix_lasts):
+        self.addresses = np.sort(np.asarray(addresses, dtype=np.uint32))
+        prefix_firsts = np.asarray(prefix_firsts, dtype=np.uint32)
+        order = np.argsort(prefix_firsts, kind='mergesort')
+        self.prefix_firsts = prefix_firsts[order]
+        self.prefix_lasts = np.asarray(prefix_lasts, dtype=np.uint32)[order]
+
+    @classmethod
+    def load(cls, vrf=None, parent=None):
+        """
+        Load the IPv4 addresses and prefixes of the given VRF (None for the global table), optionally only those within
+        the given parent network. Each table is read with a single query.
+        """
+        from .models import IPAddress, Prefix
+
+        conditions = ['family = 4']
+        params = []
+        if vrf is None:
+            conditions.append('vrf_id IS NULL')
+        else:
+            conditions.append('vrf_id = %s')
+            params.append(vrf.pk)
+        if parent is not None:
+            conditions.append('{field} <<= %s')
+            params.append(str(parent.cidr))
+        where = ' AND '.join(conditions)
+
+        # An IP address is matched to the parent by its host portion, regardless of its mask (as with the
+        # net_host_contained lookup)
+        addresses, = _load(
+            "SELECT address - '0.0.0.0'::inet FROM {} WHERE {}".format(
+                IPAddress._meta.db_table, where.format(field='CAST(HOST(address) AS INET)')
+            ), params, 1
+        )
+        prefix_firsts, prefix_lasts = _load(
+            "SELECT prefix - '0.0.0.0'::inet, BROADCAST(prefix) - '0.0.0.0'::inet FROM {} WHERE {}".format(
+                Prefix._meta.db_table, where.format(field='prefix')
+            ), params, 2
+        )
+
+        return cls(addresses, prefix_firsts, prefix_lasts)
+
+    def get_coverage(self, parent):
+        """
+        Return the merged intervals (as arrays of starts and ends) covered by the prefixes within the parent network,
+        not including the parent itself.
+        """
+        lo = np.searchsorted(self.prefix_firsts, parent.first)
+        hi = np.searchsorted(self.prefix_firsts, parent.last, side='right')
+        firsts = self.prefix_firsts[lo:hi]
+        lasts = self.prefix_lasts[lo:hi]
+        inside = (lasts <= parent.last) & ((firsts != parent.first) | (lasts != parent.last))
+        return _merge(firsts[inside], lasts[inside])
+
+    def get_blocks(self, parent, prefix_length):
+        """
+        Divide the parent network into blocks of the given prefix length. Return the first address of each block along
+        with the number of IP addresses within it and the number of its addresses covered by child prefixes.
+        """
+        if not parent.prefixlen <= prefix_length <= 32:
+            raise ValueError("Prefix length must be between {} and 32.".format(parent.prefixlen))
+        if 2 ** (prefix_length - parent.prefixlen) > MAX_BLOCKS:
+            raise ValueError("A /{} cannot be divided into more than {} blocks.".format(parent.prefixlen, MAX_BLOCKS))
+
+        size = 2 ** (32 - prefix_length)
+        bounds = np.arange(parent.first, parent.last + 2, size, dtype=np.int64)
+        addresses = np.diff(np.searchsorted(self.addresses, bounds))
+        starts, ends = self.get_coverage(parent)
+        covered = np.diff(_count_covered(starts, ends, bounds))
+
+        return bounds[:-1], addresses, covered
+
+    def get_free_blocks(self, parent):
+        """
+        Return a list of IPNetworks representing all space within the parent network not covered by any child prefix.
+        """
+        starts, ends = self.get_coverage(parent)
+        gap_firsts = np.concatenate(([parent.first], ends + 1))
+        gap_lasts = np.concatenate((starts - 1, [parent.last]))
+        free = gap_firsts <= gap_lasts
+        networks = []
+        for first, last in zip(gap_firsts[free], gap_lasts[free]):
+            networks.extend(interval_to_networks(int(first), int(last), 4))
+        return networks
+
+    def get_report(self, parent, prefix_length, threshold=0):
+        """
+        Analyze the parent network, divided into blocks of the given prefix length. The report includes a histogram of
+        block utilization (the portion of usable addresses assigned to IP addresses, as with Prefix.get_utilization()),
+        each in-use block whose utilization meets the threshold, and the space not covered by any child prefix.
+        """
+        firsts, addresses, covered = self.get_blocks(parent, prefix_length)
+        size = 2 ** (32 - prefix_length)
+        usable = size - 2 if prefix_length < 31 else size
+        utilization = addresses * 100 // usable
+
+        counts, edges = np.histogram(np.minimum(utilization, 100), bins=HISTOGRAM_BINS, range=(0, 100))
+        histogram = [
+            {'min': int(edges[i]), 'max': int(edges[i + 1]), 'count': int(counts[i])} for i in range(HISTOGRAM_BINS)
+        ]
+
+        selected = np.flatnonzero((addresses > 0) & (utilization >= threshold))
+        blocks = [{
+            'prefix': netaddr.IPNetwork((int(firsts[i]), prefix_length)),
+            'addresses': int(addresses[i]),
+            'coverage': int(covered[i] * 100 // size),
+            'utilization': int(utilization[i]),
+        } for i in selected]
+
+        return {
+            'parent': parent,
+            'prefix_length': prefix_length,
+            'size': parent.size,
+            'addresses': int(addresses.sum()),
+            'coverage': int(covered.sum() * 100 // parent.size),
+            'histogram': histogram,
+            'blocks': blocks,
+            'free_blocks': self.get_free_blocks(parent),
+        }
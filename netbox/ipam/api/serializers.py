@@ -8,7 +8,7 @@ from dcim.api.serializers import NestedDeviceSerializer, InterfaceSerializer, Ne
 from extras.api.customfields import CustomFieldModelSerializer
 from ipam.models import (
     Aggregate, IPAddress, IPADDRESS_ROLE_CHOICES, IPADDRESS_STATUS_CHOICES, IP_PROTOCOL_CHOICES, Prefix,
-    PREFIX_STATUS_CHOICES, RIR, Role, Service, VLAN, VLAN_STATUS_CHOICES, VLANGroup, VRF,
+    PREFIX_STATUS_CHOICES, RIR, Role, Service, VLAN, VLAN_STATUS_CHOICES, VLANGroup, VRF, VRFSummary,
 )
 from tenancy.api.serializers import NestedTenantSerializer
 from utilities.api import ChoiceFieldSerializer, ValidatedModelSerializer
@@ -18,12 +18,36 @@ from utilities.api import ChoiceFieldSerializer, ValidatedModelSerializer
 # VRFs
 #
 
+class VRFSummarySerializer(serializers.ModelSerializer):
+    prefixes = serializers.SerializerMethodField()
+    ip_addresses = serializers.SerializerMethodField()
+
+    class Meta:
+        model = VRFSummary
+        fields = ['prefixes', 'ip_addresses', 'utilization', 'computed']
+
+    def _get_counts(self, total, counts):
+        return OrderedDict([('total', total)] + [(status.lower(), count) for status, count in counts])
+
+    def get_prefixes(self, obj):
+        return self._get_counts(obj.prefix_count, obj.get_prefix_counts())
+
+    def get_ip_addresses(self, obj):
+        return self._get_counts(obj.ipaddress_count, obj.get_ipaddress_counts())
+
+
 class VRFSerializer(CustomFieldModelSerializer):
     tenant = NestedTenantSerializer()
+    summary = serializers.SerializerMethodField()
 
     class Meta:
         model = VRF
-        fields = ['id', 'name', 'rd', 'tenant', 'enforce_unique', 'description', 'display_name', 'custom_fields']
+        fields = [
+            'id', 'name', 'rd', 'tenant', 'enforce_unique', 'description', 'display_name', 'custom_fields', 'summary',
+        ]
+
+    def get_summary(self, obj):
+        return VRFSummarySerializer(obj.get_summary()).data
 
 
 class NestedVRFSerializer(serializers.ModelSerializer):
@@ -208,14 +232,18 @@ class PrefixSerializer(CustomFieldModelSerializer):
     vlan = NestedVLANSerializer()
     status = ChoiceFieldSerializer(choices=PREFIX_STATUS_CHOICES)
     role = NestedRoleSerializer()
+    has_children = serializers.SerializerMethodField()
 
     class Meta:
         model = Prefix
         fields = [
             'id', 'family', 'prefix', 'site', 'vrf', 'tenant', 'vlan', 'status', 'role', 'is_pool', 'description',
-            'custom_fields',
+            'depth', 'children', 'has_children', 'custom_fields',
         ]
 
+    def get_has_children(self, obj):
+        return obj.children > 0
+
 
 class NestedPrefixSerializer(serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='ipam-api:prefix-detail')
@@ -225,6 +253,30 @@ class NestedPrefixSerializer(serializers.ModelSerializer):
         fields = ['id', 'url', 'family', 'prefix']
 
 
+class PrefixTreeSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='ipam-api:prefix-detail')
+    site = NestedSiteSerializer()
+    vrf = NestedVRFSerializer()
+    tenant = NestedTenantSerializer()
+    vlan = NestedVLANSerializer()
+    status = ChoiceFieldSerializer(choices=PREFIX_STATUS_CHOICES)
+    role = NestedRoleSerializer()
+    utilization = serializers.IntegerField(read_only=True)
+    child_prefixes = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Prefix
+        fields = [
+            'id', 'url', 'family', 'prefix', 'site', 'vrf', 'tenant', 'vlan', 'status', 'role', 'is_pool',
+            'description', 'depth', 'children', 'utilization', 'child_prefixes',
+        ]
+
+    def get_child_prefixes(self, obj):
+        if obj.child_prefixes is None:
+            return None
+        return PrefixTreeSerializer(obj.child_prefixes, many=True, context=self.context).data
+
+
 class WritablePrefixSerializer(CustomFieldModelSerializer):
 
     class Meta:
@@ -235,6 +287,20 @@ class WritablePrefixSerializer(CustomFieldModelSerializer):
         ]
 
 
+class AvailablePrefixSerializer(serializers.Serializer):
+
+    def to_representation(self, instance):
+        if self.context.get('vrf'):
+            vrf = NestedVRFSerializer(self.context['vrf'], context={'request': self.context['request']}).data
+        else:
+            vrf = None
+        return OrderedDict([
+            ('family', instance.version),
+            ('prefix', str(instance)),
+            ('vrf', vrf),
+        ])
+
+
 #
 # IP addresses
 #
@@ -265,6 +331,21 @@ IPAddressSerializer._declared_fields['nat_inside'] = NestedIPAddressSerializer()
 IPAddressSerializer._declared_fields['nat_outside'] = NestedIPAddressSerializer()
 
 
+class ParentPrefixSerializer(NestedPrefixSerializer):
+    site = NestedSiteSerializer()
+    vlan = NestedVLANSerializer()
+
+    class Meta(NestedPrefixSerializer.Meta):
+        fields = ['id', 'url', 'family', 'prefix', 'site', 'vlan']
+
+
+class IPAddressParentPrefixSerializer(IPAddressSerializer):
+    parent_prefix = ParentPrefixSerializer(read_only=True)
+
+    class Meta(IPAddressSerializer.Meta):
+        fields = IPAddressSerializer.Meta.fields + ['parent_prefix']
+
+
 class WritableIPAddressSerializer(CustomFieldModelSerializer):
 
     class Meta:
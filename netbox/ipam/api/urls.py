@@ -39,5 +39,9 @@ router.register(r'vlans', views.VLANViewSet)
 # Services
 router.register(r'services', views.ServiceViewSet)
 
+# Reports
+router.register(r'conflicts', views.IPConflictViewSet, base_name='conflicts')
+router.register(r'ipv4-space-report', views.IPv4SpaceReportViewSet, base_name='ipv4-space-report')
+
 app_name = 'ipam-api'
 urlpatterns = router.urls
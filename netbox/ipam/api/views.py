@@ -1,18 +1,36 @@
 from __future__ import unicode_literals
 
+from collections import OrderedDict
+from itertools import islice
+import json
+
+from netaddr import IPNetwork
 from rest_framework import status
-from rest_framework.decorators import detail_route
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.decorators import detail_route, list_route
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.viewsets import ModelViewSet, ViewSet
 
 from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import six
 
-from ipam.models import Aggregate, IPAddress, Prefix, RIR, Role, Service, VLAN, VLANGroup, VRF
+from ipam.models import (
+    Aggregate, AggregateStatistic, IPAddress, Prefix, RIR, Role, Service, VLAN, VLANGroup, VRF, annotate_child_prefixes,
+    annotate_vrf_summaries,
+)
 from ipam import filters
+from ipam.analysis import IPv4Space
+from ipam.audit import CONFLICT_TYPES, find_conflicts
+from ipam.forms import IPv4SpaceReportForm
+from ipam.intervals import carve_networks, merge_intervals
+from ipam.utilization import annotate_prefix_utilization
 from extras.api.views import CustomFieldModelViewSet
-from utilities.api import WritableSerializerMixin
+from utilities.api import IsAuthenticatedOrLoginNotRequired, WritableSerializerMixin, get_requested_count
 from . import serializers
 
 
@@ -26,6 +44,17 @@ class VRFViewSet(WritableSerializerMixin, CustomFieldModelViewSet):
     write_serializer_class = serializers.WritableVRFSerializer
     filter_class = filters.VRFFilter
 
+    def paginate_queryset(self, queryset):
+        # Retrieve (or compute) the summaries of all VRFs on the page at once
+        page = super(VRFViewSet, self).paginate_queryset(queryset)
+        if page is not None:
+            annotate_vrf_summaries(page)
+        return page
+
+    def get_object(self):
+        vrf = super(VRFViewSet, self).get_object()
+        return annotate_vrf_summaries([vrf])[0]
+
 
 #
 # RIRs
@@ -36,6 +65,18 @@ class RIRViewSet(ModelViewSet):
     serializer_class = serializers.RIRSerializer
     filter_class = filters.RIRFilter
 
+    @detail_route()
+    def stats(self, request, pk=None):
+        """
+        Return the number of addresses within the RIR's aggregates of the given family (IPv4 by default) which are
+        allocated to active, reserved, and deprecated prefixes, or which remain available.
+        """
+        rir = get_object_or_404(RIR, pk=pk)
+        family = 6 if request.query_params.get('family') == '6' else 4
+        stats = AggregateStatistic.objects.get_rir_totals(family)[rir.pk]
+        stats['family'] = family
+        return Response(stats)
+
 
 #
 # Aggregates
@@ -62,48 +103,217 @@ class RoleViewSet(ModelViewSet):
 # Prefixes
 #
 
+class PrefixTreePagination(CursorPagination):
+    """
+    Paginate one level of the prefix hierarchy by cursor, ordered by prefix. The page size is taken from the limit
+    parameter (up to MAX_PAGE_SIZE, if set).
+    """
+    ordering = 'prefix'
+
+    def get_page_size(self, request):
+        try:
+            limit = int(request.query_params['limit'])
+            if limit < 1:
+                raise ValueError()
+        except (KeyError, ValueError):
+            return settings.PAGINATE_COUNT
+        if settings.MAX_PAGE_SIZE:
+            return min(limit, settings.MAX_PAGE_SIZE)
+        return limit
+
+
 class PrefixViewSet(WritableSerializerMixin, CustomFieldModelViewSet):
     queryset = Prefix.objects.select_related('site', 'vrf__tenant', 'tenant', 'vlan', 'role')
     serializer_class = serializers.PrefixSerializer
     write_serializer_class = serializers.WritablePrefixSerializer
     filter_class = filters.PrefixFilter
 
-    @detail_route(url_path='available-ips', methods=['get', 'post'])
-    def available_ips(self, request, pk=None):
+    @list_route(url_path='tree')
+    def tree(self, request):
         """
-        A convenience method for returning available IP addresses within a prefix. By default, the number of IPs
-        returned will be equivalent to PAGINATE_COUNT. An arbitrary limit (up to MAX_PAGE_SIZE, if set) may be passed,
-        however results will not be paginated.
+        Return one level of the prefix hierarchy within a VRF (the global table unless vrf_id is passed): the top-level
+        prefixes, or the immediate children of the prefix specified by parent. Each prefix includes its depth, the
+        number of prefixes nested within it, and its utilization. Passing expand=N nests up to N further levels of
+        children beneath each prefix; the children of any other prefix can be retrieved on demand by passing it as the
+        parent. Prefixes are paginated by cursor.
+        """
+        if 'parent' in request.query_params:
+            try:
+                parent = get_object_or_404(Prefix, pk=int(request.query_params['parent']))
+            except ValueError:
+                raise ValidationError({'parent': "Invalid prefix ID."})
+            queryset = self.queryset.filter(
+                vrf_id=parent.vrf_id, prefix__net_contained=str(parent.prefix), depth=parent.depth + 1
+            )
+        else:
+            try:
+                vrf_id = int(request.query_params.get('vrf_id', 0)) or None
+            except ValueError:
+                raise ValidationError({'vrf_id': "Invalid VRF ID."})
+            queryset = self.queryset.filter(vrf_id=vrf_id, depth=0)
+
+        try:
+            levels = int(request.query_params.get('expand', 0))
+            if levels < 0:
+                raise ValueError()
+        except ValueError:
+            raise ValidationError({'expand': "Expand must be a non-negative integer."})
+
+        paginator = PrefixTreePagination()
+        prefixes = paginator.paginate_queryset(queryset, request, view=self)
+        descendants = annotate_child_prefixes(prefixes, levels)
+        annotate_prefix_utilization(prefixes + descendants)
+
+        serializer = serializers.PrefixTreeSerializer(prefixes, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+    @detail_route(url_path='available-prefixes', methods=['get', 'post'])
+    def available_prefixes(self, request, pk=None):
+        """
+        A convenience method for returning available child prefixes within a parent.
+
+        A POST creates the first available child prefix of the requested prefix_length within the parent. If a count is
+        passed, that many prefixes (up to MAX_PAGE_SIZE, if set) are created at once and returned as a list. The parent
+        is locked for the duration of the allocation so that concurrent requests never receive the same prefixes.
         """
         prefix = get_object_or_404(Prefix, pk=pk)
 
-        # Create the next available IP within the prefix
+        # Create the next available prefix(es) within the parent
         if request.method == 'POST':
 
             # Permissions check
-            if not request.user.has_perm('ipam.add_ipaddress'):
+            if not request.user.has_perm('ipam.add_prefix'):
                 raise PermissionDenied()
 
-            # Find the first available IP address in the prefix
+            # Determine the number and size of the prefixes to create
+            count = get_requested_count(request)
+            max_length = 32 if prefix.family == 4 else 128
             try:
-                ipaddress = list(prefix.get_available_ips())[0]
-            except IndexError:
+                prefix_length = int(request.data.get('prefix_length'))
+            except (TypeError, ValueError):
+                prefix_length = None
+            if prefix_length is None or not prefix.prefix.prefixlen < prefix_length <= max_length:
                 return Response(
                     {
-                        "detail": "There are no available IPs within this prefix ({})".format(prefix)
+                        "prefix_length": ["Must be an integer between {} and {}.".format(
+                            prefix.prefix.prefixlen + 1, max_length
+                        )]
                     },
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Create the new IP address
-            data = request.data.copy()
-            data['address'] = '{}/{}'.format(ipaddress, prefix.prefix.prefixlen)
-            data['vrf'] = prefix.vrf
-            serializer = serializers.WritableIPAddressSerializer(data=data)
-            if serializer.is_valid():
-                serializer.save()
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            with transaction.atomic():
+
+                # Lock the parent to serialize concurrent allocations from it
+                prefix = Prefix.objects.select_for_update().get(pk=prefix.pk)
+
+                # Find the first available prefix(es) of the requested length
+                child_prefixes = list(carve_networks(
+                    prefix.prefix, prefix.get_child_prefixes().values_list('prefix', flat=True), prefix_length, count
+                ))
+                if len(child_prefixes) < count:
+                    return Response(
+                        {
+                            "detail": "There is insufficient space available within this prefix ({}) to allocate {} "
+                                      "/{} prefix(es)".format(prefix, count, prefix_length)
+                        },
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+                # Create the new prefix(es)
+                created = []
+                for child_prefix in child_prefixes:
+                    data = request.data.copy()
+                    data.pop('prefix_length')
+                    data['prefix'] = str(child_prefix)
+                    data['vrf'] = prefix.vrf
+                    serializer = serializers.WritablePrefixSerializer(data=data)
+                    if not serializer.is_valid():
+                        transaction.set_rollback(True)
+                        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                    serializer.save()
+                    created.append(serializer.data)
+
+            if 'count' not in request.query_params:
+                return Response(created[0], status=status.HTTP_201_CREATED)
+            return Response(created, status=status.HTTP_201_CREATED)
+
+        else:
+
+            serializer = serializers.AvailablePrefixSerializer(prefix.get_available_prefixes(), many=True, context={
+                'request': request,
+                'vrf': prefix.vrf,
+            })
+
+            return Response(serializer.data)
+
+    @detail_route(url_path='available-ips', methods=['get', 'post'])
+    def available_ips(self, request, pk=None):
+        """
+        A convenience method for returning available IP addresses within a prefix. By default, the number of IPs
+        returned will be equivalent to PAGINATE_COUNT. An arbitrary limit (up to MAX_PAGE_SIZE, if set) may be passed,
+        however results will not be paginated.
+
+        A POST creates the next available IP within the prefix. If a count is passed, that many IPs (up to
+        MAX_PAGE_SIZE, if set) are created at once and returned as a list. The prefix is locked for the duration of the
+        allocation so that concurrent requests never receive the same IPs.
+        """
+        prefix = get_object_or_404(Prefix, pk=pk)
+
+        # Create the next available IP(s) within the prefix
+        if request.method == 'POST':
+
+            # Permissions check
+            if not request.user.has_perm('ipam.add_ipaddress'):
+                raise PermissionDenied()
+
+            # Determine the number of IPs to create
+            count = get_requested_count(request)
+
+            with transaction.atomic():
+
+                # Lock the prefix to serialize concurrent allocations from it
+                prefix = Prefix.objects.select_for_update().get(pk=prefix.pk)
+
+                # Find the first available IP address(es) in the prefix
+                available_ips = list(islice(prefix.get_available_ips(), count))
+                if len(available_ips) < count:
+                    return Response(
+                        {
+                            "detail": "There are {} available IPs within this prefix ({})".format(
+                                len(available_ips) or 'no', prefix
+                            )
+                        },
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+                # Validate the shared attributes of the new IP addresses against the first
+                data = request.data.copy()
+                data['address'] = '{}/{}'.format(available_ips[0], prefix.prefix.prefixlen)
+                data['vrf'] = prefix.vrf
+                serializer = serializers.WritableIPAddressSerializer(data=data)
+                if not serializer.is_valid():
+                    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+                # Create a single IP address
+                if 'count' not in request.query_params:
+                    serializer.save()
+                    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+                # Create all requested IP addresses at once
+                attrs = serializer.validated_data.copy()
+                custom_fields = attrs.pop('custom_fields', None)
+                ipaddresses = []
+                for ip in available_ips:
+                    attrs['address'] = IPNetwork('{}/{}'.format(ip, prefix.prefix.prefixlen))
+                    ipaddresses.append(IPAddress(family=prefix.family, **attrs))
+                IPAddress.objects.bulk_create(ipaddresses)
+                if custom_fields is not None:
+                    for ipaddress in ipaddresses:
+                        serializer._save_custom_fields(ipaddress, custom_fields)
+
+            serializer = serializers.WritableIPAddressSerializer(ipaddresses, many=True)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         # Determine the maximum amount of IPs to return
         else:
@@ -139,6 +349,24 @@ class IPAddressViewSet(WritableSerializerMixin, CustomFieldModelViewSet):
     write_serializer_class = serializers.WritableIPAddressSerializer
     filter_class = filters.IPAddressFilter
 
+    def include_parent_prefix(self):
+        """
+        The most specific parent prefix of each IP (along with its site and VLAN) is included only if requested by
+        passing parent_prefix=true.
+        """
+        return self.request.query_params.get('parent_prefix', '').lower() in ('true', '1')
+
+    def get_queryset(self):
+        queryset = super(IPAddressViewSet, self).get_queryset()
+        if self.include_parent_prefix():
+            queryset = queryset.annotate_parent_prefix()
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve') and self.include_parent_prefix():
+            return serializers.IPAddressParentPrefixSerializer
+        return super(IPAddressViewSet, self).get_serializer_class()
+
 
 #
 # VLAN groups
@@ -150,6 +378,77 @@ class VLANGroupViewSet(WritableSerializerMixin, ModelViewSet):
     write_serializer_class = serializers.WritableVLANGroupSerializer
     filter_class = filters.VLANGroupFilter
 
+    @detail_route(url_path='available-vlans', methods=['get', 'post'])
+    def available_vlans(self, request, pk=None):
+        """
+        A convenience method for returning the VLAN IDs available within a group, both individually and as ranges.
+
+        A POST creates a VLAN with the first available VID in the group. If a count is passed, that many VLANs are
+        created at once (up to MAX_PAGE_SIZE, if set) and returned as a list. The string "{vid}" within the name is
+        replaced with the VID of each VLAN. The group is locked for the duration of the allocation so that concurrent
+        requests never receive the same VIDs.
+        """
+        group = get_object_or_404(VLANGroup, pk=pk)
+
+        # Create the next available VLAN(s) within the group
+        if request.method == 'POST':
+
+            # Permissions check
+            if not request.user.has_perm('ipam.add_vlan'):
+                raise PermissionDenied()
+
+            # Determine the number of VLANs to create
+            count = get_requested_count(request)
+
+            with transaction.atomic():
+
+                # Lock the group to serialize concurrent allocations from it
+                group = VLANGroup.objects.select_for_update().get(pk=group.pk)
+
+                # Find the first available VID(s) in the group
+                vids = group.get_available_vids()[:count]
+                if len(vids) < count:
+                    return Response(
+                        {
+                            "detail": "There are insufficient VLAN IDs available within this group ({}) to "
+                                      "allocate {} VLAN(s)".format(group, count)
+                        },
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+                # Create the new VLAN(s)
+                created = []
+                for vid in vids:
+                    data = request.data.copy()
+                    data['vid'] = vid
+                    data['group'] = group.pk
+                    data['site'] = group.site_id
+                    if isinstance(data.get('name'), six.string_types):
+                        data['name'] = data['name'].replace('{vid}', str(vid))
+                    serializer = serializers.WritableVLANSerializer(data=data)
+                    if not serializer.is_valid():
+                        transaction.set_rollback(True)
+                        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                    serializer.save()
+                    created.append(serializer.data)
+
+            if 'count' not in request.query_params:
+                return Response(created[0], status=status.HTTP_201_CREATED)
+            return Response(created, status=status.HTTP_201_CREATED)
+
+        else:
+
+            vids = group.get_available_vids()
+
+            return Response(OrderedDict([
+                ('count', len(vids)),
+                ('ranges', [
+                    OrderedDict([('start', start), ('end', end)])
+                    for start, end in merge_intervals((vid, vid) for vid in vids)
+                ]),
+                ('vids', vids),
+            ]))
+
 
 #
 # VLANs
@@ -171,3 +470,86 @@ class ServiceViewSet(WritableSerializerMixin, ModelViewSet):
     serializer_class = serializers.ServiceSerializer
     write_serializer_class = serializers.WritableServiceSerializer
     filter_class = filters.ServiceFilter
+
+
+#
+# Reports
+#
+
+class IPConflictViewSet(ViewSet):
+    """
+    Report all duplicate IP addresses, duplicate prefixes, prefixes other than containers which contain other
+    prefixes, and overlapping aggregates, regardless of whether unique IP space is enforced (indicated by `enforced`).
+    The following query parameters are accepted:
+
+    * `type`: Limit to conflicts of the given type (`duplicate-ipaddress`, `duplicate-prefix`, `overlapping-prefix`,
+      or `overlapping-aggregate`). May be specified multiple times.
+    * `vrf_id`: Limit to the given VRF (0 for the global table). May be specified multiple times.
+
+    Conflicts are streamed as they are found, one JSON object per line.
+    """
+    permission_classes = [IsAuthenticatedOrLoginNotRequired]
+
+    def get_view_name(self):
+        return "IP Conflicts"
+
+    def list(self, request):
+
+        types = request.query_params.getlist('type') or CONFLICT_TYPES
+        if not set(types).issubset(CONFLICT_TYPES):
+            raise ValidationError({'type': "Type must be one of: {}".format(', '.join(CONFLICT_TYPES))})
+
+        vrf_ids = None
+        if 'vrf_id' in request.query_params:
+            try:
+                vrf_ids = [int(pk) or None for pk in request.query_params.getlist('vrf_id')]
+            except ValueError:
+                raise ValidationError({'vrf_id': "Invalid VRF ID."})
+
+        def render(conflicts):
+            for conflict in conflicts:
+                conflict['objects'] = [{'id': pk, 'value': value} for pk, value in conflict['objects']]
+                yield json.dumps(conflict, cls=JSONEncoder) + '\n'
+
+        return StreamingHttpResponse(render(find_conflicts(types, vrf_ids)), content_type='application/x-ndjson')
+
+
+class IPv4SpaceReportViewSet(ViewSet):
+    """
+    Analyze the utilization of an IPv4 prefix, divided into blocks of a given size. The following query parameters are
+    accepted:
+
+    * `parent` (required): The prefix to analyze
+    * `vrf_id`: The VRF to analyze (the global table if omitted)
+    * `prefix_length`: The mask length of each block (default: 24)
+    * `threshold`: List only blocks whose utilization (%) is at least this value (default: 0)
+
+    The response includes a histogram of block utilization, each in-use block meeting the threshold, and all space
+    within the parent not covered by a child prefix.
+    """
+    permission_classes = [IsAuthenticatedOrLoginNotRequired]
+
+    def get_view_name(self):
+        return "IPv4 Space Report"
+
+    def list(self, request):
+
+        data = request.query_params.copy()
+        data.setdefault('prefix_length', 24)
+        form = IPv4SpaceReportForm(data)
+        if not form.is_valid():
+            raise ValidationError(form.errors)
+
+        vrf = form.cleaned_data['vrf_id']
+        parent = form.cleaned_data['parent']
+        report = IPv4Space.load(vrf=vrf, parent=parent).get_report(
+            parent, form.cleaned_data['prefix_length'], form.cleaned_data['threshold'] or 0
+        )
+
+        report['vrf'] = vrf.pk if vrf else None
+        report['parent'] = str(report['parent'])
+        for block in report['blocks']:
+            block['prefix'] = str(block['prefix'])
+        report['free_blocks'] = [str(prefix) for prefix in report['free_blocks']]
+
+        return Response(report)
@@ -0,0 +1,243 @@
+from __future__ import unicode_literals
+
+from itertools import groupby
+
+import netaddr
+
+from django.conf import settings
+from django.db import connection
+
+from .constants import PREFIX_STATUS_CONTAINER
+
+
+CONFLICT_DUPLICATE_IPADDRESS = 'duplicate-ipaddress'
+CONFLICT_DUPLICATE_PREFIX = 'duplicate-prefix'
+CONFLICT_OVERLAPPING_PREFIX = 'overlapping-prefix'
+CONFLICT_OVERLAPPING_AGGREGATE = 'overlapping-aggregate'
+CONFLICT_TYPES = (
+    CONFLICT_DUPLICATE_IPADDRESS,
+    CONFLICT_DUPLICATE_PREFIX,
+    CONFLICT_OVERLAPPING_PREFIX,
+    CONFLICT_OVERLAPPING_AGGREGATE,
+)
+
+
+def _stream(sql, params=None):
+    """
+    Execute the given SQL using a server-side cursor and yield each row of the result as it is fetched.
+    """
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        for row in cursor:
+            yield row
+
+
+def _vrf_condition(vrf_ids):
+    """
+    Return a SQL condition and its parameters limiting a query to the given VRF PKs (None representing the global
+    table). If vrf_ids is None, all VRFs are included.
+    """
+    if vrf_ids is None:
+        return 'TRUE', []
+    vrf_ids = list(vrf_ids)
+    conditions = []
+    params = []
+    if None in vrf_ids:
+        conditions.append('vrf_id IS NULL')
+    pks = [pk for pk in vrf_ids if pk is not None]
+    if pks:
+        conditions.append('vrf_id IN %s')
+        params.append(tuple(pks))
+    return '({})'.format(' OR '.join(conditions) or 'FALSE'), params
+
+
+def _get_enforcement():
+    """
+    Return a dictionary mapping the PK of each VRF (and None for the global table) to whether unique IP space is
+    enforced within it.
+    """
+    from .models import VRF
+
+    enforcement = dict(VRF.objects.values_list('pk', 'enforce_unique'))
+    enforcement[None] = settings.ENFORCE_GLOBAL_UNIQUE
+    return enforcement
+
+
+def _find_duplicates(model, field, key, conflict_type, vrf_ids):
+    """
+    Yield each set of objects sharing the same key within a VRF. Duplicates are identified by a window function over
+    the entire table and streamed in order of VRF and key.
+    """
+    enforcement = _get_enforcement()
+    condition, params = _vrf_condition(vrf_ids)
+    sql = "SELECT vrf_id, {key}, id, {field} FROM (" \
+          "SELECT vrf_id, id, {field}, COUNT(*) OVER (PARTITION BY vrf_id, {key}) AS instances FROM {table} " \
+          "WHERE {condition}" \
+          ") AS t WHERE instances > 1 ORDER BY vrf_id NULLS FIRST, {key}, id".format(
+              key=key.format(field=field), field=field, table=model._meta.db_table, condition=condition
+          )
+    for (vrf_id, value), rows in groupby(_stream(sql, params), key=lambda row: (row[0], row[1])):
+        yield {
+            'type': conflict_type,
+            'vrf': vrf_id,
+            'value': value,
+            'enforced': enforcement.get(vrf_id, False),
+            'objects': [(pk, str(netaddr.IPNetwork(obj))) for _, _, pk, obj in rows],
+        }
+
+
+def find_duplicate_ipaddresses(vrf_ids=None):
+    """
+    Yield each set of IPAddresses with the same host address (regardless of mask) within a VRF, as identified by
+    IPAddress.get_duplicates().
+    """
+    from .models import IPAddress
+
+    return _find_duplicates(
+        IPAddress, 'address', 'CAST(HOST({field}) AS INET)', CONFLICT_DUPLICATE_IPADDRESS, vrf_ids
+    )
+
+
+def find_duplicate_prefixes(vrf_ids=None):
+    """
+    Yield each set of identical Prefixes within a VRF, as identified by Prefix.get_duplicates().
+    """
+    from .models import Prefix
+
+    return _find_duplicates(Prefix, 'prefix', '{field}', CONFLICT_DUPLICATE_PREFIX, vrf_ids)
+
+
+def find_overlapping_prefixes(vrf_ids=None):
+    """
+    Yield each Prefix which contains other Prefixes within its VRF but does not have the container status, along with
+    the Prefixes nested within it. Identical Prefixes are reported together, listed ahead of the Prefixes they contain.
+    Nested Prefixes are found by a single join (using the GiST index on prefix) and streamed in order of VRF and parent.
+    """
+    from .models import Prefix
+
+    condition, params = _vrf_condition(vrf_ids)
+    sql = "SELECT p.vrf_id, p.prefix, p.id, c.id, c.prefix FROM (" \
+          "SELECT id, vrf_id, prefix FROM {table} WHERE {condition} AND status != %s" \
+          ") AS p INNER JOIN {table} AS c ON c.vrf_id IS NOT DISTINCT FROM p.vrf_id AND c.prefix << p.prefix " \
+          "ORDER BY p.vrf_id NULLS FIRST, p.prefix, c.prefix, c.id, p.id".format(
+              table=Prefix._meta.db_table, condition=condition
+          )
+    for (vrf_id, prefix), rows in groupby(
+        _stream(sql, params + [PREFIX_STATUS_CONTAINER]), key=lambda row: row[:2]
+    ):
+        # Each nested Prefix is joined to every one of the identical parents in turn
+        parents = []
+        children = []
+        for _, _, pk, child_pk, child in rows:
+            if pk not in parents:
+                parents.append(pk)
+            if not children or children[-1][0] != child_pk:
+                children.append((child_pk, str(netaddr.IPNetwork(child))))
+        value = str(netaddr.IPNetwork(prefix))
+        yield {
+            'type': CONFLICT_OVERLAPPING_PREFIX,
+            'vrf': vrf_id,
+            'value': value,
+            'enforced': False,
+            'objects': [(pk, value) for pk in sorted(parents)] + children,
+        }
+
+
+def find_overlapping_aggregates():
+    """
+    Yield each pair of overlapping Aggregates (which Aggregate.clean() prohibits). Aggregates are retrieved in order and
+    compared to the furthest-reaching Aggregate before them in a single pass.
+    """
+    from .models import Aggregate
+
+    sql = "SELECT id, prefix FROM {} ORDER BY family, prefix".format(Aggregate._meta.db_table)
+    reach = None
+    for pk, prefix in _stream(sql):
+        network = netaddr.IPNetwork(prefix)
+        if reach is not None and reach[1].version == network.version and network.first <= reach[1].last:
+            yield {
+                'type': CONFLICT_OVERLAPPING_AGGREGATE,
+                'vrf': None,
+                'value': prefix,
+                'enforced': True,
+                'objects': [(reach[0], str(reach[1])), (pk, prefix)],
+            }
+        if reach is None or reach[1].version != network.version or network.last > reach[1].last:
+            reach = (pk, network)
+
+
+def find_conflicts(types=CONFLICT_TYPES, vrf_ids=None):
+    """
+    Yield all conflicts of the given types within the given VRFs (all VRFs if vrf_ids is None). Aggregates do not
+    belong to a VRF, so overlapping aggregates are found only if the global table is included.
+    """
+    if CONFLICT_DUPLICATE_IPADDRESS in types:
+        for conflict in find_duplicate_ipaddresses(vrf_ids):
+            yield conflict
+    if CONFLICT_DUPLICATE_PREFIX in types:
+        for conflict in find_duplicate_prefixes(vrf_ids):
+            yield conflict
+    if CONFLICT_OVERLAPPING_PREFIX in types:
+        for conflict in find_overlapping_prefixes(vrf_ids):
+            yield conflict
+    if CONFLICT_OVERLAPPING_AGGREGATE in types and (vrf_ids is None or None in vrf_ids):
+        for conflict in find_overlapping_aggregates():
+            yield conflict
+
+
+def find_duplicates_of(objects):
+    """
+    Return a dictionary mapping the index of each of the given Prefixes or IPAddresses (all of the same model and
+    already saved, e.g. in the course of a bulk import) to the string representation of an object duplicating it within
+    a VRF where unique IP space is enforced. As if each object had been validated before being saved in turn, only
+    objects which existed previously or which precede an object in the list are considered its duplicates. Duplicates
+    are found with a single query, regardless of the number of objects.
+    """
+    from .models import IPAddress
+
+    if not objects:
+        return {}
+    model = type(objects[0])
+    if model is IPAddress:
+        field, key = 'address', 'CAST(HOST(address) AS INET)'
+    else:
+        field, key = 'prefix', 'prefix'
+
+    def get_key(obj):
+        network = netaddr.IPNetwork(obj.address.ip) if model is IPAddress else obj.prefix.cidr
+        return obj.vrf_id, str(network)
+
+    # Group the keys of the objects by VRF, ignoring those within VRFs which permit duplicates
+    keys = {}
+    for obj in objects:
+        if (obj.vrf is None and settings.ENFORCE_GLOBAL_UNIQUE) or (obj.vrf and obj.vrf.enforce_unique):
+            keys.setdefault(obj.vrf_id, []).append(get_key(obj)[1])
+    if not keys:
+        return {}
+
+    conditions = []
+    params = []
+    for vrf_id, values in keys.items():
+        condition, vrf_params = _vrf_condition([vrf_id])
+        conditions.append('({} AND {} IN %s)'.format(condition, key))
+        params.extend(vrf_params + [tuple(values)])
+    sql = "SELECT id, vrf_id, {key}, {field} FROM {table} WHERE {conditions} ORDER BY id".format(
+        key=key, field=field, table=model._meta.db_table, conditions=' OR '.join(conditions)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    # Each object is duplicated by the first object sharing its key which is not itself one of the later objects
+    positions = {obj.pk: i for i, obj in enumerate(objects)}
+    matches = {}
+    for pk, vrf_id, value, obj in rows:
+        key = (vrf_id, str(netaddr.IPNetwork(value)))
+        matches.setdefault(key, []).append((positions.get(pk, -1), str(netaddr.IPNetwork(obj))))
+    duplicates = {}
+    for i, obj in enumerate(objects):
+        for position, duplicate in matches.get(get_key(obj), []):
+            if position < i:
+                duplicates[i] = duplicate
+                break
+    return duplicates
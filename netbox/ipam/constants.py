@@ -19,6 +19,13 @@ PREFIX_STATUS_CHOICES = (
     (PREFIX_STATUS_DEPRECATED, 'Deprecated')
 )
 
+# Prefix statuses which count toward the consumption of aggregate space (containers are ignored)
+AGGREGATE_STATISTIC_STATUSES = (
+    PREFIX_STATUS_ACTIVE,
+    PREFIX_STATUS_RESERVED,
+    PREFIX_STATUS_DEPRECATED,
+)
+
 # IP address statuses
 IPADDRESS_STATUS_ACTIVE = 1
 IPADDRESS_STATUS_RESERVED = 2
@@ -49,6 +56,10 @@ IPADDRESS_ROLE_CHOICES = (
     (IPADDRESS_ROLE_GLBP, 'GLBP'),
 )
 
+# VLAN IDs
+VLAN_VID_MIN = 1
+VLAN_VID_MAX = 4094
+
 # VLAN statuses
 VLAN_STATUS_ACTIVE = 1
 VLAN_STATUS_RESERVED = 2
@@ -76,3 +87,13 @@ IP_PROTOCOL_CHOICES = (
     (IP_PROTOCOL_TCP, 'TCP'),
     (IP_PROTOCOL_UDP, 'UDP'),
 )
+
+# Trigram indexes supporting text searches of IP addresses and prefixes, each defined by its name, table, and indexed
+# expression. The expressions must match the SQL generated by the text lookups on IP fields (TEXT(field)) and by
+# Django's icontains lookup on CharFields (UPPER(field::text)).
+TRIGRAM_INDEXES = (
+    ('ipam_prefix_prefix_trgm', 'ipam_prefix', 'TEXT(prefix)'),
+    ('ipam_prefix_description_trgm', 'ipam_prefix', 'UPPER(description::text)'),
+    ('ipam_ipaddress_address_trgm', 'ipam_ipaddress', 'TEXT(address)'),
+    ('ipam_ipaddress_description_trgm', 'ipam_ipaddress', 'UPPER(description::text)'),
+)
@@ -7,8 +7,8 @@ from django.db import models
 
 from .formfields import IPFormField
 from .lookups import (
-    EndsWith, IEndsWith, IRegex, IStartsWith, NetContained, NetContainedOrEqual, NetContains, NetContainsOrEquals,
-    NetHost, NetHostContained, NetMaskLength, Regex, StartsWith,
+    Contains, EndsWith, IContains, IEndsWith, IRegex, IStartsWith, NetContained, NetContainedOrEqual, NetContains,
+    NetContainsOrEquals, NetHost, NetHostContained, NetMaskLength, Regex, StartsWith,
 )
 
 
@@ -58,6 +58,8 @@ class IPNetworkField(BaseIPField):
         return 'cidr'
 
 
+IPNetworkField.register_lookup(Contains)
+IPNetworkField.register_lookup(IContains)
 IPNetworkField.register_lookup(EndsWith)
 IPNetworkField.register_lookup(IEndsWith)
 IPNetworkField.register_lookup(StartsWith)
@@ -81,6 +83,8 @@ class IPAddressField(BaseIPField):
         return 'inet'
 
 
+IPAddressField.register_lookup(Contains)
+IPAddressField.register_lookup(IContains)
 IPAddressField.register_lookup(EndsWith)
 IPAddressField.register_lookup(IEndsWith)
 IPAddressField.register_lookup(StartsWith)
@@ -13,6 +13,8 @@ from utilities.forms import (
     ExpandableIPAddressField, FilterChoiceField, FlexibleModelChoiceField, Livesearch, ReturnURLForm, SlugField,
     add_blank_choice,
 )
+from .analysis import MAX_BLOCKS
+from .formfields import IPFormField
 from .models import (
     Aggregate, IPAddress, IPADDRESS_ROLE_CHOICES, IPADDRESS_STATUS_CHOICES, Prefix, PREFIX_STATUS_CHOICES, RIR, Role,
     Service, VLAN, VLANGroup, VLAN_STATUS_CHOICES, VRF,
@@ -372,6 +374,37 @@ class PrefixFilterForm(BootstrapMixin, CustomFieldFilterForm):
     expand = forms.BooleanField(required=False, label='Expand prefix hierarchy')
 
 
+class IPv4SpaceReportForm(BootstrapMixin, forms.Form):
+    vrf_id = forms.ModelChoiceField(queryset=VRF.objects.all(), required=False, label='VRF', empty_label='Global')
+    parent = IPFormField(label='Parent prefix', widget=forms.TextInput(attrs={
+        'placeholder': 'Prefix',
+    }))
+    prefix_length = forms.IntegerField(min_value=1, max_value=32, initial=24, label='Block mask length')
+    threshold = forms.IntegerField(
+        min_value=0, max_value=100, required=False, initial=80, label='Minimum utilization',
+        help_text="List only blocks whose utilization (%) is at least this value"
+    )
+
+    def clean(self):
+        parent = self.cleaned_data.get('parent')
+        prefix_length = self.cleaned_data.get('prefix_length')
+        if parent is None or prefix_length is None:
+            return
+        if parent.version != 4:
+            raise forms.ValidationError({'parent': "Only IPv4 prefixes can be analyzed."})
+        self.cleaned_data['parent'] = parent.cidr
+        if prefix_length < parent.prefixlen:
+            raise forms.ValidationError({
+                'prefix_length': "Mask length must be at least that of the parent (/{}).".format(parent.prefixlen)
+            })
+        if 2 ** (prefix_length - parent.prefixlen) > MAX_BLOCKS:
+            raise forms.ValidationError({
+                'prefix_length': "A /{} cannot be divided into more than {} blocks.".format(
+                    parent.prefixlen, MAX_BLOCKS
+                )
+            })
+
+
 #
 # IP addresses
 #
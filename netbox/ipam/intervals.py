@@ -0,0 +1,156 @@
+from __future__ import unicode_literals
+
+import heapq
+
+import netaddr
+
+
+def get_width(family):
+    return 32 if family == 4 else 128
+
+
+def merge_intervals(intervals):
+    """
+    Merge an iterable of (first, last) integer intervals, sorted by their first value, into a list of disjoint
+    intervals. Intervals which overlap or abut one another are combined.
+    """
+    merged = []
+    for first, last in intervals:
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+
+class IntervalList(object):
+    """
+    A set of integers (such as IP addresses) stored as a sorted list of disjoint (first, last) intervals. Python
+    integers are unbounded, so IPv6 addresses are handled as readily as IPv4. Union and difference are computed in a
+    single pass over both lists, regardless of how fragmented they are.
+    """
+
+    def __init__(self, intervals=()):
+        self.intervals = merge_intervals(sorted(intervals))
+
+    @classmethod
+    def _from_merged(cls, intervals):
+        instance = cls()
+        instance.intervals = intervals
+        return instance
+
+    @classmethod
+    def from_networks(cls, networks):
+        """
+        Create an IntervalList covering the given networks (IPNetworks or strings).
+        """
+        return cls(
+            (network.first, network.last) for network in (
+                n if isinstance(n, netaddr.IPNetwork) else netaddr.IPNetwork(n) for n in networks
+            )
+        )
+
+    def __iter__(self):
+        return iter(self.intervals)
+
+    def __bool__(self):
+        return bool(self.intervals)
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        return self.intervals == other.intervals
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'IntervalList({!r})'.format(self.intervals)
+
+    @property
+    def size(self):
+        """
+        The number of integers within the list.
+        """
+        return sum(last - first + 1 for first, last in self.intervals)
+
+    def __or__(self, other):
+        return self._from_merged(merge_intervals(heapq.merge(self.intervals, other.intervals)))
+
+    def __sub__(self, other):
+        result = []
+        others = other.intervals
+        i = 0
+        for first, last in self.intervals:
+            # Skip intervals which end before this one begins
+            while i < len(others) and others[i][1] < first:
+                i += 1
+            j = i
+            while j < len(others) and others[j][0] <= last and first <= last:
+                start, end = others[j]
+                if start > first:
+                    result.append((first, start - 1))
+                first = max(first, end + 1)
+                j += 1
+            if first <= last:
+                result.append((first, last))
+        return self._from_merged(result)
+
+    def get_gaps(self, first, last):
+        """
+        Return an IntervalList of all integers from first to last which are not within this list.
+        """
+        return self._from_merged([(first, last)]) - self
+
+    def to_networks(self, family):
+        """
+        Return the smallest list of IPNetworks which exactly covers the list, in order.
+        """
+        networks = []
+        for first, last in self.intervals:
+            networks.extend(interval_to_networks(first, last, family))
+        return networks
+
+
+def interval_to_networks(first, last, family):
+    """
+    Return the smallest list of IPNetworks which exactly covers the given integer interval, in order.
+    """
+    width = get_width(family)
+    networks = []
+    while first <= last:
+        # Find the largest block aligned at first which does not extend past last
+        bits = (first & -first).bit_length() - 1 if first else width
+        while first + (1 << bits) - 1 > last:
+            bits -= 1
+        networks.append(netaddr.IPNetwork((first, width - bits), version=family))
+        first += 1 << bits
+    return networks
+
+
+def get_available_networks(parent, children):
+    """
+    Return a list of IPNetworks representing all space within the parent network which is not covered by any of the
+    children, in order.
+    """
+    covered = IntervalList.from_networks(children)
+    return covered.get_gaps(parent.first, parent.last).to_networks(parent.version)
+
+
+def carve_networks(parent, children, prefix_length, count=None):
+    """
+    Generate the first available networks of the given prefix length within the parent network, avoiding all space
+    covered by the children. Up to count networks are generated (or all available networks if count is None).
+    """
+    size = 1 << (get_width(parent.version) - prefix_length)
+    covered = IntervalList.from_networks(children)
+    for first, last in covered.get_gaps(parent.first, parent.last):
+        # Align the start of each network to its size
+        start = (first + size - 1) & ~(size - 1)
+        while start + size - 1 <= last:
+            if count is not None:
+                if not count:
+                    return
+                count -= 1
+            yield netaddr.IPNetwork((start, prefix_length), version=parent.version)
+            start += size
@@ -1,7 +1,6 @@
 from __future__ import unicode_literals
 
 from django.db.models import Lookup, Transform, IntegerField
-from django.db.models.lookups import BuiltinLookup
 
 
 class NetFieldDecoratorMixin(object):
@@ -13,28 +12,69 @@ class NetFieldDecoratorMixin(object):
         return lhs_string, lhs_params
 
 
-class EndsWith(NetFieldDecoratorMixin, BuiltinLookup):
+class NetPatternLookup(NetFieldDecoratorMixin, Lookup):
+    """
+    Match the text representation of an IP field (e.g. "192.0.2.1/24") against a partial value. TEXT(field) is compared
+    as-is, without the UPPER() Django applies for case-insensitive lookups, so that the trigram index on it can be used.
+    The value is not validated as an IP network.
+    """
+    prepare_rhs = False
+    operator = None
+    pattern = None
+
+    def as_sql(self, qn, connection):
+        lhs, lhs_params = self.process_lhs(qn, connection)
+        rhs, rhs_params = self.process_rhs(qn, connection)
+        if self.pattern and rhs_params:
+            rhs_params[0] = self.pattern.format(connection.ops.prep_for_like_query(rhs_params[0]))
+        params = lhs_params + rhs_params
+        return '%s %s %s' % (lhs, self.operator, rhs), params
+
+
+class Contains(NetPatternLookup):
+    lookup_name = 'contains'
+    operator = 'LIKE'
+    pattern = '%{}%'
+
+
+class IContains(NetPatternLookup):
+    lookup_name = 'icontains'
+    operator = 'ILIKE'
+    pattern = '%{}%'
+
+
+class EndsWith(NetPatternLookup):
     lookup_name = 'endswith'
+    operator = 'LIKE'
+    pattern = '%{}'
 
 
-class IEndsWith(NetFieldDecoratorMixin, BuiltinLookup):
+class IEndsWith(NetPatternLookup):
     lookup_name = 'iendswith'
+    operator = 'ILIKE'
+    pattern = '%{}'
 
 
-class StartsWith(NetFieldDecoratorMixin, BuiltinLookup):
+class StartsWith(NetPatternLookup):
     lookup_name = 'startswith'
+    operator = 'LIKE'
+    pattern = '{}%'
 
 
-class IStartsWith(NetFieldDecoratorMixin, BuiltinLookup):
+class IStartsWith(NetPatternLookup):
     lookup_name = 'istartswith'
+    operator = 'ILIKE'
+    pattern = '{}%'
 
 
-class Regex(NetFieldDecoratorMixin, BuiltinLookup):
+class Regex(NetPatternLookup):
     lookup_name = 'regex'
+    operator = '~'
 
 
-class IRegex(NetFieldDecoratorMixin, BuiltinLookup):
+class IRegex(NetPatternLookup):
     lookup_name = 'iregex'
+    operator = '~*'
 
 
 class NetContainsOrEquals(Lookup):
@@ -78,6 +118,10 @@ class NetContainedOrEqual(Lookup):
 
 
 class NetHost(Lookup):
+    """
+    Match the host portion of an IP address without regard to its mask. The host is cast back to an INET so that the
+    expression index on CAST(HOST(address) AS INET) can be used.
+    """
     lookup_name = 'net_host'
 
     def as_sql(self, qn, connection):
@@ -88,13 +132,14 @@ class NetHost(Lookup):
         if rhs_params:
             rhs_params[0] = rhs_params[0].split('/')[0]
         params = lhs_params + rhs_params
-        return 'HOST(%s) = %s' % (lhs, rhs), params
+        return 'CAST(HOST(%s) AS INET) = %s' % (lhs, rhs), params
 
 
 class NetHostContained(Lookup):
     """
     Check for the host portion of an IP address without regard to its mask. This allows us to find e.g. 192.0.2.1/24
-    when specifying a parent prefix of 192.0.2.0/26.
+    when specifying a parent prefix of 192.0.2.0/26. (PostgreSQL derives a range scan of the expression index on
+    CAST(HOST(address) AS INET) from the containment operator.)
     """
     lookup_name = 'net_host_contained'
 
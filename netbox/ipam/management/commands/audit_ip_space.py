@@ -0,0 +1,72 @@
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ipam.audit import (
+    CONFLICT_DUPLICATE_IPADDRESS, CONFLICT_DUPLICATE_PREFIX, CONFLICT_OVERLAPPING_PREFIX, CONFLICT_TYPES,
+    find_conflicts,
+)
+from ipam.models import VRF
+
+
+DESCRIPTIONS = {
+    CONFLICT_DUPLICATE_IPADDRESS: "Duplicate IP address",
+    CONFLICT_DUPLICATE_PREFIX: "Duplicate prefix",
+}
+
+
+class Command(BaseCommand):
+    help = "Report all duplicate IP addresses, duplicate prefixes, non-container prefixes containing other prefixes, " \
+           "and overlapping aggregates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vrf', dest='vrf', action='append',
+                            help="Limit to the specified VRF (by RD; include argument once per VRF)")
+        parser.add_argument('--global', dest='global_table', action='store_true', default=False,
+                            help="Limit to the global table (may be combined with --vrf)")
+        parser.add_argument('--type', dest='type', action='append', choices=CONFLICT_TYPES,
+                            help="Limit to the specified type of conflict (include argument once per type)")
+
+    def handle(self, *args, **options):
+
+        vrfs = {vrf.pk: vrf for vrf in VRF.objects.all()}
+
+        vrf_ids = None
+        if options['vrf'] or options['global_table']:
+            vrf_ids = [pk for pk, vrf in vrfs.items() if vrf.rd in (options['vrf'] or [])]
+            if options['vrf'] and len(vrf_ids) != len(options['vrf']):
+                raise CommandError("One or more VRFs specified but not found.")
+            if options['global_table']:
+                vrf_ids.append(None)
+
+        count = 0
+        for conflict in find_conflicts(options['type'] or CONFLICT_TYPES, vrf_ids):
+            count += 1
+            objects = ', '.join('{} (#{})'.format(obj, pk) for pk, obj in conflict['objects'])
+            if conflict['type'] == CONFLICT_OVERLAPPING_PREFIX:
+                # The containing prefixes are those equal to the conflicting value
+                vrf = vrfs.get(conflict['vrf'])
+                self.stdout.write("Non-container prefix {} ({}) in {} contains: {}".format(
+                    conflict['value'],
+                    ', '.join('#{}'.format(pk) for pk, obj in conflict['objects'] if obj == conflict['value']),
+                    "VRF {}".format(vrf) if vrf else "global table",
+                    ', '.join(
+                        '{} (#{})'.format(obj, pk) for pk, obj in conflict['objects'] if obj != conflict['value']
+                    )
+                ))
+            elif conflict['type'] in DESCRIPTIONS:
+                vrf = vrfs.get(conflict['vrf'])
+                self.stdout.write("{} {} in {}{}: {}".format(
+                    DESCRIPTIONS[conflict['type']],
+                    conflict['value'],
+                    "VRF {}".format(vrf) if vrf else "global table",
+                    "" if conflict['enforced'] else " (not enforced)",
+                    objects
+                ))
+            else:
+                self.stdout.write("Overlapping aggregates: {}".format(objects))
+
+        if count:
+            self.stdout.write(self.style.WARNING("Found {} conflicts.".format(count)))
+        else:
+            self.stdout.write(self.style.SUCCESS("No conflicts found."))
@@ -0,0 +1,83 @@
+from __future__ import unicode_literals
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+
+# Each benchmark pairs the SQL formerly generated by a lookup with the SQL it generates now (if it has changed).
+# %(table)s is replaced with the name of the scratch table.
+BENCHMARKS = [
+    (
+        'net_host',
+        "SELECT COUNT(*) FROM %(table)s WHERE HOST(address) = '10.3.2.1'",
+        "SELECT COUNT(*) FROM %(table)s WHERE CAST(HOST(address) AS INET) = '10.3.2.1'",
+    ),
+    (
+        'net_host_contained',
+        "SELECT COUNT(*) FROM %(table)s WHERE CAST(HOST(address) AS INET) << '10.3.2.0/24'",
+        None,
+    ),
+    (
+        'net_contained_or_equal',
+        "SELECT COUNT(*) FROM %(table)s WHERE address <<= '10.3.2.0/24'",
+        None,
+    ),
+]
+
+
+class Command(BaseCommand):
+    help = "Compare the query plans of the IP address lookups with and without their indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', dest='count', type=int, default=1000000,
+                            help="Number of IP addresses to generate (default: 1000000)")
+
+    def handle(self, *args, **options):
+
+        table = 'benchmark_ipaddress'
+
+        with connection.cursor() as cursor:
+
+            # Populate a temporary table (visible only to this session) with sequential IPs in 10.0.0.0/8
+            self.stdout.write("Generating {} IP addresses...".format(options['count']))
+            cursor.execute("CREATE TEMPORARY TABLE {} (id serial PRIMARY KEY, address inet NOT NULL)".format(table))
+            cursor.execute(
+                "INSERT INTO {} (address) SELECT SET_MASKLEN('10.0.0.0'::inet + i, 24) "
+                "FROM GENERATE_SERIES(1, %s) AS i".format(table),
+                [options['count']]
+            )
+            cursor.execute("ANALYZE {}".format(table))
+
+            results = {}
+            for indexed in (False, True):
+                if indexed:
+                    self.stdout.write("Creating indexes...")
+                    cursor.execute("CREATE INDEX ON {} USING GIST (address inet_ops)".format(table))
+                    cursor.execute("CREATE INDEX ON {} (CAST(HOST(address) AS INET))".format(table))
+                    cursor.execute("ANALYZE {}".format(table))
+                for name, old_sql, new_sql in BENCHMARKS:
+                    sql = (new_sql if indexed and new_sql else old_sql) % {'table': table}
+                    results[(name, indexed)] = self.explain(cursor, sql)
+
+            cursor.execute("DROP TABLE {}".format(table))
+
+        for name, old_sql, new_sql in BENCHMARKS:
+            self.stdout.write(self.style.MIGRATE_HEADING("\n{}".format(name)))
+            for indexed, label in ((False, "Before"), (True, "After")):
+                plan, duration = results[(name, indexed)]
+                self.stdout.write("{} ({:.2f} ms):".format(label, duration))
+                for line in plan:
+                    self.stdout.write("    {}".format(line))
+
+    def explain(self, cursor, sql):
+        """
+        Return the query plan for the given SQL along with the time taken to execute it, in milliseconds.
+        """
+        cursor.execute("EXPLAIN {}".format(sql))
+        plan = [row[0] for row in cursor.fetchall()]
+        start = time.time()
+        cursor.execute(sql)
+        cursor.fetchall()
+        return plan, (time.time() - start) * 1000
@@ -0,0 +1,38 @@
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+
+from ipam.constants import TRIGRAM_INDEXES
+
+
+class Command(BaseCommand):
+    help = "Create the trigram indexes used to search IP addresses and prefixes, if the migrations were applied " \
+           "before the pg_trgm extension was available"
+
+    def handle(self, *args, **options):
+
+        with connection.cursor() as cursor:
+
+            try:
+                with transaction.atomic():
+                    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            except DatabaseError:
+                raise CommandError(
+                    "The pg_trgm extension could not be created. Install the PostgreSQL contrib package and run "
+                    "\"CREATE EXTENSION pg_trgm;\" as a superuser, then run this command again."
+                )
+
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE indexname IN %s", [
+                tuple(name for name, table, expression in TRIGRAM_INDEXES)
+            ])
+            existing = set(row[0] for row in cursor.fetchall())
+
+            for name, table, expression in TRIGRAM_INDEXES:
+                if name in existing:
+                    self.stdout.write("Index {} already exists".format(name))
+                    continue
+                self.stdout.write("Creating index {}...".format(name))
+                cursor.execute("CREATE INDEX {} ON {} USING GIN (({}) gin_trgm_ops)".format(name, table, expression))
+
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,26 @@
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ipam.models import Aggregate, AggregateStatistic, RIR
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored space statistics of all aggregates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rir', dest='rir', action='append',
+                            help="Limit to the specified RIR (by slug; include argument once per RIR)")
+
+    def handle(self, *args, **options):
+
+        aggregates = None
+        if options['rir']:
+            rirs = RIR.objects.filter(slug__in=options['rir'])
+            if len(rirs) != len(options['rir']):
+                raise CommandError("One or more RIRs specified but not found.")
+            aggregates = Aggregate.objects.filter(rir__in=rirs)
+
+        self.stdout.write("Rebuilding aggregate statistics...")
+        count = AggregateStatistic.objects.rebuild(aggregates)
+        self.stdout.write(self.style.SUCCESS("Rebuilt statistics for {} aggregates.".format(count)))
@@ -0,0 +1,29 @@
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ipam.models import Prefix, VRF
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored depth and child count of all prefixes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vrf', dest='vrf', action='append',
+                            help="Limit to the specified VRF (by RD; include argument once per VRF)")
+        parser.add_argument('--global', dest='global_table', action='store_true', default=False,
+                            help="Limit to the global table (may be combined with --vrf)")
+
+    def handle(self, *args, **options):
+
+        vrf_ids = None
+        if options['vrf'] or options['global_table']:
+            vrf_ids = list(VRF.objects.filter(rd__in=options['vrf'] or []).values_list('pk', flat=True))
+            if options['vrf'] and len(vrf_ids) != len(options['vrf']):
+                raise CommandError("One or more VRFs specified but not found.")
+            if options['global_table']:
+                vrf_ids.append(None)
+
+        self.stdout.write("Rebuilding prefix hierarchy...")
+        count = Prefix.objects.rebuild_hierarchy(vrf_ids)
+        self.stdout.write(self.style.SUCCESS("Corrected {} prefixes.".format(count)))
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 02:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def populate_prefix_hierarchy(apps, schema_editor):
+    """
+    Compute the depth (number of distinct networks containing it) and child count (number of Prefixes nested beneath
+    it) of every Prefix within its VRF. Prefixes are walked in order of network and mask length, maintaining a stack
+    of the distinct networks containing the current one. Values are written in batches.
+    """
+    Prefix = apps.get_model('ipam', 'Prefix')
+
+    hierarchy = {}
+    stack = []
+    for pk, vrf_id, prefix in Prefix.objects.order_by('vrf_id', 'family', 'prefix').values_list(
+        'pk', 'vrf_id', 'prefix'
+    ):
+        # Leave each network on the stack which does not contain this Prefix
+        while stack and (
+            stack[-1]['vrf_id'] != vrf_id or stack[-1]['prefix'].version != prefix.version or
+            prefix not in stack[-1]['prefix']
+        ):
+            stack.pop()
+        if stack and stack[-1]['prefix'] == prefix:
+            # A duplicate shares the position (and depth) of the network preceding it
+            entry = stack.pop()
+        else:
+            entry = {'vrf_id': vrf_id, 'prefix': prefix, 'pks': []}
+        for parent in stack:
+            for parent_pk in parent['pks']:
+                hierarchy[parent_pk][1] += 1
+        hierarchy[pk] = [len(stack), 0]
+        entry['pks'].append(pk)
+        stack.append(entry)
+
+    # Apply the non-default values in batches using UPDATE ... FROM (VALUES ...)
+    changes = [(pk, depth, children) for pk, (depth, children) in hierarchy.items() if depth or children]
+    table = Prefix._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        for i in range(0, len(changes), BATCH_SIZE):
+            batch = changes[i:i + BATCH_SIZE]
+            cursor.execute(
+                "UPDATE {0} SET depth = v.depth, children = v.children FROM (VALUES {1}) AS v(id, depth, children) "
+                "WHERE {0}.id = v.id".format(table, ', '.join(['(%s, %s, %s)'] * len(batch))),
+                [value for change in batch for value in change]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ipam', '0018_remove_service_uniqueness_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prefix',
+            name='children',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of prefixes nested within this prefix'),
+        ),
+        migrations.AddField(
+            model_name='prefix',
+            name='depth',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False, help_text='Number of parent prefixes within the VRF'),
+        ),
+        migrations.RunPython(populate_prefix_hierarchy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 02:33
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import netaddr
+
+
+# Prefix statuses which count toward the consumption of aggregate space (active, reserved, and deprecated), as of this
+# migration
+AGGREGATE_STATISTIC_STATUSES = (1, 2, 3)
+
+
+def populate_aggregate_statistics(apps, schema_editor):
+    Aggregate = apps.get_model('ipam', 'Aggregate')
+    AggregateStatistic = apps.get_model('ipam', 'AggregateStatistic')
+    Prefix = apps.get_model('ipam', 'Prefix')
+
+    statistics = []
+    for aggregate in Aggregate.objects.all():
+        queryset = Prefix.objects.filter(prefix__net_contained_or_equal=str(aggregate.prefix))
+        consumed = netaddr.IPSet()
+        for status in AGGREGATE_STATISTIC_STATUSES:
+            covered = netaddr.IPSet(queryset.filter(status=status).values_list('prefix', flat=True))
+            consumed |= covered
+            statistics.append(AggregateStatistic(
+                aggregate=aggregate, family=aggregate.family, status=status, size=covered.size
+            ))
+        statistics.append(AggregateStatistic(
+            aggregate=aggregate, family=aggregate.family, status=None, size=aggregate.prefix.size - consumed.size
+        ))
+    AggregateStatistic.objects.bulk_create(statistics)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ipam', '0019_prefix_depth_children'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AggregateStatistic',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('family', models.PositiveSmallIntegerField(choices=[(4, 'IPv4'), (6, 'IPv6')])),
+                ('status', models.PositiveSmallIntegerField(blank=True, choices=[(0, 'Container'), (1, 'Active'), (2, 'Reserved'), (3, 'Deprecated')], null=True)),
+                ('size', models.DecimalField(decimal_places=0, help_text='Number of addresses', max_digits=39)),
+                ('aggregate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='ipam.Aggregate')),
+            ],
+            options={
+                'ordering': ['aggregate', 'status'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='aggregatestatistic',
+            unique_together=set([('aggregate', 'status')]),
+        ),
+        migrations.RunPython(populate_aggregate_statistics, migrations.RunPython.noop),
+    ]
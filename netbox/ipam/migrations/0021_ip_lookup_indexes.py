@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ipam', '0020_aggregatestatistic'),
+    ]
+
+    operations = [
+        # GiST indexes support the containment operators (<<, <<=, >>, >>=) used by the net_contained and net_contains
+        # families of lookups
+        migrations.RunSQL(
+            sql='CREATE INDEX ipam_prefix_prefix_gist ON ipam_prefix USING GIST (prefix inet_ops)',
+            reverse_sql='DROP INDEX ipam_prefix_prefix_gist',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX ipam_ipaddress_address_gist ON ipam_ipaddress USING GIST (address inet_ops)',
+            reverse_sql='DROP INDEX ipam_ipaddress_address_gist',
+        ),
+        # An expression index on the host portion of each IP address supports the net_host and net_host_contained
+        # lookups
+        migrations.RunSQL(
+            sql='CREATE INDEX ipam_ipaddress_host ON ipam_ipaddress (CAST(HOST(address) AS INET))',
+            reverse_sql='DROP INDEX ipam_ipaddress_host',
+        ),
+    ]
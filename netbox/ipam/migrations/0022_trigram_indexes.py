@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import warnings
+
+from django.db import DatabaseError, migrations, transaction
+
+
+# A frozen copy of ipam.constants.TRIGRAM_INDEXES as of this migration. Each index is defined by its name, table, and
+# indexed expression.
+TRIGRAM_INDEXES = (
+    ('ipam_prefix_prefix_trgm', 'ipam_prefix', 'TEXT(prefix)'),
+    ('ipam_prefix_description_trgm', 'ipam_prefix', 'UPPER(description::text)'),
+    ('ipam_ipaddress_address_trgm', 'ipam_ipaddress', 'TEXT(address)'),
+    ('ipam_ipaddress_description_trgm', 'ipam_ipaddress', 'UPPER(description::text)'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+    Trigram indexes require the pg_trgm extension, which is distributed with PostgreSQL's contrib package and must be
+    created by a superuser. If the extension is not available (and cannot be created), the indexes are skipped with a
+    warning: searches still work, but without the benefit of an index. The indexes can be created later using the
+    create_trigram_indexes management command.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            with transaction.atomic():
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DatabaseError:
+            warnings.warn(
+                "The pg_trgm extension is not available, so the trigram indexes used to search IP addresses and "
+                "prefixes were not created. Once the extension has been installed, create them by running "
+                "\"python manage.py create_trigram_indexes\"."
+            )
+            return
+        for name, table, expression in TRIGRAM_INDEXES:
+            cursor.execute("CREATE INDEX {} ON {} USING GIN (({}) gin_trgm_ops)".format(name, table, expression))
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for name, table, expression in TRIGRAM_INDEXES:
+            cursor.execute("DROP INDEX IF EXISTS {}".format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ipam', '0021_ip_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 03:11
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ipam', '0022_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VRFSummary',
+            fields=[
+                ('vrf', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='ipam.VRF')),
+                ('prefixes_container', models.PositiveIntegerField(default=0)),
+                ('prefixes_active', models.PositiveIntegerField(default=0)),
+                ('prefixes_reserved', models.PositiveIntegerField(default=0)),
+                ('prefixes_deprecated', models.PositiveIntegerField(default=0)),
+                ('ipaddresses_active', models.PositiveIntegerField(default=0)),
+                ('ipaddresses_reserved', models.PositiveIntegerField(default=0)),
+                ('ipaddresses_deprecated', models.PositiveIntegerField(default=0)),
+                ('ipaddresses_dhcp', models.PositiveIntegerField(default=0)),
+                ('utilization', models.PositiveSmallIntegerField(blank=True, help_text='Average utilization of top-level prefixes', null=True)),
+                ('computed', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'VRF summary',
+                'verbose_name_plural': 'VRF summaries',
+            },
+        ),
+    ]
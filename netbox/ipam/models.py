@@ -1,13 +1,18 @@
 from __future__ import unicode_literals
+from collections import defaultdict
 import netaddr
+from netaddr.strategy import ipv4, ipv6
 
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericRelation
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import BooleanField, Case, Count, F, Q, Sum, Value, When
+from django.db.models.query import ModelIterable
 from django.db.models.expressions import RawSQL
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 
 from dcim.models import Interface
@@ -18,6 +23,9 @@ from utilities.sql import NullsFirstQuerySet
 from utilities.utils import csv_format
 from .constants import *
 from .fields import IPNetworkField, IPAddressField
+from .intervals import IntervalList, get_available_networks
+from .radix import prefix_index, rebuild_prefix_hierarchy, update_prefix_hierarchy
+from .utilization import annotate_aggregate_utilization, annotate_prefix_utilization
 
 
 @python_2_unicode_compatible
@@ -63,6 +71,142 @@ class VRF(CreatedUpdatedModel, CustomFieldModel):
             return "{} ({})".format(self.name, self.rd)
         return None
 
+    def get_summary(self):
+        """
+        Return the cached VRFSummary of this VRF, computing it if necessary.
+        """
+        try:
+            return self.summary
+        except VRFSummary.DoesNotExist:
+            self.summary = VRFSummary.objects.get_for_vrfs([self.pk])[self.pk]
+            return self.summary
+
+
+class VRFSummaryQuerySet(models.QuerySet):
+
+    def invalidate(self, vrf_ids):
+        """
+        Discard the summaries of the given VRFs (identified by PK, with None representing the global table, which has no
+        summary). Invalidation takes place within the current transaction, so it is undone along with any change which
+        is rolled back.
+        """
+        vrf_ids = set(vrf_id for vrf_id in vrf_ids if vrf_id is not None)
+        if vrf_ids:
+            self.filter(vrf_id__in=vrf_ids).delete()
+
+    def get_for_vrfs(self, vrf_ids):
+        """
+        Return a dictionary mapping each of the given VRF PKs to its summary. Summaries which are not cached are
+        computed for all such VRFs together (using a fixed number of queries regardless of their number) and stored.
+        """
+        vrf_ids = set(vrf_ids)
+        summaries = {summary.vrf_id: summary for summary in self.filter(vrf_id__in=vrf_ids)}
+        missing = vrf_ids.difference(summaries)
+        if not missing:
+            return summaries
+
+        computed = {vrf_id: self.model(vrf_id=vrf_id) for vrf_id in missing}
+        for model, status_fields in (
+            (Prefix, VRFSummary.prefix_status_fields),
+            (IPAddress, VRFSummary.ipaddress_status_fields),
+        ):
+            queryset = model.objects.filter(vrf_id__in=missing).order_by().values_list('vrf_id', 'status').annotate(
+                Count('pk')
+            )
+            for vrf_id, status, count in queryset:
+                if status in status_fields:
+                    setattr(computed[vrf_id], status_fields[status], count)
+
+        top_level = defaultdict(list)
+        prefixes = list(Prefix.objects.filter(vrf_id__in=missing, depth=0).order_by())
+        for prefix in annotate_prefix_utilization(prefixes):
+            top_level[prefix.vrf_id].append(prefix.utilization)
+        for vrf_id, utilizations in top_level.items():
+            computed[vrf_id].utilization = sum(utilizations) // len(utilizations)
+
+        try:
+            with transaction.atomic():
+                self.model.objects.bulk_create(computed.values())
+        except IntegrityError:
+            # Another request has cached summaries for some of these VRFs concurrently.
+            pass
+
+        summaries.update(computed)
+        return summaries
+
+
+class VRFSummary(models.Model):
+    """
+    A cached summary of the Prefixes and IPAddresses within a VRF: the number of each by status, and the average
+    utilization of its top-level Prefixes. A summary is computed when first needed and discarded whenever a Prefix or
+    IPAddress within the VRF is changed (see ipam.signals), to be recomputed on its next use.
+    """
+    vrf = models.OneToOneField('VRF', related_name='summary', on_delete=models.CASCADE, primary_key=True)
+    prefixes_container = models.PositiveIntegerField(default=0)
+    prefixes_active = models.PositiveIntegerField(default=0)
+    prefixes_reserved = models.PositiveIntegerField(default=0)
+    prefixes_deprecated = models.PositiveIntegerField(default=0)
+    ipaddresses_active = models.PositiveIntegerField(default=0)
+    ipaddresses_reserved = models.PositiveIntegerField(default=0)
+    ipaddresses_deprecated = models.PositiveIntegerField(default=0)
+    ipaddresses_dhcp = models.PositiveIntegerField(default=0)
+    utilization = models.PositiveSmallIntegerField(blank=True, null=True,
+                                                   help_text="Average utilization of top-level prefixes")
+    computed = models.DateTimeField(auto_now_add=True)
+
+    objects = VRFSummaryQuerySet.as_manager()
+
+    prefix_status_fields = {
+        PREFIX_STATUS_CONTAINER: 'prefixes_container',
+        PREFIX_STATUS_ACTIVE: 'prefixes_active',
+        PREFIX_STATUS_RESERVED: 'prefixes_reserved',
+        PREFIX_STATUS_DEPRECATED: 'prefixes_deprecated',
+    }
+    ipaddress_status_fields = {
+        IPADDRESS_STATUS_ACTIVE: 'ipaddresses_active',
+        IPADDRESS_STATUS_RESERVED: 'ipaddresses_reserved',
+        IPADDRESS_STATUS_DEPRECATED: 'ipaddresses_deprecated',
+        IPADDRESS_STATUS_DHCP: 'ipaddresses_dhcp',
+    }
+
+    class Meta:
+        verbose_name = 'VRF summary'
+        verbose_name_plural = 'VRF summaries'
+
+    def _get_counts(self, choices, status_fields):
+        return [(label, getattr(self, status_fields[status])) for status, label in choices]
+
+    def get_prefix_counts(self):
+        """
+        Return a list of (status, count) tuples for the Prefixes within the VRF.
+        """
+        return self._get_counts(PREFIX_STATUS_CHOICES, self.prefix_status_fields)
+
+    def get_ipaddress_counts(self):
+        """
+        Return a list of (status, count) tuples for the IPAddresses within the VRF.
+        """
+        return self._get_counts(IPADDRESS_STATUS_CHOICES, self.ipaddress_status_fields)
+
+    @property
+    def prefix_count(self):
+        return sum(count for status, count in self.get_prefix_counts())
+
+    @property
+    def ipaddress_count(self):
+        return sum(count for status, count in self.get_ipaddress_counts())
+
+
+def annotate_vrf_summaries(vrfs):
+    """
+    Assign to each of the given VRFs its summary (as returned by get_summary()). Cached summaries are retrieved with a
+    single query, and any which are not cached are computed for all of the VRFs together. Returns the list of VRFs.
+    """
+    summaries = VRFSummary.objects.get_for_vrfs([vrf.pk for vrf in vrfs])
+    for vrf in vrfs:
+        vrf.summary = summaries[vrf.pk]
+    return vrfs
+
 
 @python_2_unicode_compatible
 class RIR(models.Model):
@@ -144,7 +288,9 @@ class Aggregate(CreatedUpdatedModel, CustomFieldModel):
         if self.prefix:
             # Infer address family from IPNetwork object
             self.family = self.prefix.version
-        super(Aggregate, self).save(*args, **kwargs)
+        with transaction.atomic():
+            super(Aggregate, self).save(*args, **kwargs)
+            AggregateStatistic.objects.rebuild([self])
 
     def to_csv(self):
         return csv_format([
@@ -158,9 +304,137 @@ class Aggregate(CreatedUpdatedModel, CustomFieldModel):
         """
         Determine the prefix utilization of the aggregate and return it as a percentage.
         """
-        queryset = Prefix.objects.filter(prefix__net_contained_or_equal=str(self.prefix))
-        child_prefixes = netaddr.IPSet([p.prefix for p in queryset])
-        return int(float(child_prefixes.size) / self.prefix.size * 100)
+        annotate_aggregate_utilization([self])
+        return self.utilization
+
+
+class AggregateStatisticQuerySet(models.QuerySet):
+
+    def rebuild(self, aggregates=None):
+        """
+        Recompute the statistics of the given Aggregates (or of all Aggregates if none are specified). The Prefixes
+        within all Aggregates are retrieved in a single query.
+        """
+        aggregates = list(Aggregate.objects.all() if aggregates is None else aggregates)
+        if not aggregates:
+            return 0
+
+        with transaction.atomic():
+
+            # Block concurrent adjustments of the statistics (see update_for_prefix()) until they have been replaced
+            list(Aggregate.objects.filter(pk__in=[a.pk for a in aggregates]).order_by('pk').select_for_update())
+
+            sql = "SELECT a.id, p.status, p.prefix FROM {} AS a INNER JOIN {} AS p ON p.prefix <<= a.prefix " \
+                  "WHERE a.id IN %s AND p.status IN %s".format(Aggregate._meta.db_table, Prefix._meta.db_table)
+            prefixes = defaultdict(lambda: defaultdict(list))
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [tuple(a.pk for a in aggregates), tuple(AGGREGATE_STATISTIC_STATUSES)])
+                for aggregate_id, status, prefix in cursor.fetchall():
+                    prefixes[aggregate_id][status].append(prefix)
+
+            statistics = []
+            for aggregate in aggregates:
+                consumed = IntervalList()
+                for status in AGGREGATE_STATISTIC_STATUSES:
+                    covered = IntervalList.from_networks(prefixes[aggregate.pk][status])
+                    consumed |= covered
+                    statistics.append(
+                        self.model(aggregate=aggregate, family=aggregate.family, status=status, size=covered.size)
+                    )
+                statistics.append(
+                    self.model(aggregate=aggregate, family=aggregate.family, status=None,
+                               size=aggregate.prefix.size - consumed.size)
+                )
+
+            self.model.objects.filter(aggregate__in=aggregates).delete()
+            self.model.objects.bulk_create(statistics)
+
+        return len(aggregates)
+
+    def rebuild_for_prefixes(self, prefixes):
+        """
+        Recompute the statistics of all Aggregates containing any of the given networks, which are selected with a
+        single query.
+        """
+        prefixes = [str(netaddr.IPNetwork(prefix)) for prefix in prefixes]
+        if not prefixes:
+            return 0
+        aggregates = Aggregate.objects.extra(where=['prefix >>= ANY(%s::cidr[])'], params=[prefixes])
+        return self.rebuild(aggregates)
+
+    def update_for_prefix(self, prefix, status, pk, delta):
+        """
+        Adjust the statistics of the Aggregate containing a Prefix as it is added (delta=1) or removed (delta=-1). Only
+        the portion of the Prefix not already covered by other Prefixes of the same status is counted. The Aggregate is
+        locked until the end of the transaction in which the Prefix is saved, so any concurrent change within the same
+        Aggregate waits for this one to be committed and then sees its Prefix.
+        """
+        if status not in AGGREGATE_STATISTIC_STATUSES:
+            return
+        with transaction.atomic():
+
+            # Lock the Aggregate so that the Prefixes of concurrent changes within it are accounted for in turn
+            aggregate = Aggregate.objects.filter(
+                prefix__net_contains_or_equals=str(prefix)
+            ).order_by('pk').select_for_update().first()
+            if aggregate is None:
+                return
+            within = Prefix.objects.filter(prefix__net_contained_or_equal=str(aggregate.prefix)).exclude(pk=pk)
+
+            def get_uncovered_size(queryset):
+                if queryset.filter(prefix__net_contains_or_equals=str(prefix)).exists():
+                    return 0
+                covered = IntervalList.from_networks(
+                    queryset.filter(prefix__net_contained=str(prefix)).values_list('prefix', flat=True)
+                )
+                return prefix.size - covered.size
+
+            statistics = self.filter(aggregate=aggregate)
+            statistics.filter(status=status).update(
+                size=F('size') + delta * get_uncovered_size(within.filter(status=status))
+            )
+            statistics.filter(status__isnull=True).update(
+                size=F('size') - delta * get_uncovered_size(within.filter(status__in=AGGREGATE_STATISTIC_STATUSES))
+            )
+
+    def get_rir_totals(self, family):
+        """
+        Return a dictionary mapping the PK of each RIR to the total number of addresses within its Aggregates of the
+        given family, keyed by Prefix status ('active', 'reserved', 'deprecated', 'available', and 'total').
+        """
+        totals = defaultdict(lambda: dict.fromkeys(['total', 'active', 'reserved', 'deprecated', 'available'], 0))
+        for rir_id, prefix in Aggregate.objects.filter(family=family).values_list('rir_id', 'prefix'):
+            totals[rir_id]['total'] += prefix.size
+        queryset = self.filter(family=family).order_by().values_list('aggregate__rir_id', 'status').annotate(
+            Sum('size')
+        )
+        names = {
+            PREFIX_STATUS_ACTIVE: 'active',
+            PREFIX_STATUS_RESERVED: 'reserved',
+            PREFIX_STATUS_DEPRECATED: 'deprecated',
+            None: 'available',
+        }
+        for rir_id, status, size in queryset:
+            totals[rir_id][names[status]] += int(size)
+        return totals
+
+
+class AggregateStatistic(models.Model):
+    """
+    The amount of address space within an Aggregate which is allocated to Prefixes of a particular status. A status of
+    null represents the space not allocated to any Prefix. Statistics are maintained as Prefixes are changed and may be
+    recomputed using the rebuild_aggregate_stats management command.
+    """
+    aggregate = models.ForeignKey('Aggregate', related_name='statistics', on_delete=models.CASCADE)
+    family = models.PositiveSmallIntegerField(choices=AF_CHOICES)
+    status = models.PositiveSmallIntegerField(choices=PREFIX_STATUS_CHOICES, blank=True, null=True)
+    size = models.DecimalField(max_digits=39, decimal_places=0, help_text="Number of addresses")
+
+    objects = AggregateStatisticQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['aggregate', 'status']
+        unique_together = ['aggregate', 'status']
 
 
 @python_2_unicode_compatible
@@ -190,37 +464,90 @@ class Role(models.Model):
 
 class PrefixQuerySet(NullsFirstQuerySet):
 
-    def annotate_depth(self, limit=None):
+    def update(self, **kwargs):
+        """
+        Bulk updates bypass Prefix.save(), so recompute the stored hierarchy surrounding both the old and new positions
+        of any Prefixes being moved, and the statistics of all affected Aggregates if any Prefixes are being moved or
+        changing status. The summaries of the affected VRFs are invalidated, as is the prefix index if any Prefixes
+        are moved.
+        """
+        moved = bool(set(kwargs).intersection(['prefix', 'vrf', 'vrf_id']))
+        if not moved and 'status' not in kwargs:
+            return super(PrefixQuerySet, self).update(**kwargs)
+        if moved:
+            # auto_now is not applied by update(). Touch last_updated so that the fingerprints of the affected prefix
+            # index trees change, and the trees are rebuilt by every process.
+            kwargs.setdefault('last_updated', timezone.now())
+        with transaction.atomic():
+            positions = set(self.order_by().values_list('vrf_id', 'prefix').distinct())
+            vrf_ids = set(vrf_id for vrf_id, prefix in positions)
+            prefixes = set(prefix for vrf_id, prefix in positions)
+            count = super(PrefixQuerySet, self).update(**kwargs)
+            if moved:
+                transaction.on_commit(prefix_index.clear)
+                vrf = kwargs.get('vrf', kwargs.get('vrf_id'))
+                new_positions = [(
+                    getattr(vrf, 'pk', vrf) if 'vrf' in kwargs or 'vrf_id' in kwargs else vrf_id,
+                    kwargs.get('prefix', prefix)
+                ) for vrf_id, prefix in positions]
+                update_prefix_hierarchy(self.model, positions.union(new_positions))
+                vrf_ids.update(vrf_id for vrf_id, prefix in new_positions)
+            if 'prefix' in kwargs:
+                prefixes.add(kwargs['prefix'])
+            AggregateStatistic.objects.rebuild_for_prefixes(prefixes)
+            VRFSummary.objects.invalidate(vrf_ids)
+        return count
+
+    def delete(self):
+        """
+        Recompute the stored hierarchy surrounding the deleted Prefixes and the statistics of all affected Aggregates
+        after deleting Prefixes in bulk. (Prefixes deleted together cannot be accounted for individually, as each must
+        be considered in the absence of the others.)
+        """
+        with transaction.atomic():
+            positions = set(self.order_by().values_list('vrf_id', 'prefix').distinct())
+            result = super(PrefixQuerySet, self).delete()
+            update_prefix_hierarchy(self.model, positions)
+            AggregateStatistic.objects.rebuild_for_prefixes(set(prefix for vrf_id, prefix in positions))
+        return result
+
+    def rebuild_hierarchy(self, vrf_ids=None):
         """
-        Iterate through a QuerySet of Prefixes and annotate the hierarchical level of each. While it would be preferable
-        to do this using .extra() on the QuerySet to count the unique parents of each prefix, that approach introduces
-        performance issues at scale.
+        Recompute the stored depth and child count of every Prefix within the given VRFs (identified by PK, with None
+        representing the global table), or of all Prefixes if no VRFs are specified. Returns the number of Prefixes
+        which were corrected.
+        """
+        queryset = self.model.objects.all()
+        if vrf_ids is not None:
+            query = Q(vrf__in=[vrf_id for vrf_id in vrf_ids if vrf_id is not None])
+            if None in vrf_ids:
+                query |= Q(vrf__isnull=True)
+            queryset = queryset.filter(query)
+        return rebuild_prefix_hierarchy(queryset)
 
-        Because we're adding a non-field attribute to the model, annotation must be made *after* any QuerySet
-        modifications.
+    def annotate_depth(self, limit=None):
         """
+        Annotate the hierarchical level of each Prefix within the QuerySet (relative to the other Prefixes in the set)
+        as relative_depth, and whether it contains any other member of the set as has_children. The hierarchy is
+        resolved against the in-memory prefix index, so only the primary keys of the QuerySet need to be retrieved up
+        front. When a depth limit is given and the QuerySet has not been filtered, the hierarchy relative to the set
+        matches the stored depth of each Prefix, so Prefixes nested beyond the limit are never fetched.
+
+        The stored depth of each Prefix is left untouched. Because we're adding non-field attributes to the model,
+        annotation must be made *after* any QuerySet modifications.
+        """
+        members = list(self.order_by().values_list('pk', 'vrf_id', 'family'))
+        depths, parents = prefix_index.get_hierarchy(members)
+
         queryset = self
-        stack = []
+        if limit is not None and not self.query.has_filters():
+            queryset = self.filter(depth__lte=limit)
         for p in queryset:
-            try:
-                prev_p = stack[-1]
-            except IndexError:
-                prev_p = None
-            if prev_p is not None:
-                while (p.prefix not in prev_p.prefix) or p.prefix == prev_p.prefix:
-                    stack.pop()
-                    try:
-                        prev_p = stack[-1]
-                    except IndexError:
-                        prev_p = None
-                        break
-            if prev_p is not None:
-                prev_p.has_children = True
-            stack.append(p)
-            p.depth = len(stack) - 1
+            p.relative_depth = depths.get(p.pk, 0)
+            p.has_children = p.pk in parents
         if limit is None:
             return queryset
-        return list(filter(lambda p: p.depth <= limit, queryset))
+        return [p for p in queryset if p.relative_depth <= limit]
 
 
 @python_2_unicode_compatible
@@ -245,6 +572,10 @@ class Prefix(CreatedUpdatedModel, CustomFieldModel):
     is_pool = models.BooleanField(verbose_name='Is a pool', default=False,
                                   help_text="All IP addresses within this prefix are considered usable")
     description = models.CharField(max_length=100, blank=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False, db_index=True,
+                                             help_text="Number of parent prefixes within the VRF")
+    children = models.PositiveIntegerField(default=0, editable=False,
+                                           help_text="Number of prefixes nested within this prefix")
     custom_field_values = GenericRelation(CustomFieldValue, content_type_field='obj_type', object_id_field='obj_id')
 
     objects = PrefixQuerySet.as_manager()
@@ -253,6 +584,9 @@ class Prefix(CreatedUpdatedModel, CustomFieldModel):
         'prefix', 'vrf', 'tenant', 'site', 'vlan_group', 'vlan_vid', 'status', 'role', 'is_pool', 'description',
     ]
 
+    # Disabled where duplicates are instead checked for many Prefixes at once (see audit.find_duplicates_of())
+    check_duplicates = True
+
     class Meta:
         ordering = ['vrf', 'family', 'prefix']
         verbose_name_plural = 'prefixes'
@@ -278,15 +612,12 @@ class Prefix(CreatedUpdatedModel, CustomFieldModel):
                 })
 
             # Enforce unique IP space (if applicable)
-            if (self.vrf is None and settings.ENFORCE_GLOBAL_UNIQUE) or (self.vrf and self.vrf.enforce_unique):
+            if self.check_duplicates and (
+                (self.vrf is None and settings.ENFORCE_GLOBAL_UNIQUE) or (self.vrf and self.vrf.enforce_unique)
+            ):
                 duplicate_prefixes = self.get_duplicates()
                 if duplicate_prefixes:
-                    raise ValidationError({
-                        'prefix': "Duplicate prefix found in {}: {}".format(
-                            "VRF {}".format(self.vrf) if self.vrf else "global table",
-                            duplicate_prefixes.first(),
-                        )
-                    })
+                    raise self.get_duplicate_error(duplicate_prefixes.first())
 
     def save(self, *args, **kwargs):
         if self.prefix:
@@ -294,7 +625,53 @@ class Prefix(CreatedUpdatedModel, CustomFieldModel):
             self.prefix = self.prefix.cidr
             # Infer address family from IPNetwork object
             self.family = self.prefix.version
-        super(Prefix, self).save(*args, **kwargs)
+
+        with transaction.atomic():
+
+            # Determine whether the Prefix is being added to or moved within the hierarchy
+            previous = None
+            if self.pk:
+                previous = Prefix.objects.filter(pk=self.pk).values_list('vrf_id', 'prefix', 'status').first()
+            moved = previous is None or previous[:2] != (self.vrf_id, self.prefix)
+            changed = previous is None or previous[1:] != (self.prefix, self.status)
+
+            if changed and previous is not None:
+                AggregateStatistic.objects.update_for_prefix(previous[1], previous[2], self.pk, delta=-1)
+
+            if moved:
+                if previous is not None:
+                    self.update_hierarchy(previous[0], previous[1], delta=-1)
+                parents = Prefix.objects.filter(vrf=self.vrf_id, prefix__net_contains=str(self.prefix))
+                self.depth = parents.exclude(pk=self.pk).order_by().values('prefix').distinct().count()
+                children = Prefix.objects.filter(vrf=self.vrf_id, prefix__net_contained=str(self.prefix))
+                self.children = children.exclude(pk=self.pk).count()
+
+            super(Prefix, self).save(*args, **kwargs)
+
+            if moved:
+                self.update_hierarchy(self.vrf_id, self.prefix, delta=1)
+
+            if changed:
+                AggregateStatistic.objects.update_for_prefix(self.prefix, self.status, self.pk, delta=1)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            pk = self.pk
+            result = super(Prefix, self).delete(*args, **kwargs)
+            self.update_hierarchy(self.vrf_id, self.prefix, delta=-1)
+            AggregateStatistic.objects.update_for_prefix(self.prefix, self.status, pk, delta=-1)
+        return result
+
+    def update_hierarchy(self, vrf_id, prefix, delta):
+        """
+        Adjust the stored depth and child count of the Prefixes surrounding the given position as this Prefix is added
+        to (delta=1) or removed from (delta=-1) it. Only parent and child Prefixes within the same VRF are affected.
+        """
+        related = Prefix.objects.filter(vrf=vrf_id).exclude(pk=self.pk)
+        related.filter(prefix__net_contains=str(prefix)).update(children=F('children') + delta)
+        # Nested Prefixes change depth only if no duplicate of this Prefix occupies the same position
+        if not related.filter(prefix=str(prefix)).exists():
+            related.filter(prefix__net_contained=str(prefix)).update(depth=F('depth') + delta)
 
     def to_csv(self):
         return csv_format([
@@ -316,46 +693,74 @@ class Prefix(CreatedUpdatedModel, CustomFieldModel):
     def get_duplicates(self):
         return Prefix.objects.filter(vrf=self.vrf, prefix=str(self.prefix)).exclude(pk=self.pk)
 
+    def get_duplicate_error(self, duplicate):
+        return ValidationError({
+            'prefix': "Duplicate prefix found in {}: {}".format(
+                "VRF {}".format(self.vrf) if self.vrf else "global table",
+                duplicate,
+            )
+        })
+
+    def get_child_prefixes(self):
+        """
+        Return all Prefixes within this Prefix (in the same VRF).
+        """
+        return Prefix.objects.filter(prefix__net_contained=str(self.prefix), vrf=self.vrf)
+
+    def get_available_prefixes(self):
+        """
+        Return all available space within this prefix as a list of IPNetworks, in order.
+        """
+        return get_available_networks(self.prefix, self.get_child_prefixes().values_list('prefix', flat=True))
+
     def get_child_ips(self):
         """
         Return all IPAddresses within this Prefix.
         """
         return IPAddress.objects.filter(address__net_contained_or_equal=str(self.prefix), vrf=self.vrf)
 
-    def get_available_ips(self):
+    def get_available_ranges(self):
         """
-        Return all available IPs within this prefix as an IPSet.
+        Generate each contiguous range of available IPs within this prefix as an IPRange, in order. Child IPs are
+        streamed from the database in address order, so only as many are retrieved as are needed to reach each range.
         """
-        prefix = netaddr.IPSet(self.prefix)
-        child_ips = netaddr.IPSet([ip.address.ip for ip in self.get_child_ips()])
-        available_ips = prefix - child_ips
+        first, last = self.prefix.first, self.prefix.last
 
-        # Remove unusable IPs from non-pool prefixes
+        # Exclude unusable IPs from non-pool prefixes
         if not self.is_pool:
-            available_ips -= netaddr.IPSet([
-                netaddr.IPAddress(self.prefix.first),
-                netaddr.IPAddress(self.prefix.last),
-            ])
+            first, last = first + 1, last - 1
+
+        def get_range(start, end):
+            return netaddr.IPRange(
+                netaddr.IPAddress(start, self.family), netaddr.IPAddress(end, self.family)
+            )
+
+        next_ip = first
+        for record in self.get_child_ips().records(related=False):
+            if next_ip > last:
+                return
+            value = record.value
+            if value > next_ip:
+                yield get_range(next_ip, min(value - 1, last))
+            next_ip = max(next_ip, value + 1)
+        if next_ip <= last:
+            yield get_range(next_ip, last)
 
-        return available_ips
+    def get_available_ips(self):
+        """
+        Generate all available IPs within this prefix, in order.
+        """
+        for ip_range in self.get_available_ranges():
+            for ip in ip_range:
+                yield ip
 
     def get_utilization(self):
         """
         Determine the utilization of the prefix and return it as a percentage. For Prefixes with a status of
         "container", calculate utilization based on child prefixes. For all others, count child IP addresses.
         """
-        if self.status == PREFIX_STATUS_CONTAINER:
-            queryset = Prefix.objects.filter(prefix__net_contained=str(self.prefix), vrf=self.vrf)
-            child_prefixes = netaddr.IPSet([p.prefix for p in queryset])
-            return int(float(child_prefixes.size) / self.prefix.size * 100)
-        else:
-            child_count = IPAddress.objects.filter(
-                address__net_contained_or_equal=str(self.prefix), vrf=self.vrf
-            ).count()
-            prefix_size = self.prefix.size
-            if self.family == 4 and self.prefix.prefixlen < 31 and not self.is_pool:
-                prefix_size -= 2
-            return int(float(child_count) / prefix_size * 100)
+        annotate_prefix_utilization([self])
+        return self.utilization
 
     @property
     def new_subnet(self):
@@ -369,7 +774,186 @@ class Prefix(CreatedUpdatedModel, CustomFieldModel):
             return None
 
 
-class IPAddressManager(models.Manager):
+def annotate_child_prefixes(prefixes, levels):
+    """
+    Assign to each of the given Prefixes (which must share a VRF and depth, sorted by prefix) a list of its immediate
+    children as child_prefixes, nested up to the given number of levels. Prefixes at the deepest level requested have
+    their child_prefixes set to None. All descendants are retrieved with a single query and attached to their parents in
+    a single ordered pass. Returns a list of the descendants retrieved.
+    """
+    for prefix in prefixes:
+        prefix.child_prefixes = [] if levels > 0 else None
+    if not prefixes or levels < 1:
+        return []
+
+    depth = prefixes[0].depth
+    query = Q()
+    for prefix in prefixes:
+        query |= Q(prefix__net_contained=str(prefix.prefix))
+    descendants = list(Prefix.objects.filter(
+        query, vrf_id=prefixes[0].vrf_id, depth__gt=depth, depth__lte=depth + levels
+    ).select_related(
+        'site', 'vrf__tenant', 'tenant', 'vlan', 'role'
+    ))
+
+    # Walk all Prefixes in order, keeping a stack of the chain of Prefixes containing the current one. Each descendant
+    # is attached to the innermost (shallower) Prefix containing it.
+    stack = []
+    for prefix in sorted(prefixes + descendants, key=lambda p: (p.family, p.prefix.first, p.prefix.prefixlen)):
+        while stack and (stack[-1].prefix.last < prefix.prefix.first or stack[-1].depth >= prefix.depth):
+            stack.pop()
+        if prefix.depth > depth:
+            prefix.child_prefixes = [] if prefix.depth < depth + levels else None
+            if stack:
+                stack[-1].child_prefixes.append(prefix)
+        stack.append(prefix)
+
+    return descendants
+
+
+@python_2_unicode_compatible
+class IPAddressRecord(object):
+    """
+    A compact, read-only representation of an IPAddress, as yielded by IPAddressQuerySet.records(). The address is held
+    as its integer value and prefix length rather than as an IPNetwork, and related objects only by their PKs and
+    names. Attributes which were not retrieved are None.
+    """
+    __slots__ = (
+        'pk', 'family', 'value', 'prefix_length', 'vrf_id', 'tenant_id', 'status', 'role', 'interface_id',
+        'description', 'vrf_rd', 'tenant_name', 'interface_name', 'device_id', 'device_name', 'is_primary',
+    )
+
+    # The fields retrieved for each record, beyond its address, and those which require related objects to be joined
+    fields = ('pk', 'family', 'vrf_id', 'tenant_id', 'status', 'role', 'interface_id', 'description')
+    related_fields = (
+        'vrf__rd', 'tenant__name', 'interface__name', 'interface__device_id', 'interface__device__name', 'is_primary',
+    )
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+        for name in self.__slots__[len(values):]:
+            setattr(self, name, None)
+
+    def __str__(self):
+        return '{}/{}'.format(
+            (ipv4 if self.family == 4 else ipv6).int_to_str(self.value), self.prefix_length
+        )
+
+    def get_status_display(self):
+        return dict(IPADDRESS_STATUS_CHOICES).get(self.status, self.status)
+
+    def get_role_display(self):
+        return dict(IPADDRESS_ROLE_CHOICES).get(self.role, self.role)
+
+    def to_csv(self):
+        """
+        Return the same CSV values as IPAddress.to_csv() (for a record retrieved with its related fields).
+        """
+        if self.device_id is not None and self.device_name is None:
+            device = '{{{}}}'.format(self.device_id)
+        else:
+            device = self.device_name
+        return csv_format([
+            str(self),
+            self.vrf_rd,
+            self.tenant_name,
+            self.get_status_display(),
+            self.get_role_display(),
+            device,
+            self.interface_name,
+            self.is_primary,
+            self.description,
+        ])
+
+
+class IPAddressQuerySet(models.QuerySet):
+
+    def __init__(self, *args, **kwargs):
+        super(IPAddressQuerySet, self).__init__(*args, **kwargs)
+        self._annotate_parent_prefix = False
+
+    def _clone(self, **kwargs):
+        clone = super(IPAddressQuerySet, self)._clone(**kwargs)
+        clone._annotate_parent_prefix = self._annotate_parent_prefix
+        return clone
+
+    def _fetch_all(self):
+        annotate = self._result_cache is None and self._annotate_parent_prefix
+        super(IPAddressQuerySet, self)._fetch_all()
+        if annotate and self._iterable_class is ModelIterable:
+            annotate_parent_prefixes(self._result_cache)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Bulk creation bypasses the signals which invalidate VRF summaries, so invalidate the summaries of all VRFs to
+        which IPAddresses are being added.
+        """
+        with transaction.atomic():
+            objs = super(IPAddressQuerySet, self).bulk_create(objs, *args, **kwargs)
+            VRFSummary.objects.invalidate(obj.vrf_id for obj in objs)
+        return objs
+
+    def update(self, **kwargs):
+        """
+        Bulk updates bypass the signals which invalidate VRF summaries, so invalidate the summaries of all affected VRFs
+        if any IPAddresses are being moved or changing status.
+        """
+        if not set(kwargs).intersection(['vrf', 'vrf_id', 'status']):
+            return super(IPAddressQuerySet, self).update(**kwargs)
+        with transaction.atomic():
+            vrf_ids = set(self.order_by().values_list('vrf_id', flat=True).distinct())
+            count = super(IPAddressQuerySet, self).update(**kwargs)
+            vrf = kwargs.get('vrf', kwargs.get('vrf_id'))
+            vrf_ids.add(getattr(vrf, 'pk', vrf))
+            VRFSummary.objects.invalidate(vrf_ids)
+        return count
+
+    def annotate_parent_prefix(self):
+        """
+        Annotate each IPAddress with the most specific Prefix containing it within its VRF (as parent_prefix, or None),
+        with the Prefix's Site and VLAN selected. Parents are resolved against the in-memory prefix index when the
+        QuerySet is evaluated, so only the IPAddresses actually retrieved (e.g. a single page) are annotated, using one
+        additional query to fetch all of their Prefixes.
+        """
+        clone = self._clone()
+        clone._annotate_parent_prefix = True
+        return clone
+
+    def records(self, related=True):
+        """
+        Iterate over the IPAddresses as IPAddressRecords rather than model instances, for bulk operations (e.g. CSV
+        export) which read many IPs. Rows are streamed from the database and only their integer addresses are computed.
+        If related is False, only the IPAddresses' own fields are retrieved, avoiding any joins.
+        """
+        fields = IPAddressRecord.fields + (IPAddressRecord.related_fields if related else ())
+        queryset = self.prefetch_related(None).annotate(
+            record_host=RawSQL('HOST(ipam_ipaddress.address)', []),
+            record_prefix_length=RawSQL('MASKLEN(ipam_ipaddress.address)', []),
+        )
+        if related:
+            queryset = queryset.annotate(is_primary=Case(
+                When(family=4, primary_ip4_for__isnull=False, then=Value(True)),
+                When(family=6, primary_ip6_for__isnull=False, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField()
+            ))
+        str_to_int = {4: ipv4.str_to_int, 6: ipv6.str_to_int}
+        for row in queryset.values_list('record_host', 'record_prefix_length', *fields).iterator():
+            yield IPAddressRecord(row[2], row[3], str_to_int[row[3]](row[0]), row[1], *row[4:])
+
+
+def annotate_parent_prefixes(ip_addresses):
+    """
+    Assign the most specific parent Prefix (or None) to each of the given IPAddresses as parent_prefix.
+    """
+    pk_list = prefix_index.get_closest_parents([(ip.vrf_id, ip.address) for ip in ip_addresses])
+    prefixes = Prefix.objects.select_related('site', 'vlan').in_bulk(set(pk for pk in pk_list if pk is not None))
+    for ip, pk in zip(ip_addresses, pk_list):
+        ip.parent_prefix = prefixes.get(pk)
+
+
+class IPAddressManager(models.Manager.from_queryset(IPAddressQuerySet)):
 
     def get_queryset(self):
         """
@@ -420,6 +1004,10 @@ class IPAddress(CreatedUpdatedModel, CustomFieldModel):
     csv_headers = [
         'address', 'vrf', 'tenant', 'status', 'role', 'device', 'interface_name', 'is_primary', 'description',
     ]
+    csv_parent_headers = ['parent_prefix', 'parent_vlan', 'parent_site']
+
+    # Disabled where duplicates are instead checked for many IPAddresses at once (see audit.find_duplicates_of())
+    check_duplicates = True
 
     class Meta:
         ordering = ['family', 'address']
@@ -435,20 +1023,25 @@ class IPAddress(CreatedUpdatedModel, CustomFieldModel):
     def get_duplicates(self):
         return IPAddress.objects.filter(vrf=self.vrf, address__net_host=str(self.address.ip)).exclude(pk=self.pk)
 
+    def get_duplicate_error(self, duplicate):
+        return ValidationError({
+            'address': "Duplicate IP address found in {}: {}".format(
+                "VRF {}".format(self.vrf) if self.vrf else "global table",
+                duplicate,
+            )
+        })
+
     def clean(self):
 
         if self.address:
 
             # Enforce unique IP space (if applicable)
-            if (self.vrf is None and settings.ENFORCE_GLOBAL_UNIQUE) or (self.vrf and self.vrf.enforce_unique):
+            if self.check_duplicates and (
+                (self.vrf is None and settings.ENFORCE_GLOBAL_UNIQUE) or (self.vrf and self.vrf.enforce_unique)
+            ):
                 duplicate_ips = self.get_duplicates()
                 if duplicate_ips:
-                    raise ValidationError({
-                        'address': "Duplicate IP address found in {}: {}".format(
-                            "VRF {}".format(self.vrf) if self.vrf else "global table",
-                            duplicate_ips.first(),
-                        )
-                    })
+                    raise self.get_duplicate_error(duplicate_ips.first())
 
     def save(self, *args, **kwargs):
         if self.address:
@@ -476,7 +1069,22 @@ class IPAddress(CreatedUpdatedModel, CustomFieldModel):
             self.interface.name if self.interface else None,
             is_primary,
             self.description,
-        ])
+        ] + self.get_parent_csv_values())
+
+    def get_parent_csv_values(self):
+        """
+        Return the CSV values describing the parent Prefix of an IPAddress annotated by annotate_parent_prefix().
+        """
+        if not hasattr(self, 'parent_prefix'):
+            return []
+        parent = self.parent_prefix
+        if parent is None:
+            return [None, None, None]
+        return [
+            parent.prefix,
+            parent.vlan.vid if parent.vlan else None,
+            parent.site.name if parent.site else None,
+        ]
 
     @property
     def device(self):
@@ -512,6 +1120,23 @@ class VLANGroup(models.Model):
     def get_absolute_url(self):
         return "{}?group_id={}".format(reverse('ipam:vlan_list'), self.pk)
 
+    def get_vid_bitmap(self):
+        """
+        Return the occupancy of VLAN IDs within the group as a 4096-bit integer, in which bit n is set if VID n is in
+        use. Only a single query is executed.
+        """
+        bitmap = 0
+        for vid in self.vlans.values_list('vid', flat=True):
+            bitmap |= 1 << vid
+        return bitmap
+
+    def get_available_vids(self):
+        """
+        Return a list of all VLAN IDs not in use within the group, in order.
+        """
+        bitmap = self.get_vid_bitmap()
+        return [vid for vid in range(VLAN_VID_MIN, VLAN_VID_MAX + 1) if not bitmap >> vid & 1]
+
 
 @python_2_unicode_compatible
 class VLAN(CreatedUpdatedModel, CustomFieldModel):
@@ -526,8 +1151,8 @@ class VLAN(CreatedUpdatedModel, CustomFieldModel):
     site = models.ForeignKey('dcim.Site', related_name='vlans', on_delete=models.PROTECT, blank=True, null=True)
     group = models.ForeignKey('VLANGroup', related_name='vlans', blank=True, null=True, on_delete=models.PROTECT)
     vid = models.PositiveSmallIntegerField(verbose_name='ID', validators=[
-        MinValueValidator(1),
-        MaxValueValidator(4094)
+        MinValueValidator(VLAN_VID_MIN),
+        MaxValueValidator(VLAN_VID_MAX)
     ])
     name = models.CharField(max_length=64)
     tenant = models.ForeignKey(Tenant, related_name='vlans', blank=True, null=True, on_delete=models.PROTECT)
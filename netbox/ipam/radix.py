@@ -0,0 +1,429 @@
+from __future__ import unicode_literals
+
+from collections import defaultdict
+import threading
+
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q
+
+
+class PrefixNode(object):
+    """
+    A single node within a PrefixTree. Nodes which have no Prefixes assigned exist only to join two diverging branches.
+    """
+    __slots__ = ('network', 'length', 'pks', 'children')
+
+    def __init__(self, network, length):
+        self.network = network
+        self.length = length
+        self.pks = []
+        self.children = [None, None]
+
+
+class PrefixTree(object):
+    """
+    A path-compressed binary (Patricia) trie holding the Prefixes of a single VRF and address family. Networks are keyed
+    by their integer value and mask length, so insertion, removal, and parent/child lookups all complete in time
+    proportional to the mask length rather than the number of Prefixes.
+    """
+
+    def __init__(self, family):
+        self.family = family
+        self.width = 32 if family == 4 else 128
+        self.root = PrefixNode(0, 0)
+        self.nodes = {}
+        self.fingerprint = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _bit(self, network, position):
+        return (network >> (self.width - position - 1)) & 1
+
+    def _mask(self, network, length):
+        if not length:
+            return 0
+        return network & (((1 << length) - 1) << (self.width - length))
+
+    def _walk(self, network, length):
+        """
+        Yield each node along the path from the root to the most specific node which covers the given network.
+        """
+        node = self.root
+        while True:
+            yield node
+            if node.length >= length:
+                return
+            child = node.children[self._bit(network, node.length)]
+            if child is None or child.length > length or self._mask(network, child.length) != child.network:
+                return
+            node = child
+
+    def insert(self, network, length, pk):
+        node = self.root
+        while node.length < length:
+            bit = self._bit(network, node.length)
+            child = node.children[bit]
+            if child is None:
+                child = node.children[bit] = PrefixNode(network, length)
+            else:
+                # Determine how many leading bits the new network shares with the existing child
+                common = min(child.length, length)
+                common -= ((child.network ^ network) >> (self.width - common)).bit_length() if common else 0
+                if common < child.length:
+                    # Split the branch by inserting an intermediate node which covers both networks
+                    split = PrefixNode(self._mask(network, common), common)
+                    split.children[self._bit(child.network, common)] = child
+                    child = node.children[bit] = split
+            node = child
+        node.pks.append(pk)
+        self.nodes[pk] = node
+
+    def remove(self, pk):
+        """
+        Remove a Prefix from the tree, pruning any nodes which are no longer needed. Returns False if the Prefix was not
+        present.
+        """
+        node = self.nodes.pop(pk, None)
+        if node is None:
+            return False
+        node.pks.remove(pk)
+        if not node.pks:
+            self._prune(list(self._walk(node.network, node.length)))
+        return True
+
+    def _prune(self, path):
+        node = path[-1]
+        if node.pks or node is self.root:
+            return
+        remaining = [child for child in node.children if child is not None]
+        if len(remaining) == 2:
+            return
+        parent = path[-2]
+        parent.children[parent.children.index(node)] = remaining[0] if remaining else None
+        if not remaining:
+            self._prune(path[:-1])
+
+    def get_node(self, network, length):
+        for node in self._walk(network, length):
+            if node.length == length and node.network == network:
+                return node
+        return None
+
+    def get_ancestors(self, network, length):
+        """
+        Return all nodes holding Prefixes which contain the given network, ordered from least to most specific.
+        """
+        return [node for node in self._walk(network, length) if node.pks and node.length < length]
+
+    def get_children(self, network, length):
+        """
+        Return the nodes holding the immediate children of the given network (the most specific Prefixes beneath it
+        which are not themselves contained by another child).
+        """
+        path = list(self._walk(network, length))
+        last = path[-1]
+        if last.length == length:
+            stack = [child for child in last.children if child is not None]
+        else:
+            child = last.children[self._bit(network, last.length)]
+            if child is not None and child.length > length and self._mask(child.network, length) == network:
+                stack = [child]
+            else:
+                stack = []
+        children = []
+        while stack:
+            node = stack.pop()
+            if node.pks:
+                children.append(node)
+            else:
+                stack.extend(child for child in node.children if child is not None)
+        return sorted(children, key=lambda n: n.network)
+
+    def get_depth(self, network, length):
+        return len(self.get_ancestors(network, length))
+
+    def has_children(self, network, length):
+        return bool(self.get_children(network, length))
+
+    def get_hierarchy(self):
+        """
+        Return a dictionary mapping the PK of every Prefix in the tree to a tuple of its depth (the number of distinct
+        networks containing it) and the total number of Prefixes nested beneath it.
+        """
+        hierarchy = {}
+
+        def walk(node, depth):
+            child_depth = depth + 1 if node.pks else depth
+            descendants = 0
+            for child in node.children:
+                if child is not None:
+                    descendants += walk(child, child_depth)
+            for pk in node.pks:
+                hierarchy[pk] = (depth, descendants)
+            return descendants + len(node.pks)
+
+        walk(self.root, 0)
+        return hierarchy
+
+
+def rebuild_prefix_hierarchy(queryset, batch_size=1000):
+    """
+    Recompute the stored depth and child count of every Prefix in the given QuerySet, which must include all Prefixes of
+    each VRF it represents. Only rows whose values have changed are written. Returns the number of rows corrected.
+    """
+    trees = {}
+    stored = {}
+    for pk, vrf_id, family, prefix, depth, children in queryset.order_by().values_list(
+        'pk', 'vrf_id', 'family', 'prefix', 'depth', 'children'
+    ):
+        if (vrf_id, family) not in trees:
+            trees[(vrf_id, family)] = PrefixTree(family)
+        trees[(vrf_id, family)].insert(prefix.value, prefix.prefixlen, pk)
+        stored[pk] = (depth, children)
+
+    changes = []
+    for tree in trees.values():
+        for pk, values in tree.get_hierarchy().items():
+            if stored[pk] != values:
+                changes.append((pk,) + values)
+
+    # Apply the corrections in batches using UPDATE ... FROM (VALUES ...)
+    table = queryset.model._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        for i in range(0, len(changes), batch_size):
+            batch = changes[i:i + batch_size]
+            cursor.execute(
+                "UPDATE {0} SET depth = v.depth, children = v.children FROM (VALUES {1}) AS v(id, depth, children) "
+                "WHERE {0}.id = v.id".format(table, ', '.join(['(%s, %s, %s)'] * len(batch))),
+                [value for change in batch for value in change]
+            )
+
+    return len(changes)
+
+
+# Recompute the depth and child count of each Prefix containing, equal to, or contained by any of the given positions
+# (VRF and prefix) from the Prefixes surrounding it, using the GiST index on prefix. Only changed rows are written.
+UPDATE_HIERARCHY_SQL = """
+WITH affected AS (
+    SELECT DISTINCT p.id, p.vrf_id, p.prefix FROM {table} AS p
+    JOIN (VALUES {values}) AS v(vrf_id, prefix)
+    ON p.vrf_id IS NOT DISTINCT FROM v.vrf_id AND (p.prefix >>= v.prefix OR p.prefix << v.prefix)
+), hierarchy AS (
+    SELECT
+        a.id,
+        (SELECT COUNT(DISTINCT q.prefix) FROM {table} AS q
+         WHERE q.vrf_id IS NOT DISTINCT FROM a.vrf_id AND q.prefix >> a.prefix) AS depth,
+        (SELECT COUNT(*) FROM {table} AS q
+         WHERE q.vrf_id IS NOT DISTINCT FROM a.vrf_id AND q.prefix << a.prefix) AS children
+    FROM affected AS a
+)
+UPDATE {table} SET depth = h.depth, children = h.children FROM hierarchy AS h
+WHERE {table}.id = h.id AND ({table}.depth, {table}.children) IS DISTINCT FROM (h.depth, h.children)
+"""
+
+
+def update_prefix_hierarchy(model, positions, batch_size=1000):
+    """
+    Recompute the stored depth and child count of only those Prefixes affected by adding or removing Prefixes at the
+    given positions, an iterable of (vrf_id, prefix) tuples: those which contain, duplicate, or are nested within any
+    of them. Returns the number of rows corrected.
+    """
+    positions = list(set((vrf_id, str(prefix)) for vrf_id, prefix in positions))
+    count = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for i in range(0, len(positions), batch_size):
+            batch = positions[i:i + batch_size]
+            cursor.execute(
+                UPDATE_HIERARCHY_SQL.format(
+                    table=model._meta.db_table, values=', '.join(['(%s::integer, %s::cidr)'] * len(batch))
+                ),
+                [value for position in batch for value in position]
+            )
+            count += cursor.rowcount
+    return count
+
+
+class PrefixIndex(object):
+    """
+    A per-process registry of PrefixTrees, one for each combination of VRF and address family. Each tree is built the
+    first time it is needed and afterward kept current by the Prefix signal handlers in ipam.signals.
+
+    Before a tree is used it is checked against a fingerprint of its VRF (the number of Prefixes and the most recent
+    modification time) retrieved with a single aggregate query. This catches changes made by other processes, which
+    cause the affected tree to be rebuilt.
+    """
+
+    def __init__(self):
+        self._trees = {}
+        self._lock = threading.RLock()
+
+    def _get_fingerprints(self, keys):
+        from .models import Prefix
+
+        vrf_ids = set(vrf_id for vrf_id, family in keys)
+        query = Q(vrf_id__in=[vrf_id for vrf_id in vrf_ids if vrf_id is not None])
+        if None in vrf_ids:
+            query |= Q(vrf__isnull=True)
+        queryset = Prefix.objects.filter(query).order_by().values_list('vrf_id', 'family').annotate(
+            Count('pk'), Max('last_updated')
+        )
+        return {(vrf_id, family): (count, last_updated) for vrf_id, family, count, last_updated in queryset}
+
+    def _build_tree(self, key, fingerprint):
+        from .models import Prefix
+
+        vrf_id, family = key
+        tree = PrefixTree(family)
+        for pk, prefix in Prefix.objects.filter(vrf_id=vrf_id, family=family).order_by().values_list('pk', 'prefix'):
+            tree.insert(prefix.value, prefix.prefixlen, pk)
+        tree.fingerprint = fingerprint
+        self._trees[key] = tree
+        return tree
+
+    def get_trees(self, keys):
+        """
+        Return a dictionary mapping each (vrf_id, family) key to its validated PrefixTree.
+        """
+        keys = set(keys)
+        if not keys:
+            return {}
+        fingerprints = self._get_fingerprints(keys)
+        trees = {}
+        with self._lock:
+            for key in keys:
+                fingerprint = fingerprints.get(key, (0, None))
+                tree = self._trees.get(key)
+                if tree is None or tree.fingerprint != fingerprint:
+                    tree = self._build_tree(key, fingerprint)
+                trees[key] = tree
+        return trees
+
+    def get_tree(self, vrf_id, family):
+        return self.get_trees([(vrf_id, family)])[(vrf_id, family)]
+
+    def get_parents(self, prefix, include_global=True):
+        """
+        Return the PKs of all Prefixes containing the given Prefix. Prefixes in the global table are considered parents
+        of Prefixes in a VRF unless include_global is False.
+        """
+        keys = [(prefix.vrf_id, prefix.family)]
+        if include_global and prefix.vrf_id is not None:
+            keys.append((None, prefix.family))
+        pk_list = []
+        for tree in self.get_trees(keys).values():
+            for node in tree.get_ancestors(prefix.prefix.value, prefix.prefix.prefixlen):
+                pk_list.extend(node.pks)
+        return pk_list
+
+    def get_children(self, prefix):
+        """
+        Return the PKs of all immediate children of the given Prefix within its VRF.
+        """
+        tree = self.get_tree(prefix.vrf_id, prefix.family)
+        pk_list = []
+        for node in tree.get_children(prefix.prefix.value, prefix.prefix.prefixlen):
+            pk_list.extend(node.pks)
+        return pk_list
+
+    def get_hierarchy(self, members):
+        """
+        Compute the hierarchy of an arbitrary set of Prefixes relative to one another, given an iterable of (pk, vrf_id,
+        family) tuples. Returns a dictionary mapping each PK to its depth (the number of distinct member Prefixes which
+        contain it) and the set of PKs which contain at least one other member.
+        """
+        groups = defaultdict(list)
+        for pk, vrf_id, family in members:
+            groups[(vrf_id, family)].append(pk)
+        member_set = set(pk for pk_list in groups.values() for pk in pk_list)
+
+        depths = {}
+        parents = set()
+        for key, tree in self.get_trees(groups.keys()).items():
+            for pk in groups[key]:
+                node = tree.nodes.get(pk)
+                if node is None:
+                    depths[pk] = 0
+                    continue
+                depth = 0
+                for ancestor in tree.get_ancestors(node.network, node.length):
+                    containing = [ancestor_pk for ancestor_pk in ancestor.pks if ancestor_pk in member_set]
+                    if containing:
+                        depth += 1
+                        parents.update(containing)
+                depths[pk] = depth
+
+        return depths, parents
+
+    def get_closest_parents(self, addresses):
+        """
+        Given a list of (vrf_id, address) tuples, return a list of the PK of the most specific Prefix within the same
+        VRF which contains each host address (or None if it has no parent). All trees involved are validated together,
+        so only a single query is executed regardless of the number of addresses.
+        """
+        trees = self.get_trees((vrf_id, address.version) for vrf_id, address in addresses)
+        pk_list = []
+        for vrf_id, address in addresses:
+            tree = trees[(vrf_id, address.version)]
+            ancestors = tree.get_ancestors(address.value, tree.width)
+            pk_list.append(min(ancestors[-1].pks) if ancestors else None)
+        return pk_list
+
+    def update(self, pk, vrf_id, family, prefix, last_updated):
+        """
+        Record the creation or modification of a Prefix.
+        """
+        with self._lock:
+            removed_from = self._discard(pk)
+            key = (vrf_id, family)
+            tree = self._trees.get(key)
+            if tree is not None:
+                tree.insert(prefix.value, prefix.prefixlen, pk)
+                count, _ = tree.fingerprint
+                if removed_from != key:
+                    count += 1
+                self._sync_fingerprint(key, (count, last_updated))
+            if removed_from is not None and removed_from != key:
+                self._sync_fingerprint(removed_from)
+
+    def delete(self, pk):
+        """
+        Record the deletion of a Prefix.
+        """
+        with self._lock:
+            removed_from = self._discard(pk)
+            if removed_from is not None:
+                self._sync_fingerprint(removed_from)
+
+    def _discard(self, pk):
+        for key, tree in self._trees.items():
+            if tree.remove(pk):
+                return key
+        return None
+
+    def _sync_fingerprint(self, key, expected=None):
+        """
+        Adopt the current fingerprint for a tree which has just been updated in place. The expected fingerprint is the
+        one which should result from the local change alone (for removals, only the count is predictable). If another
+        process has modified the VRF concurrently, the tree is discarded to be rebuilt on next use.
+        """
+        tree = self._trees[key]
+        fingerprint = self._get_fingerprints([key]).get(key, (0, None))
+        if expected is not None:
+            in_sync = fingerprint == expected
+        else:
+            count, last_updated = tree.fingerprint
+            in_sync = fingerprint[0] == count - 1 and (
+                fingerprint[1] is None or last_updated is None or fingerprint[1] <= last_updated
+            )
+        if in_sync:
+            tree.fingerprint = fingerprint
+        else:
+            del self._trees[key]
+
+    def clear(self):
+        with self._lock:
+            self._trees = {}
+
+
+prefix_index = PrefixIndex()
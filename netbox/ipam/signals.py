@@ -0,0 +1,49 @@
+from __future__ import unicode_literals
+
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import IPAddress, Prefix, VRFSummary
+from .radix import prefix_index
+
+
+@receiver(post_save, sender=Prefix)
+def update_prefix_index(instance, **kwargs):
+    """
+    Update the in-memory prefix index once the creation or modification of a Prefix has been committed.
+    """
+    transaction.on_commit(partial(
+        prefix_index.update, instance.pk, instance.vrf_id, instance.family, instance.prefix, instance.last_updated
+    ))
+
+
+@receiver(post_delete, sender=Prefix)
+def remove_from_prefix_index(instance, **kwargs):
+    """
+    Remove a deleted Prefix from the in-memory prefix index once the deletion has been committed.
+    """
+    transaction.on_commit(partial(prefix_index.delete, instance.pk))
+
+
+@receiver(pre_save, sender=IPAddress)
+@receiver(pre_save, sender=Prefix)
+def invalidate_previous_vrf_summary(sender, instance, **kwargs):
+    """
+    Discard the summary of the VRF to which an existing Prefix or IPAddress belonged prior to its modification.
+    """
+    if instance.pk:
+        VRFSummary.objects.filter(vrf__in=sender.objects.filter(pk=instance.pk).values('vrf')).delete()
+
+
+@receiver(post_save, sender=IPAddress)
+@receiver(post_save, sender=Prefix)
+@receiver(post_delete, sender=IPAddress)
+@receiver(post_delete, sender=Prefix)
+def invalidate_vrf_summary(instance, **kwargs):
+    """
+    Discard the summary of the VRF to which a Prefix or IPAddress has been saved, or from which it has been deleted.
+    """
+    VRFSummary.objects.invalidate([instance.vrf_id])
@@ -37,6 +37,11 @@ UTILIZATION_GRAPH = """
 {% if record.pk %}{% utilization_graph value %}{% else %}&mdash;{% endif %}
 """
 
+VRF_UTILIZATION_GRAPH = """
+{% load helpers %}
+{% if record.summary.utilization is not None %}{% utilization_graph record.summary.utilization %}{% else %}&mdash;{% endif %}
+"""
+
 ROLE_ACTIONS = """
 {% if perms.ipam.change_role %}
     <a href="{% url 'ipam:role_edit' slug=record.slug %}" class="btn btn-xs btn-warning"><i class="glyphicon glyphicon-pencil" aria-hidden="true"></i></a>
@@ -45,16 +50,16 @@ ROLE_ACTIONS = """
 
 PREFIX_LINK = """
 {% if record.has_children %}
-    <span class="text-nowrap" style="padding-left: {{ record.depth }}0px "><i class="fa fa-caret-right"></i></a>
+    <span class="text-nowrap" style="padding-left: {{ record.relative_depth }}0px "><i class="fa fa-caret-right"></i></a>
 {% else %}
-    <span class="text-nowrap" style="padding-left: {{ record.depth }}9px">
+    <span class="text-nowrap" style="padding-left: {{ record.relative_depth }}9px">
 {% endif %}
     <a href="{% if record.pk %}{% url 'ipam:prefix' pk=record.pk %}{% else %}{% url 'ipam:prefix_add' %}?prefix={{ record }}{% if parent.vrf %}&vrf={{ parent.vrf.pk }}{% endif %}{% if parent.site %}&site={{ parent.site.pk }}{% endif %}{% endif %}">{{ record.prefix }}</a>
 </span>
 """
 
 PREFIX_LINK_BRIEF = """
-<span style="padding-left: {{ record.depth }}0px">
+<span style="padding-left: {{ record.relative_depth }}0px">
     <a href="{% if record.pk %}{% url 'ipam:prefix' pk=record.pk %}{% else %}{% url 'ipam:prefix_add' %}?prefix={{ record }}{% if parent.vrf %}&vrf={{ parent.vrf.pk }}{% endif %}{% if parent.site %}&site={{ parent.site.pk }}{% endif %}{% endif %}">{{ record.prefix }}</a>
 </span>
 """
@@ -125,6 +130,15 @@ VLANGROUP_ACTIONS = """
 {% endif %}
 """
 
+IPV4_SPACE_BLOCK_LINK = """
+<a href="{% url 'ipam:prefix_list' %}?parent={{ record.prefix }}&vrf_id={{ record.vrf_id|default:'0' }}">{{ record.prefix }}</a>
+"""
+
+IPV4_SPACE_UTILIZATION = """
+{% load helpers %}
+{% utilization_graph value %}
+"""
+
 TENANT_LINK = """
 {% if record.tenant %}
     <a href="{% url 'tenancy:tenant' slug=record.tenant.slug %}">{{ record.tenant }}</a>
@@ -151,6 +165,17 @@ class VRFTable(BaseTable):
         fields = ('pk', 'name', 'rd', 'tenant', 'description')
 
 
+class VRFDetailTable(VRFTable):
+    prefix_count = tables.Column(accessor=Accessor('summary.prefix_count'), orderable=False, verbose_name='Prefixes')
+    ipaddress_count = tables.Column(
+        accessor=Accessor('summary.ipaddress_count'), orderable=False, verbose_name='IP Addresses'
+    )
+    utilization = tables.TemplateColumn(VRF_UTILIZATION_GRAPH, orderable=False, verbose_name='Utilization')
+
+    class Meta(VRFTable.Meta):
+        fields = ('pk', 'name', 'rd', 'tenant', 'description', 'prefix_count', 'ipaddress_count', 'utilization')
+
+
 #
 # RIRs
 #
@@ -203,10 +228,10 @@ class AggregateTable(BaseTable):
 
 class AggregateDetailTable(AggregateTable):
     child_count = tables.Column(verbose_name='Prefixes')
-    get_utilization = tables.TemplateColumn(UTILIZATION_GRAPH, orderable=False, verbose_name='Utilization')
+    utilization = tables.TemplateColumn(UTILIZATION_GRAPH, orderable=False, verbose_name='Utilization')
 
     class Meta(AggregateTable.Meta):
-        fields = ('pk', 'prefix', 'rir', 'child_count', 'get_utilization', 'date_added', 'description')
+        fields = ('pk', 'prefix', 'rir', 'child_count', 'utilization', 'date_added', 'description')
 
 
 #
@@ -249,10 +274,26 @@ class PrefixTable(BaseTable):
 
 
 class PrefixDetailTable(PrefixTable):
-    get_utilization = tables.TemplateColumn(UTILIZATION_GRAPH, orderable=False, verbose_name='Utilization')
+    utilization = tables.TemplateColumn(UTILIZATION_GRAPH, orderable=False, verbose_name='Utilization')
 
     class Meta(PrefixTable.Meta):
-        fields = ('pk', 'prefix', 'status', 'vrf', 'get_utilization', 'tenant', 'site', 'vlan', 'role', 'description')
+        fields = ('pk', 'prefix', 'status', 'vrf', 'utilization', 'tenant', 'site', 'vlan', 'role', 'description')
+
+
+class IPv4SpaceBlockTable(tables.Table):
+    """
+    Blocks of an IPv4 space report (see IPv4Space.get_report())
+    """
+    prefix = tables.TemplateColumn(IPV4_SPACE_BLOCK_LINK, verbose_name='Block')
+    addresses = tables.Column(verbose_name='IP Addresses')
+    coverage = tables.TemplateColumn(IPV4_SPACE_UTILIZATION, verbose_name='Prefix Coverage')
+    utilization = tables.TemplateColumn(IPV4_SPACE_UTILIZATION, verbose_name='Utilization')
+
+    class Meta:
+        attrs = {
+            'class': 'table table-hover table-headings',
+        }
+        empty_text = 'No blocks found'
 
 
 #
@@ -277,13 +318,25 @@ class IPAddressTable(BaseTable):
 
 
 class IPAddressDetailTable(IPAddressTable):
+    parent_prefix = tables.LinkColumn(
+        'ipam:prefix', args=[Accessor('parent_prefix.pk')], orderable=False, verbose_name='Parent Prefix'
+    )
+    parent_site = tables.LinkColumn(
+        'dcim:site', args=[Accessor('parent_prefix.site.slug')], accessor=Accessor('parent_prefix.site'),
+        orderable=False, verbose_name='Site'
+    )
+    parent_vlan = tables.LinkColumn(
+        'ipam:vlan', args=[Accessor('parent_prefix.vlan.pk')], accessor=Accessor('parent_prefix.vlan'),
+        orderable=False, verbose_name='VLAN'
+    )
     nat_inside = tables.LinkColumn(
         'ipam:ipaddress', args=[Accessor('nat_inside.pk')], orderable=False, verbose_name='NAT (Inside)'
     )
 
     class Meta(IPAddressTable.Meta):
         fields = (
-            'pk', 'address', 'vrf', 'status', 'role', 'tenant', 'nat_inside', 'device', 'interface', 'description',
+            'pk', 'address', 'vrf', 'parent_prefix', 'parent_site', 'parent_vlan', 'status', 'role', 'tenant',
+            'nat_inside', 'device', 'interface', 'description',
         )
 
 
@@ -1,15 +1,20 @@
 from __future__ import unicode_literals
 
+import json
+
 from netaddr import IPNetwork
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APIRequestFactory, APITestCase
 
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from dcim.models import Device, DeviceRole, DeviceType, Manufacturer, Site
 from ipam.models import (
-    Aggregate, IPAddress, IP_PROTOCOL_TCP, IP_PROTOCOL_UDP, Prefix, RIR, Role, Service, VLAN, VLANGroup, VRF,
+    Aggregate, IPAddress, IP_PROTOCOL_TCP, IP_PROTOCOL_UDP, Prefix, PREFIX_STATUS_ACTIVE, PREFIX_STATUS_CONTAINER,
+    PREFIX_STATUS_RESERVED, RIR, Role, Service, VLAN, VLANGroup, VRF, VRFSummary,
 )
 from users.models import Token
 from utilities.tests import HttpStatusMixin
@@ -41,6 +46,62 @@ class VRFTest(HttpStatusMixin, APITestCase):
 
         self.assertEqual(response.data['count'], 3)
 
+    def test_vrf_summary(self):
+
+        Prefix.objects.create(vrf=self.vrf1, prefix=IPNetwork('192.0.2.0/24'))
+        IPAddress.objects.create(vrf=self.vrf1, address=IPNetwork('192.0.2.1/24'))
+
+        url = reverse('ipam-api:vrf-detail', kwargs={'pk': self.vrf1.pk})
+        response = self.client.get(url, **self.header)
+
+        self.assertEqual(response.data['summary']['prefixes']['total'], 1)
+        self.assertEqual(response.data['summary']['prefixes']['active'], 1)
+        self.assertEqual(response.data['summary']['ip_addresses']['total'], 1)
+        self.assertEqual(response.data['summary']['utilization'], 0)
+
+    def test_vrf_serializer_summary(self):
+
+        from ipam.api.serializers import VRFSerializer
+
+        # The summary is computed if the VRF has not been annotated with it
+        request = APIRequestFactory().get(reverse('ipam-api:vrf-list'))
+        data = VRFSerializer(VRF.objects.get(pk=self.vrf1.pk), context={'request': request}).data
+
+        self.assertEqual(data['summary']['prefixes']['total'], 0)
+
+    def test_list_vrfs_summary_queries(self):
+
+        url = reverse('ipam-api:vrf-list')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, **self.header)
+
+        # Listing twice as many uncached VRFs must not require any additional queries
+        for i in range(4, 7):
+            VRF.objects.create(name='Test VRF {}'.format(i), rd='65000:{}'.format(i))
+        VRFSummary.objects.all().delete()
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url, **self.header)
+
+        self.assertEqual(response.data['count'], 6)
+        self.assertTrue(all(vrf['summary'] is not None for vrf in response.data['results']))
+        self.assertEqual(VRFSummary.objects.count(), 6)
+
+    def test_list_vrfs_view_summary_queries(self):
+
+        self.client.force_login(User.objects.get(username='testuser'))
+        url = reverse('ipam:vrf_list')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+
+        for i in range(4, 7):
+            VRF.objects.create(name='Test VRF {}'.format(i), rd='65000:{}'.format(i))
+        VRFSummary.objects.all().delete()
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(VRFSummary.objects.count(), 6)
+
     def test_create_vrf(self):
 
         data = {
@@ -148,6 +209,25 @@ class RIRTest(HttpStatusMixin, APITestCase):
         self.assertHttpStatus(response, status.HTTP_204_NO_CONTENT)
         self.assertEqual(RIR.objects.count(), 2)
 
+    def test_rir_stats(self):
+
+        Aggregate.objects.create(prefix=IPNetwork('10.0.0.0/16'), rir=self.rir1)
+        Prefix.objects.create(prefix=IPNetwork('10.0.0.0/24'), status=PREFIX_STATUS_ACTIVE)
+        Prefix.objects.create(prefix=IPNetwork('10.0.1.0/24'), status=PREFIX_STATUS_RESERVED)
+
+        url = reverse('ipam-api:rir-stats', kwargs={'pk': self.rir1.pk})
+        response = self.client.get(url, **self.header)
+
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'family': 4,
+            'total': 65536,
+            'active': 256,
+            'reserved': 256,
+            'deprecated': 0,
+            'available': 65024,
+        })
+
 
 class AggregateTest(HttpStatusMixin, APITestCase):
 
@@ -307,6 +387,9 @@ class PrefixTest(HttpStatusMixin, APITestCase):
         response = self.client.get(url, **self.header)
 
         self.assertEqual(response.data['prefix'], str(self.prefix1.prefix))
+        self.assertEqual(response.data['depth'], 0)
+        self.assertEqual(response.data['children'], 0)
+        self.assertFalse(response.data['has_children'])
 
     def test_list_prefixs(self):
 
@@ -367,6 +450,96 @@ class PrefixTest(HttpStatusMixin, APITestCase):
         self.assertHttpStatus(response, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Prefix.objects.count(), 2)
 
+    def test_available_prefixes(self):
+
+        prefix = Prefix.objects.create(prefix=IPNetwork('192.0.2.0/24'))
+        Prefix.objects.create(prefix=IPNetwork('192.0.2.0/26'))
+        Prefix.objects.create(prefix=IPNetwork('192.0.2.128/27'))
+        url = reverse('ipam-api:prefix-available-prefixes', kwargs={'pk': prefix.pk})
+
+        # Retrieve all available prefixes
+        response = self.client.get(url, **self.header)
+        self.assertEqual([p['prefix'] for p in response.data], ['192.0.2.64/26', '192.0.2.160/27', '192.0.2.192/26'])
+
+        # Create a single prefix
+        data = {
+            'prefix_length': 27,
+            'description': 'Test Prefix 1',
+        }
+        response = self.client.post(url, data, **self.header)
+        self.assertHttpStatus(response, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['prefix'], '192.0.2.64/27')
+        self.assertEqual(response.data['description'], data['description'])
+
+        # Create multiple prefixes at once
+        data = {
+            'prefix_length': 26,
+        }
+        response = self.client.post('{}?count=2'.format(url), data, **self.header)
+        self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+        data['prefix_length'] = 27
+        response = self.client.post('{}?count=4'.format(url), data, **self.header)
+        self.assertHttpStatus(response, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [p['prefix'] for p in response.data],
+            ['192.0.2.96/27', '192.0.2.160/27', '192.0.2.192/27', '192.0.2.224/27']
+        )
+
+        # Try to create one more prefix
+        response = self.client.post(url, {'prefix_length': 32}, **self.header)
+        self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('detail', response.data)
+
+        # Try to create a prefix of an invalid length
+        response = self.client.post(url, {'prefix_length': 24}, **self.header)
+        self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('prefix_length', response.data)
+
+    def test_tree(self):
+
+        vrf = VRF.objects.create(name='Test VRF', rd='65000:100')
+        prefixes = {}
+        for prefix in ['10.0.0.0/8', '10.1.0.0/16', '10.1.1.0/24', '10.1.2.0/24', '10.2.0.0/16', '192.0.2.0/24']:
+            prefixes[prefix] = Prefix.objects.create(prefix=IPNetwork(prefix))
+        Prefix.objects.create(prefix=IPNetwork('10.0.0.0/8'), vrf=vrf)
+        url = reverse('ipam-api:prefix-tree')
+
+        # Retrieve the top level of the global table
+        response = self.client.get(url, **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        self.assertEqual(
+            [(p['prefix'], p['depth'], p['children'], p['child_prefixes']) for p in response.data['results']],
+            [
+                ('10.0.0.0/8', 0, 4, None),
+                ('192.0.2.0/24', 0, 0, None),
+                ('192.168.1.0/24', 0, 0, None),
+                ('192.168.2.0/24', 0, 0, None),
+                ('192.168.3.0/24', 0, 0, None),
+            ]
+        )
+
+        # Page through the children of a prefix
+        response = self.client.get('{}?parent={}&limit=1'.format(url, prefixes['10.0.0.0/8'].pk), **self.header)
+        self.assertEqual([p['prefix'] for p in response.data['results']], ['10.1.0.0/16'])
+        response = self.client.get(response.data['next'], **self.header)
+        self.assertEqual([p['prefix'] for p in response.data['results']], ['10.2.0.0/16'])
+        self.assertIsNone(response.data['next'])
+
+        # Expand two levels beneath each top-level prefix
+        response = self.client.get('{}?expand=2'.format(url), **self.header)
+        root = response.data['results'][0]
+        self.assertEqual([p['prefix'] for p in root['child_prefixes']], ['10.1.0.0/16', '10.2.0.0/16'])
+        self.assertEqual(
+            [p['prefix'] for p in root['child_prefixes'][0]['child_prefixes']], ['10.1.1.0/24', '10.1.2.0/24']
+        )
+        self.assertIsNone(root['child_prefixes'][0]['child_prefixes'][0]['child_prefixes'])
+        self.assertEqual(root['child_prefixes'][0]['utilization'], 0)
+        self.assertEqual(response.data['results'][1]['child_prefixes'], [])
+
+        # Retrieve the top level of a VRF
+        response = self.client.get('{}?vrf_id={}'.format(url, vrf.pk), **self.header)
+        self.assertEqual([p['vrf']['id'] for p in response.data['results']], [vrf.pk])
+
     def test_available_ips(self):
 
         prefix = Prefix.objects.create(prefix=IPNetwork('192.0.2.0/29'), is_pool=True)
@@ -396,6 +569,54 @@ class PrefixTest(HttpStatusMixin, APITestCase):
         self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
         self.assertIn('detail', response.data)
 
+    def test_available_ips_count(self):
+
+        prefix = Prefix.objects.create(prefix=IPNetwork('192.0.2.0/29'))
+        IPAddress.objects.create(address=IPNetwork('192.0.2.2/29'))
+        url = reverse('ipam-api:prefix-available-ips', kwargs={'pk': prefix.pk})
+
+        # Create three IPs at once
+        response = self.client.post('{}?count=3'.format(url), {'description': 'Test IP'}, **self.header)
+        self.assertHttpStatus(response, status.HTTP_201_CREATED)
+        self.assertEqual([ip['address'] for ip in response.data], ['192.0.2.1/29', '192.0.2.3/29', '192.0.2.4/29'])
+        self.assertEqual(IPAddress.objects.filter(description='Test IP').count(), 3)
+
+        # Try to create more IPs than remain available
+        response = self.client.post('{}?count=3'.format(url), {}, **self.header)
+        self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(IPAddress.objects.count(), 4)
+
+        # Try to create an invalid number of IPs
+        response = self.client.post('{}?count=0'.format(url), {}, **self.header)
+        self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+
+    def test_ipv4_space_report(self):
+
+        Prefix.objects.create(prefix=IPNetwork('10.0.0.0/16'), status=PREFIX_STATUS_CONTAINER)
+        Prefix.objects.create(prefix=IPNetwork('10.0.0.0/24'))
+        Prefix.objects.create(prefix=IPNetwork('10.0.2.0/23'))
+        for i in range(1, 228):
+            IPAddress.objects.create(address=IPNetwork('10.0.0.{}/24'.format(i)))
+        IPAddress.objects.create(address=IPNetwork('10.0.2.1/23'))
+
+        url = reverse('ipam-api:ipv4-space-report-list')
+        response = self.client.get('{}?parent=10.0.0.0/16&prefix_length=24&threshold=80'.format(url), **self.header)
+
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        self.assertEqual(response.data['vrf'], None)
+        self.assertEqual(response.data['addresses'], 228)
+        self.assertEqual(response.data['coverage'], 1)
+        self.assertEqual(response.data['histogram'][0]['count'], 255)
+        self.assertEqual(response.data['histogram'][8]['count'], 1)
+        self.assertEqual(response.data['blocks'], [
+            {'prefix': '10.0.0.0/24', 'addresses': 227, 'coverage': 100, 'utilization': 89},
+        ])
+        self.assertEqual(response.data['free_blocks'][:3], ['10.0.1.0/24', '10.0.4.0/22', '10.0.8.0/21'])
+
+        # Only IPv4 prefixes can be analyzed
+        response = self.client.get('{}?parent=2001:db8::/32'.format(url), **self.header)
+        self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+
 
 class IPAddressTest(HttpStatusMixin, APITestCase):
 
@@ -464,6 +685,54 @@ class IPAddressTest(HttpStatusMixin, APITestCase):
         self.assertHttpStatus(response, status.HTTP_204_NO_CONTENT)
         self.assertEqual(IPAddress.objects.count(), 2)
 
+    def test_parent_prefix(self):
+
+        prefix = Prefix.objects.create(prefix=IPNetwork('192.168.0.0/25'))
+        url = reverse('ipam-api:ipaddress-list')
+
+        # The parent prefix is included only upon request
+        response = self.client.get(url, **self.header)
+        self.assertNotIn('parent_prefix', response.data['results'][0])
+
+        response = self.client.get('{}?parent_prefix=true'.format(url), **self.header)
+        self.assertEqual(
+            [ip['parent_prefix']['id'] for ip in response.data['results']], [prefix.pk, prefix.pk, prefix.pk]
+        )
+
+        url = reverse('ipam-api:ipaddress-detail', kwargs={'pk': self.ipaddress1.pk})
+        response = self.client.get('{}?parent_prefix=true'.format(url), **self.header)
+        self.assertEqual(response.data['parent_prefix']['prefix'], '192.168.0.0/25')
+        self.assertIsNone(response.data['parent_prefix']['vlan'])
+
+    def _get_conflicts(self, response):
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+
+    def test_conflicts(self):
+
+        duplicate = IPAddress.objects.create(address=IPNetwork('192.168.0.1/32'))
+
+        url = reverse('ipam-api:conflicts-list')
+        response = self.client.get('{}?type=duplicate-ipaddress'.format(url), **self.header)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(self._get_conflicts(response), [{
+            'type': 'duplicate-ipaddress',
+            'vrf': None,
+            'value': '192.168.0.1',
+            'enforced': False,
+            'objects': [
+                {'id': self.ipaddress1.pk, 'value': '192.168.0.1/24'},
+                {'id': duplicate.pk, 'value': '192.168.0.1/32'},
+            ],
+        }])
+
+        response = self.client.get('{}?vrf_id=0&type=duplicate-prefix'.format(url), **self.header)
+        self.assertEqual(self._get_conflicts(response), [])
+
+        response = self.client.get('{}?type=invalid'.format(url), **self.header)
+        self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+
 
 class VLANGroupTest(HttpStatusMixin, APITestCase):
 
@@ -531,6 +800,38 @@ class VLANGroupTest(HttpStatusMixin, APITestCase):
         self.assertHttpStatus(response, status.HTTP_204_NO_CONTENT)
         self.assertEqual(VLANGroup.objects.count(), 2)
 
+    def test_available_vlans(self):
+
+        VLAN.objects.create(vid=1, name='Test VLAN 1', group=self.vlangroup1)
+        VLAN.objects.create(vid=3, name='Test VLAN 3', group=self.vlangroup1)
+        VLAN.objects.create(vid=4, name='Test VLAN 4', group=self.vlangroup1)
+        url = reverse('ipam-api:vlangroup-available-vlans', kwargs={'pk': self.vlangroup1.pk})
+
+        # Retrieve all available VLAN IDs
+        response = self.client.get(url, **self.header)
+        self.assertEqual(response.data['count'], 4091)
+        self.assertEqual(response.data['ranges'], [{'start': 2, 'end': 2}, {'start': 5, 'end': 4094}])
+        self.assertEqual(response.data['vids'][:3], [2, 5, 6])
+
+        # Create a single VLAN
+        response = self.client.post(url, {'name': 'Test VLAN'}, **self.header)
+        self.assertHttpStatus(response, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['vid'], 2)
+        self.assertEqual(response.data['group'], self.vlangroup1.pk)
+
+        # Create multiple VLANs at once
+        response = self.client.post('{}?count=3'.format(url), {'name': 'VLAN {vid}'}, **self.header)
+        self.assertHttpStatus(response, status.HTTP_201_CREATED)
+        self.assertEqual([v['name'] for v in response.data], ['VLAN 5', 'VLAN 6', 'VLAN 7'])
+
+        # Try to create more VLANs than there are VIDs available
+        vlan_count = VLAN.objects.count()
+        with self.settings(MAX_PAGE_SIZE=0):
+            response = self.client.post('{}?count=4088'.format(url), {'name': 'VLAN {vid}'}, **self.header)
+        self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('detail', response.data)
+        self.assertEqual(VLAN.objects.count(), vlan_count)
+
 
 class VLANTest(HttpStatusMixin, APITestCase):
 
@@ -5,7 +5,23 @@ import netaddr
 from django.core.exceptions import ValidationError
 from django.test import TestCase, override_settings
 
-from ipam.models import IPAddress, Prefix, VRF
+from dcim.models import Device, DeviceRole, DeviceType, Interface, Manufacturer, Site
+from ipam.analysis import IPv4Space
+from ipam.audit import (
+    CONFLICT_OVERLAPPING_AGGREGATE, find_conflicts, find_duplicate_ipaddresses, find_duplicate_prefixes,
+    find_duplicates_of, find_overlapping_aggregates, find_overlapping_prefixes,
+)
+from ipam.constants import (
+    IPADDRESS_STATUS_ACTIVE, IPADDRESS_STATUS_DHCP, PREFIX_STATUS_ACTIVE, PREFIX_STATUS_CONTAINER,
+    PREFIX_STATUS_DEPRECATED, PREFIX_STATUS_RESERVED,
+)
+from ipam.filters import IPAddressFilter
+from ipam.intervals import IntervalList
+from ipam.models import Aggregate, AggregateStatistic, IPAddress, Prefix, RIR, VLAN, VRF, VRFSummary
+from ipam.radix import PrefixTree, prefix_index
+from ipam.utilization import annotate_aggregate_utilization, annotate_prefix_utilization
+from ipam.views import get_ipaddress_window
+from tenancy.models import Tenant
 
 
 class TestPrefix(TestCase):
@@ -35,6 +51,645 @@ class TestPrefix(TestCase):
         self.assertRaises(ValidationError, duplicate_prefix.clean)
 
 
+class TestAvailableIPs(TestCase):
+
+    def test_available_ranges(self):
+        prefix = Prefix.objects.create(prefix=netaddr.IPNetwork('192.0.2.0/28'))
+        for address in ['192.0.2.0/28', '192.0.2.3/28', '192.0.2.4/32', '192.0.2.4/28', '192.0.2.9/28']:
+            IPAddress.objects.create(address=netaddr.IPNetwork(address))
+        self.assertEqual([str(r) for r in prefix.get_available_ranges()], [
+            '192.0.2.1-192.0.2.2', '192.0.2.5-192.0.2.8', '192.0.2.10-192.0.2.14',
+        ])
+        prefix.is_pool = True
+        self.assertEqual([str(r) for r in prefix.get_available_ranges()], [
+            '192.0.2.1-192.0.2.2', '192.0.2.5-192.0.2.8', '192.0.2.10-192.0.2.15',
+        ])
+
+    def test_available_ips_large_prefix(self):
+        prefix = Prefix.objects.create(prefix=netaddr.IPNetwork('2001:db8::/64'), is_pool=True)
+        IPAddress.objects.create(address=netaddr.IPNetwork('2001:db8::/64'))
+        IPAddress.objects.create(address=netaddr.IPNetwork('2001:db8::2/64'))
+        available_ips = prefix.get_available_ips()
+        self.assertEqual([str(next(available_ips)) for _ in range(3)], ['2001:db8::1', '2001:db8::3', '2001:db8::4'])
+
+
+class TestIPAddressWindow(TestCase):
+
+    def setUp(self):
+
+        self.prefix = netaddr.IPNetwork('10.0.0.0/24')
+        Prefix.objects.create(prefix=self.prefix)
+        for address in ['10.0.0.0/24', '10.0.0.5/24', '10.0.0.5/32', '10.0.0.6/24', '10.0.0.10/24', '10.0.0.200/24']:
+            IPAddress.objects.create(address=netaddr.IPNetwork(address))
+        self.queryset = IPAddress.objects.filter(address__net_host_contained=str(self.prefix))
+
+    def _get_page(self, start=None):
+        rows, previous_start, next_start = get_ipaddress_window(
+            self.prefix, self.queryset, netaddr.IPAddress(start) if start else None, per_page=3
+        )
+        return [row if isinstance(row, tuple) else str(row.address) for row in rows], previous_start, next_start
+
+    def test_pages(self):
+        # Duplicate IPs are kept on the same page
+        self.assertEqual(self._get_page(), (
+            ['10.0.0.0/24', (4, '10.0.0.1/24'), '10.0.0.5/24', '10.0.0.5/32'], None, '10.0.0.6'
+        ))
+        self.assertEqual(self._get_page('10.0.0.6'), (
+            ['10.0.0.6/24', (3, '10.0.0.7/24'), '10.0.0.10/24'], '10.0.0.0', '10.0.0.11'
+        ))
+        self.assertEqual(self._get_page('10.0.0.11'), (
+            [(189, '10.0.0.11/24'), '10.0.0.200/24', (54, '10.0.0.201/24')], '10.0.0.6', None
+        ))
+
+    def test_queries(self):
+        with self.assertNumQueries(2):
+            self._get_page('10.0.0.6')
+
+
+class TestIntervalList(TestCase):
+
+    def test_merge(self):
+        intervals = IntervalList([(10, 19), (0, 4), (5, 7), (15, 25)])
+        self.assertEqual(intervals.intervals, [(0, 7), (10, 25)])
+        self.assertEqual(intervals.size, 24)
+
+    def test_union(self):
+        a = IntervalList([(0, 9), (20, 29)])
+        b = IntervalList([(5, 14), (30, 39), (50, 59)])
+        self.assertEqual((a | b).intervals, [(0, 14), (20, 39), (50, 59)])
+        self.assertEqual((a | IntervalList()).intervals, a.intervals)
+
+    def test_subtract(self):
+        a = IntervalList([(0, 99), (200, 299)])
+        b = IntervalList([(10, 19), (90, 209), (250, 259), (290, 400)])
+        self.assertEqual((a - b).intervals, [(0, 9), (20, 89), (210, 249), (260, 289)])
+        self.assertEqual((b - b).intervals, [])
+        self.assertEqual((a - IntervalList()).intervals, a.intervals)
+
+    def test_ipv6(self):
+        networks = ['2001:db8::/64', '2001:db8:0:1::/64', '2001:db8::1/128', '2001:db8:0:3::/64']
+        covered = IntervalList.from_networks(networks)
+        self.assertEqual(covered.size, 3 * 2 ** 64)
+        parent = netaddr.IPNetwork('2001:db8::/62')
+        self.assertEqual(
+            covered.get_gaps(parent.first, parent.last).to_networks(6), [netaddr.IPNetwork('2001:db8:0:2::/64')]
+        )
+
+
+class TestPrefixTree(TestCase):
+
+    def setUp(self):
+
+        self.tree = PrefixTree(4)
+        for pk, prefix in enumerate(['10.0.0.0/8', '10.1.0.0/16', '10.1.1.0/24', '10.1.2.0/24', '10.2.0.0/16'], start=1):
+            network = netaddr.IPNetwork(prefix)
+            self.tree.insert(network.value, network.prefixlen, pk)
+
+    def _pks(self, nodes):
+        return [pk for node in nodes for pk in node.pks]
+
+    def test_ancestors(self):
+        network = netaddr.IPNetwork('10.1.1.0/24')
+        self.assertEqual(self._pks(self.tree.get_ancestors(network.value, network.prefixlen)), [1, 2])
+        self.assertEqual(self.tree.get_depth(network.value, network.prefixlen), 2)
+
+    def test_children(self):
+        network = netaddr.IPNetwork('10.0.0.0/8')
+        self.assertEqual(self._pks(self.tree.get_children(network.value, network.prefixlen)), [2, 5])
+        # Children of a network which is not itself present in the tree
+        network = netaddr.IPNetwork('10.1.0.0/20')
+        self.assertEqual(self._pks(self.tree.get_children(network.value, network.prefixlen)), [3, 4])
+        self.assertTrue(self.tree.has_children(network.value, network.prefixlen))
+
+    def test_remove(self):
+        self.tree.remove(2)
+        network = netaddr.IPNetwork('10.1.1.0/24')
+        self.assertEqual(self._pks(self.tree.get_ancestors(network.value, network.prefixlen)), [1])
+        network = netaddr.IPNetwork('10.0.0.0/8')
+        self.assertEqual(self._pks(self.tree.get_children(network.value, network.prefixlen)), [3, 4, 5])
+        for pk in [1, 3, 4, 5]:
+            self.tree.remove(pk)
+        self.assertEqual(len(self.tree), 0)
+        self.assertEqual(self.tree.root.children, [None, None])
+
+
+class TestPrefixHierarchy(TestCase):
+
+    def setUp(self):
+
+        self.vrf = VRF.objects.create(name='Test', rd='1:1')
+        self.prefixes = {
+            prefix: Prefix.objects.create(vrf=vrf, prefix=netaddr.IPNetwork(prefix)) for vrf, prefix in [
+                (None, '10.0.0.0/8'),
+                (None, '10.1.0.0/16'),
+                (None, '10.1.1.0/24'),
+                (None, '10.2.0.0/16'),
+                (self.vrf, '10.1.0.0/17'),
+            ]
+        }
+
+    def test_annotate_depth(self):
+        depths = {
+            str(p.prefix): (p.relative_depth, p.has_children) for p in Prefix.objects.filter(vrf=None).annotate_depth()
+        }
+        self.assertEqual(depths, {
+            '10.0.0.0/8': (0, True),
+            '10.1.0.0/16': (1, True),
+            '10.1.1.0/24': (2, False),
+            '10.2.0.0/16': (1, False),
+        })
+
+    def test_annotate_depth_limit(self):
+        # Depth is relative to the members of the QuerySet
+        queryset = Prefix.objects.filter(prefix__net_contained='10.0.0.0/8', vrf=None).annotate_depth(limit=0)
+        self.assertEqual([str(p.prefix) for p in queryset], ['10.1.0.0/16', '10.2.0.0/16'])
+
+        # The stored depth of each Prefix is retained
+        self.assertEqual([(p.relative_depth, p.depth) for p in queryset], [(0, 1), (0, 1)])
+        queryset[0].save()
+        self.assertEqual(Prefix.objects.get(pk=queryset[0].pk).depth, 1)
+
+        # An unfiltered QuerySet is limited by the stored depth of each Prefix
+        queryset = Prefix.objects.annotate_depth(limit=0)
+        self.assertEqual([str(p.prefix) for p in queryset], ['10.0.0.0/8', '10.1.0.0/17'])
+
+    def test_parents_and_children(self):
+        vrf_prefix = self.prefixes['10.1.0.0/17']
+        self.assertEqual(
+            sorted(prefix_index.get_parents(vrf_prefix)),
+            sorted([self.prefixes['10.0.0.0/8'].pk, self.prefixes['10.1.0.0/16'].pk])
+        )
+        self.assertEqual(prefix_index.get_parents(vrf_prefix, include_global=False), [])
+        self.assertEqual(
+            prefix_index.get_children(self.prefixes['10.0.0.0/8']),
+            [self.prefixes['10.1.0.0/16'].pk, self.prefixes['10.2.0.0/16'].pk]
+        )
+
+    def test_annotate_parent_prefix(self):
+        vlan = VLAN.objects.create(vid=100, name='Test VLAN')
+        self.prefixes['10.1.1.0/24'].vlan = vlan
+        self.prefixes['10.1.1.0/24'].save()
+        for vrf, address in [
+            (None, '10.1.1.5/8'),
+            (None, '10.3.0.1/24'),
+            (None, '192.0.2.1/24'),
+            (self.vrf, '10.1.5.1/24'),
+            (self.vrf, '10.1.200.1/24'),
+        ]:
+            IPAddress.objects.create(vrf=vrf, address=netaddr.IPNetwork(address))
+        queryset = IPAddress.objects.select_related('vrf').annotate_parent_prefix()
+
+        # The IPs, the prefix index fingerprints, and the parent prefixes are each retrieved with a single query
+        list(queryset.all())
+        with self.assertNumQueries(3):
+            parents = {
+                (str(ip.vrf), str(ip.address)): (str(ip.parent_prefix), ip.parent_prefix and ip.parent_prefix.vlan)
+                for ip in queryset.all()
+            }
+        self.assertEqual(parents, {
+            ('None', '10.1.1.5/8'): ('10.1.1.0/24', vlan),
+            ('None', '10.3.0.1/24'): ('10.0.0.0/8', None),
+            ('None', '192.0.2.1/24'): ('None', None),
+            ('Test (1:1)', '10.1.5.1/24'): ('10.1.0.0/17', None),
+            ('Test (1:1)', '10.1.200.1/24'): ('None', None),
+        })
+
+        # Only the IPs retrieved are annotated
+        self.assertFalse(hasattr(IPAddress.objects.first(), 'parent_prefix'))
+        ip = queryset.filter(address__net_host='10.3.0.1').get()
+        self.assertEqual(ip.parent_prefix, self.prefixes['10.0.0.0/8'])
+
+    def test_index_tracks_changes(self):
+        parent = self.prefixes['10.0.0.0/8']
+        self.assertEqual(len(prefix_index.get_children(parent)), 2)
+        Prefix.objects.create(prefix=netaddr.IPNetwork('10.3.0.0/16'))
+        self.prefixes['10.2.0.0/16'].delete()
+        self.assertEqual(len(prefix_index.get_children(parent)), 2)
+        self.prefixes['10.1.0.0/16'].prefix = netaddr.IPNetwork('192.168.0.0/16')
+        self.prefixes['10.1.0.0/16'].save()
+        self.assertEqual(len(prefix_index.get_children(parent)), 2)
+        network = netaddr.IPNetwork('10.1.1.0/24')
+        self.assertEqual(prefix_index.get_tree(None, 4).get_depth(network.value, network.prefixlen), 1)
+
+    def test_index_tracks_bulk_update(self):
+        parent = self.prefixes['10.1.0.0/16']
+        moved = self.prefixes['10.1.1.0/24']
+        self.assertEqual(prefix_index.get_children(parent), [moved.pk])
+        Prefix.objects.filter(pk=moved.pk).update(prefix=netaddr.IPNetwork('10.2.1.0/24'))
+        self.assertEqual(prefix_index.get_children(parent), [])
+        self.assertEqual(prefix_index.get_children(self.prefixes['10.2.0.0/16']), [moved.pk])
+        Prefix.objects.filter(pk=moved.pk).update(vrf=self.vrf)
+        self.assertEqual(prefix_index.get_children(self.prefixes['10.2.0.0/16']), [])
+
+    def test_incremental_update(self):
+        tree = prefix_index.get_tree(None, 4)
+        # Signal handlers defer index updates until the transaction has been committed, so apply them directly here.
+        prefix = Prefix.objects.create(prefix=netaddr.IPNetwork('10.1.2.0/24'))
+        prefix_index.update(prefix.pk, prefix.vrf_id, prefix.family, prefix.prefix, prefix.last_updated)
+        self.assertIs(prefix_index.get_tree(None, 4), tree)
+        self.assertIn(prefix.pk, prefix_index.get_children(self.prefixes['10.1.0.0/16']))
+        pk = prefix.pk
+        prefix.delete()
+        prefix_index.delete(pk)
+        self.assertIs(prefix_index.get_tree(None, 4), tree)
+        self.assertNotIn(pk, prefix_index.get_children(self.prefixes['10.1.0.0/16']))
+
+
+class TestPrefixStoredHierarchy(TestCase):
+
+    def setUp(self):
+
+        self.vrf = VRF.objects.create(name='Test', rd='1:1')
+        for vrf, prefix in [
+            (None, '10.0.0.0/8'),
+            (None, '10.1.0.0/16'),
+            (None, '10.1.1.0/24'),
+            (None, '10.2.0.0/16'),
+            (self.vrf, '10.1.0.0/17'),
+        ]:
+            Prefix.objects.create(vrf=vrf, prefix=netaddr.IPNetwork(prefix))
+
+    def _hierarchy(self, vrf=None):
+        return {str(prefix): (depth, children) for prefix, depth, children in Prefix.objects.filter(vrf=vrf).values_list(
+            'prefix', 'depth', 'children'
+        )}
+
+    def test_create(self):
+        self.assertEqual(self._hierarchy(), {
+            '10.0.0.0/8': (0, 3),
+            '10.1.0.0/16': (1, 1),
+            '10.1.1.0/24': (2, 0),
+            '10.2.0.0/16': (1, 0),
+        })
+        self.assertEqual(self._hierarchy(self.vrf), {'10.1.0.0/17': (0, 0)})
+
+    def test_move(self):
+        prefix = Prefix.objects.get(vrf=None, prefix='10.1.0.0/16')
+        prefix.prefix = netaddr.IPNetwork('10.1.1.0/25')
+        prefix.save()
+        self.assertEqual(self._hierarchy(), {
+            '10.0.0.0/8': (0, 3),
+            '10.1.1.0/25': (2, 0),
+            '10.1.1.0/24': (1, 1),
+            '10.2.0.0/16': (1, 0),
+        })
+        prefix.vrf = self.vrf
+        prefix.save()
+        self.assertEqual(self._hierarchy(self.vrf), {'10.1.0.0/17': (0, 1), '10.1.1.0/25': (1, 0)})
+        self.assertEqual(self._hierarchy()['10.0.0.0/8'], (0, 2))
+
+    def test_delete(self):
+        Prefix.objects.get(vrf=None, prefix='10.1.0.0/16').delete()
+        self.assertEqual(self._hierarchy(), {
+            '10.0.0.0/8': (0, 2),
+            '10.1.1.0/24': (1, 0),
+            '10.2.0.0/16': (1, 0),
+        })
+
+    def test_delete_duplicates(self):
+        Prefix.objects.create(prefix=netaddr.IPNetwork('10.1.0.0/16'))
+        Prefix.objects.filter(vrf=None, prefix='10.1.0.0/16').delete()
+        self.assertEqual(self._hierarchy()['10.1.1.0/24'], (1, 0))
+        self.assertEqual(self._hierarchy()['10.0.0.0/8'], (0, 2))
+
+    def test_duplicate(self):
+        Prefix.objects.create(prefix=netaddr.IPNetwork('10.1.0.0/16'))
+        hierarchy = self._hierarchy()
+        self.assertEqual(hierarchy['10.0.0.0/8'], (0, 4))
+        self.assertEqual(hierarchy['10.1.1.0/24'], (2, 0))
+
+    def test_bulk_update(self):
+        Prefix.objects.filter(vrf=None, prefix='10.2.0.0/16').update(prefix=netaddr.IPNetwork('10.1.1.128/25'))
+        self.assertEqual(self._hierarchy()['10.1.1.128/25'], (3, 0))
+        self.assertEqual(self._hierarchy()['10.1.0.0/16'], (1, 2))
+
+    def test_bulk_delete(self):
+        unrelated = Prefix.objects.create(prefix=netaddr.IPNetwork('192.168.0.0/16'))
+        Prefix.objects.filter(pk=unrelated.pk).update(depth=5)
+        Prefix.objects.filter(vrf=None, prefix__in=['10.1.0.0/16', '10.2.0.0/16']).delete()
+        self.assertEqual(self._hierarchy(), {
+            '10.0.0.0/8': (0, 1),
+            '10.1.1.0/24': (1, 0),
+            '192.168.0.0/16': (5, 0),
+        })
+
+    def test_rebuild_hierarchy(self):
+        Prefix.objects.all().update(depth=5, children=5)
+        self.assertEqual(Prefix.objects.rebuild_hierarchy([None]), 4)
+        self.assertEqual(self._hierarchy()['10.1.1.0/24'], (2, 0))
+        self.assertEqual(self._hierarchy(self.vrf), {'10.1.0.0/17': (5, 5)})
+        self.assertEqual(Prefix.objects.rebuild_hierarchy(), 1)
+
+
+class TestAggregateStatistic(TestCase):
+
+    def setUp(self):
+
+        rir = RIR.objects.create(name='RIR 1', slug='rir-1')
+        self.aggregate = Aggregate.objects.create(prefix=netaddr.IPNetwork('10.0.0.0/16'), rir=rir)
+        self.vrf = VRF.objects.create(name='Test', rd='1:1')
+
+    def _statistics(self):
+        return {
+            status: int(size) for status, size in self.aggregate.statistics.values_list('status', 'size')
+        }
+
+    def assertStatistics(self, active=0, reserved=0, deprecated=0, available=65536):
+        expected = {
+            PREFIX_STATUS_ACTIVE: active,
+            PREFIX_STATUS_RESERVED: reserved,
+            PREFIX_STATUS_DEPRECATED: deprecated,
+            None: available,
+        }
+        self.assertEqual(self._statistics(), expected)
+        AggregateStatistic.objects.rebuild()
+        self.assertEqual(self._statistics(), expected)
+
+    def test_prefix_changes(self):
+        self.assertStatistics()
+        prefix = Prefix.objects.create(prefix=netaddr.IPNetwork('10.0.0.0/24'), status=PREFIX_STATUS_ACTIVE)
+        self.assertStatistics(active=256, available=65280)
+        # Overlapping Prefixes (including those in other VRFs) are counted once
+        Prefix.objects.create(vrf=self.vrf, prefix=netaddr.IPNetwork('10.0.0.0/25'), status=PREFIX_STATUS_ACTIVE)
+        Prefix.objects.create(prefix=netaddr.IPNetwork('10.0.0.0/23'), status=PREFIX_STATUS_CONTAINER)
+        self.assertStatistics(active=256, available=65280)
+        prefix.status = PREFIX_STATUS_RESERVED
+        prefix.save()
+        self.assertStatistics(active=128, reserved=256, available=65280)
+        prefix.prefix = netaddr.IPNetwork('10.0.1.0/24')
+        prefix.save()
+        self.assertStatistics(active=128, reserved=256, available=65152)
+        prefix.delete()
+        self.assertStatistics(active=128, available=65408)
+
+    def test_prefix_outside_aggregate(self):
+        Prefix.objects.create(prefix=netaddr.IPNetwork('10.0.0.0/8'), status=PREFIX_STATUS_ACTIVE)
+        Prefix.objects.create(prefix=netaddr.IPNetwork('192.168.0.0/24'), status=PREFIX_STATUS_ACTIVE)
+        self.assertStatistics()
+
+    def test_bulk_changes(self):
+        for prefix in ['10.0.0.0/24', '10.0.0.0/25', '10.0.1.0/24']:
+            Prefix.objects.create(prefix=netaddr.IPNetwork(prefix), status=PREFIX_STATUS_ACTIVE)
+        Prefix.objects.filter(prefix='10.0.0.0/25').update(status=PREFIX_STATUS_DEPRECATED)
+        self.assertStatistics(active=512, deprecated=128, available=65024)
+        Prefix.objects.filter(prefix__net_contained='10.0.0.0/23').delete()
+        self.assertStatistics()
+
+    def test_rebuild_for_prefixes(self):
+        rir = RIR.objects.get(slug='rir-1')
+        Aggregate.objects.create(prefix=netaddr.IPNetwork('192.168.0.0/16'), rir=rir)
+        Aggregate.objects.create(prefix=netaddr.IPNetwork('2001:db8::/32'), rir=rir)
+        self.assertEqual(AggregateStatistic.objects.rebuild_for_prefixes(['10.0.0.0/24', '10.1.0.0/24']), 1)
+        self.assertEqual(AggregateStatistic.objects.rebuild_for_prefixes(['10.0.0.0/16', '2001:db8::/64']), 2)
+        self.assertEqual(AggregateStatistic.objects.rebuild_for_prefixes([]), 0)
+
+
+class TestUtilization(TestCase):
+
+    def setUp(self):
+
+        self.vrf = VRF.objects.create(name='Test', rd='1:1')
+        rir = RIR.objects.create(name='RIR 1', slug='rir-1')
+        self.aggregate = Aggregate.objects.create(prefix=netaddr.IPNetwork('10.0.0.0/8'), rir=rir)
+        self.container = Prefix.objects.create(
+            prefix=netaddr.IPNetwork('10.0.0.0/16'), status=PREFIX_STATUS_CONTAINER
+        )
+        self.prefix = Prefix.objects.create(prefix=netaddr.IPNetwork('10.0.0.0/24'))
+        Prefix.objects.create(prefix=netaddr.IPNetwork('10.0.0.0/25'))
+        Prefix.objects.create(vrf=self.vrf, prefix=netaddr.IPNetwork('10.0.64.0/18'))
+        self.vrf_prefix = Prefix.objects.create(vrf=self.vrf, prefix=netaddr.IPNetwork('10.0.1.0/30'))
+        for address in ['10.0.0.1/24', '10.0.0.2/24', '10.0.1.1/30']:
+            IPAddress.objects.create(address=netaddr.IPNetwork(address))
+        IPAddress.objects.create(vrf=self.vrf, address=netaddr.IPNetwork('10.0.1.2/30'))
+
+    def test_prefix_utilization(self):
+        prefixes = list(Prefix.objects.filter(pk__in=[self.container.pk, self.prefix.pk, self.vrf_prefix.pk]))
+        with self.assertNumQueries(2):
+            annotate_prefix_utilization(prefixes)
+        utilization = {p.pk: p.utilization for p in prefixes}
+        self.assertEqual(utilization, {self.container.pk: 0, self.prefix.pk: 0, self.vrf_prefix.pk: 50})
+        for prefix in prefixes:
+            self.assertEqual(prefix.get_utilization(), prefix.utilization)
+
+    def test_aggregate_utilization(self):
+        with self.assertNumQueries(1):
+            annotate_aggregate_utilization([self.aggregate])
+        # 10.0.0.0/16 covers 1/256th of the aggregate
+        self.assertEqual(self.aggregate.utilization, 0)
+        # Prefixes in any VRF count toward the utilization of an aggregate
+        self.aggregate.prefix = netaddr.IPNetwork('10.0.64.0/18')
+        self.assertEqual(self.aggregate.get_utilization(), 100)
+
+
+class TestIPv4Space(TestCase):
+
+    def _int(self, address):
+        return int(netaddr.IPAddress(address))
+
+    def test_blocks(self):
+        space = IPv4Space(
+            [self._int(a) for a in ('10.0.1.1', '10.0.0.1', '10.0.0.2', '10.0.3.255')],
+            [self._int('10.0.0.0'), self._int('10.0.0.128'), self._int('10.0.2.0')],
+            [self._int('10.0.0.255'), self._int('10.0.1.127'), self._int('10.0.2.127')]
+        )
+        parent = netaddr.IPNetwork('10.0.0.0/22')
+        firsts, addresses, covered = space.get_blocks(parent, 24)
+        self.assertEqual(list(firsts), [self._int(a) for a in ('10.0.0.0', '10.0.1.0', '10.0.2.0', '10.0.3.0')])
+        self.assertEqual(list(addresses), [2, 1, 0, 1])
+        self.assertEqual(list(covered), [256, 128, 128, 0])
+        self.assertEqual(
+            [str(prefix) for prefix in space.get_free_blocks(parent)],
+            ['10.0.1.128/25', '10.0.2.128/25', '10.0.3.0/24']
+        )
+
+    def test_load(self):
+        vrf = VRF.objects.create(name='Test', rd='1:1')
+        Prefix.objects.create(prefix=netaddr.IPNetwork('10.0.0.0/24'), vrf=vrf)
+        Prefix.objects.create(prefix=netaddr.IPNetwork('10.0.0.0/24'))
+        Prefix.objects.create(prefix=netaddr.IPNetwork('2001:db8::/64'), vrf=vrf)
+        IPAddress.objects.create(address=netaddr.IPNetwork('10.0.0.1/24'), vrf=vrf)
+        IPAddress.objects.create(address=netaddr.IPNetwork('10.0.0.2/24'))
+        IPAddress.objects.create(address=netaddr.IPNetwork('2001:db8::1/64'), vrf=vrf)
+        space = IPv4Space.load(vrf=vrf)
+        self.assertEqual(list(space.addresses), [self._int('10.0.0.1')])
+        self.assertEqual(list(space.prefix_firsts), [self._int('10.0.0.0')])
+        self.assertEqual(list(space.prefix_lasts), [self._int('10.0.0.255')])
+        report = space.get_report(netaddr.IPNetwork('10.0.0.0/23'), 24)
+        self.assertEqual(report['coverage'], 50)
+        self.assertEqual(report['blocks'][0]['prefix'], netaddr.IPNetwork('10.0.0.0/24'))
+        self.assertEqual(report['free_blocks'], [netaddr.IPNetwork('10.0.1.0/24')])
+
+    def test_load_parent_address_mask(self):
+        # An IP address with a mask shorter than that of the parent is counted by its host portion
+        IPAddress.objects.create(address=netaddr.IPNetwork('10.0.0.5/16'))
+        IPAddress.objects.create(address=netaddr.IPNetwork('10.0.1.5/16'))
+        space = IPv4Space.load(parent=netaddr.IPNetwork('10.0.0.0/24'))
+        self.assertEqual(list(space.addresses), [self._int('10.0.0.5')])
+
+
+class TestVRFSummary(TestCase):
+
+    def setUp(self):
+        self.vrf1 = VRF.objects.create(name='Test 1', rd='1:1')
+        self.vrf2 = VRF.objects.create(name='Test 2', rd='1:2')
+        for vrf, prefix, status in [
+            (self.vrf1, '10.0.0.0/24', PREFIX_STATUS_CONTAINER),
+            (self.vrf1, '10.0.0.0/25', PREFIX_STATUS_ACTIVE),
+            (self.vrf1, '10.0.1.0/30', PREFIX_STATUS_ACTIVE),
+            (self.vrf2, '10.0.0.0/24', PREFIX_STATUS_RESERVED),
+            (None, '10.0.0.0/8', PREFIX_STATUS_ACTIVE),
+        ]:
+            Prefix.objects.create(vrf=vrf, prefix=netaddr.IPNetwork(prefix), status=status)
+        for vrf, address, status in [
+            (self.vrf1, '10.0.1.1/30', IPADDRESS_STATUS_ACTIVE),
+            (self.vrf1, '10.0.1.2/30', IPADDRESS_STATUS_DHCP),
+            (None, '10.0.1.3/30', IPADDRESS_STATUS_ACTIVE),
+        ]:
+            IPAddress.objects.create(vrf=vrf, address=netaddr.IPNetwork(address), status=status)
+
+    def test_summary(self):
+        summaries = VRFSummary.objects.get_for_vrfs([self.vrf1.pk, self.vrf2.pk])
+        summary = summaries[self.vrf1.pk]
+        self.assertEqual(summary.get_prefix_counts(), [
+            ('Container', 1), ('Active', 2), ('Reserved', 0), ('Deprecated', 0),
+        ])
+        self.assertEqual(summary.get_ipaddress_counts(), [
+            ('Active', 1), ('Reserved', 0), ('Deprecated', 0), ('DHCP', 1),
+        ])
+        self.assertEqual((summary.prefix_count, summary.ipaddress_count), (3, 2))
+        # The average of 10.0.0.0/24 (50% covered) and 10.0.1.0/30 (both usable addresses assigned)
+        self.assertEqual(summary.utilization, 75)
+        self.assertEqual((summaries[self.vrf2.pk].prefix_count, summaries[self.vrf2.pk].utilization), (1, 0))
+
+        # Cached summaries are retrieved with a single query
+        with self.assertNumQueries(1):
+            self.assertEqual(VRFSummary.objects.get_for_vrfs([self.vrf1.pk])[self.vrf1.pk].prefix_count, 3)
+        self.assertEqual(VRF.objects.get(pk=self.vrf1.pk).get_summary().prefix_count, 3)
+
+    def test_invalidation(self):
+
+        def get_cached():
+            VRFSummary.objects.get_for_vrfs([self.vrf1.pk, self.vrf2.pk])
+            return set(VRFSummary.objects.values_list('vrf_id', flat=True))
+
+        # Creation, modification, and deletion
+        get_cached()
+        ip = IPAddress.objects.create(vrf=self.vrf1, address=netaddr.IPNetwork('10.0.1.1/24'))
+        self.assertEqual(VRFSummary.objects.get().vrf_id, self.vrf2.pk)
+        get_cached()
+        ip.vrf = self.vrf2
+        ip.save()
+        self.assertFalse(VRFSummary.objects.exists())
+        get_cached()
+        ip.delete()
+        self.assertEqual(VRFSummary.objects.get().vrf_id, self.vrf1.pk)
+        get_cached()
+        Prefix.objects.filter(vrf=self.vrf2).first().delete()
+        self.assertEqual(VRFSummary.objects.get().vrf_id, self.vrf1.pk)
+
+        # Bulk operations
+        get_cached()
+        IPAddress.objects.filter(vrf=self.vrf1).update(description='Test')
+        self.assertEqual(get_cached(), {self.vrf1.pk, self.vrf2.pk})
+        IPAddress.objects.filter(vrf=self.vrf1).update(status=IPADDRESS_STATUS_ACTIVE)
+        self.assertEqual(VRFSummary.objects.get().vrf_id, self.vrf2.pk)
+        get_cached()
+        Prefix.objects.filter(vrf=self.vrf1).update(vrf=self.vrf2)
+        self.assertFalse(VRFSummary.objects.exists())
+        get_cached()
+        IPAddress.objects.bulk_create([IPAddress(vrf=self.vrf2, address=netaddr.IPNetwork('10.0.0.1/24'), family=4)])
+        self.assertEqual(VRFSummary.objects.get().vrf_id, self.vrf1.pk)
+        self.assertEqual(VRFSummary.objects.get_for_vrfs([self.vrf2.pk])[self.vrf2.pk].prefix_count, 3)
+
+
+class TestAudit(TestCase):
+
+    def setUp(self):
+        self.vrf = VRF.objects.create(name='Test', rd='1:1', enforce_unique=True)
+        for vrf, address in [
+            (None, '192.0.2.1/24'), (None, '192.0.2.1/32'), (None, '192.0.2.2/24'),
+            (self.vrf, '192.0.2.1/24'), (self.vrf, '192.0.2.2/24'), (self.vrf, '192.0.2.2/25'),
+        ]:
+            IPAddress.objects.create(vrf=vrf, address=netaddr.IPNetwork(address))
+        for vrf, prefix in [(None, '192.0.2.0/24'), (None, '192.0.2.0/24'), (self.vrf, '192.0.2.0/24')]:
+            Prefix.objects.create(vrf=vrf, prefix=netaddr.IPNetwork(prefix))
+        rir = RIR.objects.create(name='RIR', slug='rir')
+        for prefix in ['10.0.0.0/8', '10.1.0.0/16', '10.2.0.0/16', '172.16.0.0/12', '2001:db8::/32']:
+            Aggregate.objects.create(prefix=netaddr.IPNetwork(prefix), rir=rir)
+
+    def test_duplicate_ipaddresses(self):
+        conflicts = list(find_duplicate_ipaddresses())
+        self.assertEqual(
+            [(c['vrf'], c['value'], c['enforced'], [obj for pk, obj in c['objects']]) for c in conflicts],
+            [
+                (None, '192.0.2.1', False, ['192.0.2.1/24', '192.0.2.1/32']),
+                (self.vrf.pk, '192.0.2.2', True, ['192.0.2.2/24', '192.0.2.2/25']),
+            ]
+        )
+        self.assertEqual(len(list(find_duplicate_ipaddresses([self.vrf.pk]))), 1)
+
+    def test_duplicate_prefixes(self):
+        conflicts = list(find_duplicate_prefixes())
+        self.assertEqual([(c['vrf'], c['value'], len(c['objects'])) for c in conflicts], [(None, '192.0.2.0/24', 2)])
+
+    def test_overlapping_aggregates(self):
+        conflicts = list(find_overlapping_aggregates())
+        self.assertEqual(
+            [[obj for pk, obj in c['objects']] for c in conflicts],
+            [['10.0.0.0/8', '10.1.0.0/16'], ['10.0.0.0/8', '10.2.0.0/16']]
+        )
+
+    def test_overlapping_prefixes(self):
+        self.assertEqual(list(find_overlapping_prefixes()), [])
+        for vrf, prefix, status in [
+            (None, '192.0.2.0/25', PREFIX_STATUS_ACTIVE),
+            (None, '192.0.2.0/26', PREFIX_STATUS_ACTIVE),
+            (None, '198.51.100.0/24', PREFIX_STATUS_CONTAINER),
+            (None, '198.51.100.0/25', PREFIX_STATUS_ACTIVE),
+        ]:
+            Prefix.objects.create(vrf=vrf, prefix=netaddr.IPNetwork(prefix), status=status)
+        conflicts = list(find_overlapping_prefixes())
+        self.assertEqual(
+            [(c['vrf'], c['value'], [obj for pk, obj in c['objects']]) for c in conflicts],
+            [
+                (None, '192.0.2.0/24', ['192.0.2.0/24', '192.0.2.0/24', '192.0.2.0/25', '192.0.2.0/26']),
+                (None, '192.0.2.0/25', ['192.0.2.0/25', '192.0.2.0/26']),
+            ]
+        )
+        self.assertEqual(list(find_overlapping_prefixes([self.vrf.pk])), [])
+
+    def test_find_conflicts(self):
+        self.assertEqual(len(list(find_conflicts())), 5)
+        self.assertEqual(len(list(find_conflicts(vrf_ids=[self.vrf.pk]))), 1)
+        self.assertEqual(len(list(find_conflicts(types=[CONFLICT_OVERLAPPING_AGGREGATE]))), 2)
+
+    @override_settings(ENFORCE_GLOBAL_UNIQUE=True)
+    def test_duplicates_of(self):
+        ip_addresses = [
+            IPAddress.objects.create(vrf=vrf, address=netaddr.IPNetwork(address)) for vrf, address in [
+                (self.vrf, '192.0.2.1/25'), (self.vrf, '192.0.2.3/24'), (self.vrf, '192.0.2.3/25'),
+                (None, '192.0.2.4/24'), (None, '192.0.2.2/32'),
+            ]
+        ]
+        with self.assertNumQueries(1):
+            duplicates = find_duplicates_of(ip_addresses)
+        # Each IP is duplicated only by a pre-existing IP or one preceding it in the list
+        self.assertEqual(duplicates, {0: '192.0.2.1/24', 2: '192.0.2.3/24', 4: '192.0.2.2/24'})
+        self.assertEqual(
+            ip_addresses[2].get_duplicate_error(duplicates[2]).message_dict,
+            {'address': ["Duplicate IP address found in VRF Test (1:1): 192.0.2.3/24"]}
+        )
+
+        prefixes = [
+            Prefix.objects.create(vrf=vrf, prefix=netaddr.IPNetwork(prefix)) for vrf, prefix in [
+                (self.vrf, '192.0.2.0/24'), (self.vrf, '192.0.2.0/25'), (None, '198.51.100.0/24'),
+            ]
+        ]
+        self.assertEqual(find_duplicates_of(prefixes), {0: '192.0.2.0/24'})
+        with override_settings(ENFORCE_GLOBAL_UNIQUE=False):
+            self.assertEqual(find_duplicates_of(ip_addresses[3:]), {})
+
+
 class TestIPAddress(TestCase):
 
     @override_settings(ENFORCE_GLOBAL_UNIQUE=False)
@@ -60,3 +715,53 @@ class TestIPAddress(TestCase):
         IPAddress.objects.create(vrf=vrf, address=netaddr.IPNetwork('192.0.2.1/24'))
         duplicate_ip = IPAddress(vrf=vrf, address=netaddr.IPNetwork('192.0.2.1/24'))
         self.assertRaises(ValidationError, duplicate_ip.clean)
+
+    def test_records(self):
+        site = Site.objects.create(name='Test Site 1', slug='test-site-1')
+        manufacturer = Manufacturer.objects.create(name='Test Manufacturer 1', slug='test-manufacturer-1')
+        devicetype = DeviceType.objects.create(manufacturer=manufacturer, model='Test Device Type 1')
+        devicerole = DeviceRole.objects.create(name='Test Device Role 1', slug='test-device-role-1')
+        device = Device.objects.create(site=site, device_type=devicetype, device_role=devicerole)
+        interface = Interface.objects.create(device=device, name='eth0')
+        vrf = VRF.objects.create(name='Test', rd='1:1')
+        tenant = Tenant.objects.create(name='Test Tenant', slug='test-tenant')
+        ip = IPAddress.objects.create(address=netaddr.IPNetwork('192.0.2.1/24'), interface=interface, tenant=tenant)
+        device.primary_ip4 = ip
+        device.save()
+        IPAddress.objects.create(address=netaddr.IPNetwork('2001:db8::1/64'), vrf=vrf, description='Test, IPv6')
+
+        with self.assertNumQueries(1):
+            records = list(IPAddress.objects.records())
+        self.assertEqual(
+            [record.to_csv() for record in records],
+            [ip.to_csv() for ip in IPAddress.objects.select_related('vrf', 'tenant', 'interface__device')]
+        )
+        self.assertEqual(records[0].value, netaddr.IPAddress('192.0.2.1').value)
+        self.assertEqual((records[1].value, records[1].prefix_length), (netaddr.IPAddress('2001:db8::1').value, 64))
+
+        # Without related fields, records hold only the IPs' own fields
+        record = next(IPAddress.objects.filter(vrf=vrf).records(related=False))
+        self.assertEqual((str(record), record.vrf_id, record.vrf_rd), ('2001:db8::1/64', vrf.pk, None))
+
+    def test_net_host_lookups(self):
+        for address in ('192.0.2.1/24', '192.0.2.65/26', '2001:db8::1/64'):
+            IPAddress.objects.create(address=netaddr.IPNetwork(address))
+        self.assertEqual(IPAddress.objects.filter(address__net_host='192.0.2.1/32').count(), 1)
+        self.assertEqual(IPAddress.objects.filter(address__net_host='2001:db8::1').count(), 1)
+        self.assertEqual(IPAddress.objects.filter(address__net_host_contained='192.0.2.0/26').count(), 1)
+        self.assertEqual(IPAddress.objects.filter(address__net_host_contained='192.0.2.0/24').count(), 2)
+        self.assertEqual(IPAddress.objects.filter(address__net_host_contained='2001:db8::/32').count(), 1)
+        # A host route contains no other hosts
+        self.assertEqual(IPAddress.objects.filter(address__net_host_contained='192.0.2.1/32').count(), 0)
+
+    def test_text_lookups(self):
+        for address in ('10.20.3.1/24', '10.20.30.1/24', '10.2.3.1/24', '2001:DB8::A/64'):
+            IPAddress.objects.create(address=netaddr.IPNetwork(address))
+        self.assertEqual(IPAddress.objects.filter(address__startswith='10.20.3').count(), 2)
+        self.assertEqual(IPAddress.objects.filter(address__istartswith='2001:DB8').count(), 1)
+        self.assertEqual(IPAddress.objects.filter(address__contains='.3.').count(), 2)
+        self.assertEqual(IPAddress.objects.filter(address__endswith='.1/24').count(), 3)
+        self.assertEqual(IPAddress.objects.filter(address__regex=r'^10\.20?\.3\.').count(), 2)
+        # LIKE wildcards in the value are matched literally
+        self.assertEqual(IPAddress.objects.filter(address__contains='%').count(), 0)
+        self.assertEqual(IPAddressFilter({'q': '10.20.3'}, IPAddress.objects.all()).qs.count(), 2)
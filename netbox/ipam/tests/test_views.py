@@ -0,0 +1,181 @@
+from __future__ import unicode_literals
+
+from netaddr import IPNetwork
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from extras.models import CustomField, CustomFieldValue, CF_TYPE_TEXT
+from ipam.constants import IPADDRESS_STATUS_ACTIVE, PREFIX_STATUS_CONTAINER
+from ipam.forms import IPAddressPatternForm
+from ipam.models import Aggregate, IPAddress, Prefix, RIR, VRF
+from ipam.views import IPAddressBulkCreateView
+
+
+class IPAddressBulkCreateViewTest(TestCase):
+
+    def setUp(self):
+
+        self.user = User.objects.create(username='testuser', is_superuser=True)
+        self.client.force_login(self.user)
+        self.url = reverse('ipam:ipaddress_bulk_add')
+
+        self.vrf = VRF.objects.create(name='Test VRF 1', rd='65000:1', enforce_unique=True)
+
+    def _create_objects(self, addresses, **data):
+        """
+        Call create_objects() directly with the given list of addresses, which need not be the expansion of a pattern.
+        """
+        data = dict({'pattern': addresses[0], 'status': IPADDRESS_STATUS_ACTIVE}, **data)
+        request = RequestFactory().post(self.url, data)
+        request.user = self.user
+        pattern_form = IPAddressPatternForm(request.POST)
+        pattern_form.is_valid()
+        model_form, new_objs = IPAddressBulkCreateView().create_objects(request, addresses, pattern_form)
+        return pattern_form, model_form, new_objs
+
+    def test_create_ipaddresses(self):
+
+        custom_field = CustomField.objects.create(type=CF_TYPE_TEXT, name='test')
+        custom_field.obj_type = [ContentType.objects.get_for_model(IPAddress)]
+
+        data = {
+            'pattern': '192.0.2.[1-3]/24',
+            'vrf': self.vrf.pk,
+            'status': IPADDRESS_STATUS_ACTIVE,
+            'description': 'Test',
+            'cf_test': 'Foo',
+        }
+        response = self.client.post(self.url, data)
+
+        self.assertEqual(response.status_code, 302)
+        ipaddresses = IPAddress.objects.order_by('address')
+        self.assertEqual(
+            [str(ipaddress.address) for ipaddress in ipaddresses], ['192.0.2.1/24', '192.0.2.2/24', '192.0.2.3/24']
+        )
+        for ipaddress in ipaddresses:
+            self.assertEqual((ipaddress.vrf, ipaddress.family, ipaddress.description), (self.vrf, 4, 'Test'))
+            self.assertEqual(ipaddress.cf()['test'], 'Foo')
+        self.assertEqual(CustomFieldValue.objects.filter(field=custom_field).count(), 3)
+
+    def test_invalid_shared_field(self):
+
+        response = self.client.post(self.url, {'pattern': '192.0.2.[1-3]/24', 'status': 999})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('status', response.context['model_form'].errors)
+        self.assertFalse(IPAddress.objects.exists())
+
+    def test_invalid_addresses(self):
+
+        response = self.client.post(self.url, {'pattern': '192.0.2.[1,300,301]/24', 'status': IPADDRESS_STATUS_ACTIVE})
+
+        # Every invalid address is reported, and nothing is created
+        self.assertEqual(response.status_code, 200)
+        errors = response.context['pattern_form'].errors['pattern']
+        self.assertEqual([error.split(':')[0] for error in errors], ['192.0.2.300/24', '192.0.2.301/24'])
+        self.assertFalse(IPAddress.objects.exists())
+
+    def test_duplicate_in_pattern(self):
+
+        pattern_form, model_form, new_objs = self._create_objects(
+            ['192.0.2.1/24', '192.0.2.1/25', '192.0.2.2/24'], vrf=self.vrf.pk
+        )
+
+        self.assertIsNone(new_objs)
+        self.assertEqual(pattern_form.errors['pattern'], ['Duplicate IP address in pattern: 192.0.2.1/25'])
+
+    def test_duplicate_in_pattern_not_enforced(self):
+
+        pattern_form, model_form, new_objs = self._create_objects(['192.0.2.1/24', '192.0.2.1/25'])
+
+        self.assertFalse(pattern_form.errors)
+        self.assertEqual(IPAddress.objects.filter(vrf__isnull=True).count(), 2)
+
+    def test_duplicate_existing(self):
+
+        IPAddress.objects.create(vrf=self.vrf, address=IPNetwork('192.0.2.2/24'))
+        IPAddress.objects.create(vrf=self.vrf, address=IPNetwork('192.0.2.3/30'))
+
+        data = {'pattern': '192.0.2.[1-3]/24', 'vrf': self.vrf.pk, 'status': IPADDRESS_STATUS_ACTIVE}
+        response = self.client.post(self.url, data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['pattern_form'].errors['pattern']), 2)
+        self.assertEqual(IPAddress.objects.count(), 2)
+
+    @override_settings(ENFORCE_GLOBAL_UNIQUE=True)
+    def test_duplicate_existing_global(self):
+
+        IPAddress.objects.create(address=IPNetwork('192.0.2.2/24'))
+        IPAddress.objects.create(vrf=self.vrf, address=IPNetwork('192.0.2.1/24'))
+
+        response = self.client.post(self.url, {'pattern': '192.0.2.[1-3]/24', 'status': IPADDRESS_STATUS_ACTIVE})
+
+        # Only the duplicate within the global table is reported
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context['pattern_form'].errors['pattern'],
+            ['Duplicate IP address found in global table: 192.0.2.2/24']
+        )
+        self.assertEqual(IPAddress.objects.count(), 2)
+
+    def test_duplicate_existing_not_enforced(self):
+
+        IPAddress.objects.create(address=IPNetwork('192.0.2.2/24'))
+
+        response = self.client.post(self.url, {'pattern': '192.0.2.[1-3]/24', 'status': IPADDRESS_STATUS_ACTIVE})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(IPAddress.objects.filter(address__net_host='192.0.2.2').count(), 2)
+
+
+class ListViewUtilizationTest(TestCase):
+
+    def setUp(self):
+
+        self.client.force_login(User.objects.create(username='testuser', is_superuser=True))
+
+        self.rir = RIR.objects.create(name='RIR 1', slug='rir-1')
+        Aggregate.objects.create(prefix=IPNetwork('10.0.0.0/16'), rir=self.rir)
+        Prefix.objects.create(prefix=IPNetwork('10.0.0.0/24'), status=PREFIX_STATUS_CONTAINER)
+        Prefix.objects.create(prefix=IPNetwork('10.0.0.0/25'))
+        IPAddress.objects.create(address=IPNetwork('10.0.0.1/25'))
+
+    def _get_records(self, url):
+        """
+        Request a list view with a constant number of queries regardless of the number of objects, and return the
+        records on the page of its table.
+        """
+        # The first request populates the content type cache
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        for i in range(1, 4):
+            Aggregate.objects.create(prefix=IPNetwork('10.{}.0.0/16'.format(i)), rir=self.rir)
+            Prefix.objects.create(prefix=IPNetwork('10.{}.0.0/24'.format(i)))
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+        return [row.record for row in response.context['table'].page.object_list]
+
+    def test_aggregate_list(self):
+
+        records = self._get_records(reverse('ipam:aggregate_list'))
+
+        self.assertEqual(
+            [(str(aggregate.prefix), aggregate.utilization) for aggregate in records],
+            [('10.0.0.0/16', 0), ('10.1.0.0/16', 0), ('10.2.0.0/16', 0), ('10.3.0.0/16', 0)]
+        )
+
+    def test_prefix_list(self):
+
+        records = self._get_records('{}?expand=1'.format(reverse('ipam:prefix_list')))
+
+        self.assertEqual(
+            [(str(prefix.prefix), prefix.utilization) for prefix in records],
+            [('10.0.0.0/24', 50), ('10.0.0.0/25', 0), ('10.1.0.0/24', 0), ('10.2.0.0/24', 0), ('10.3.0.0/24', 0)]
+        )
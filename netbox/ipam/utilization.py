@@ -0,0 +1,102 @@
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+from django.db import connection
+
+from .constants import PREFIX_STATUS_CONTAINER
+from .intervals import IntervalList
+
+
+def _values(networks):
+    """
+    Render a list of (index, network, vrf_id) tuples as a VALUES list and its parameters, for use as a derived table
+    named "p" with the columns idx, prefix, and vrf_id.
+    """
+    sql = '(VALUES {}) AS p(idx, prefix, vrf_id)'.format(
+        ', '.join(['(%s, %s::cidr, %s::integer)'] * len(networks))
+    )
+    params = [value for network in networks for value in (network[0], str(network[1]), network[2])]
+    return sql, params
+
+
+def _count_ipaddresses(networks):
+    """
+    Return a dictionary mapping the index of each network to the number of IPAddresses it contains within its VRF.
+    """
+    from .models import IPAddress
+
+    values, params = _values(networks)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT p.idx, COUNT(*) FROM {} INNER JOIN {} AS ip ON ip.address <<= p.prefix "
+            "AND ip.vrf_id IS NOT DISTINCT FROM p.vrf_id GROUP BY p.idx".format(values, IPAddress._meta.db_table),
+            params
+        )
+        return dict(cursor.fetchall())
+
+
+def _get_coverage(networks, strict=True, any_vrf=False):
+    """
+    Return a dictionary mapping the index of each network to the number of addresses covered by the Prefixes within it.
+    Child Prefixes are retrieved with a single query and merged in memory.
+    """
+    from .models import Prefix
+
+    values, params = _values(networks)
+    condition = 'c.prefix << p.prefix' if strict else 'c.prefix <<= p.prefix'
+    if not any_vrf:
+        condition += ' AND c.vrf_id IS NOT DISTINCT FROM p.vrf_id'
+    children = defaultdict(list)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT p.idx, c.prefix FROM {} INNER JOIN {} AS c ON {}".format(values, Prefix._meta.db_table, condition),
+            params
+        )
+        for idx, prefix in cursor.fetchall():
+            children[idx].append(prefix)
+    return {idx: IntervalList.from_networks(prefixes).size for idx, prefixes in children.items()}
+
+
+def annotate_prefix_utilization(prefixes):
+    """
+    Compute the utilization of each Prefix in the given list, assigning it as a percentage to the utilization attribute
+    of the Prefix. Containers are measured by the address space of their child Prefixes; all other Prefixes by the
+    number of child IPAddresses. At most two queries are executed regardless of the number of Prefixes.
+    """
+    containers = []
+    networks = []
+    for i, prefix in enumerate(prefixes):
+        if prefix.status == PREFIX_STATUS_CONTAINER:
+            containers.append((i, prefix.prefix, prefix.vrf_id))
+        else:
+            networks.append((i, prefix.prefix, prefix.vrf_id))
+
+    coverage = _get_coverage(containers) if containers else {}
+    ip_counts = _count_ipaddresses(networks) if networks else {}
+
+    for i, prefix in enumerate(prefixes):
+        if prefix.status == PREFIX_STATUS_CONTAINER:
+            prefix.utilization = int(float(coverage.get(i, 0)) / prefix.prefix.size * 100)
+        else:
+            prefix_size = prefix.prefix.size
+            if prefix.family == 4 and prefix.prefix.prefixlen < 31 and not prefix.is_pool:
+                prefix_size -= 2
+            prefix.utilization = int(float(ip_counts.get(i, 0)) / prefix_size * 100)
+
+    return prefixes
+
+
+def annotate_aggregate_utilization(aggregates):
+    """
+    Compute the utilization of each Aggregate in the given list (the portion of its address space allocated to Prefixes
+    in any VRF), assigning it as a percentage to the utilization attribute of the Aggregate.
+    """
+    if aggregates:
+        coverage = _get_coverage(
+            [(i, aggregate.prefix, None) for i, aggregate in enumerate(aggregates)], strict=False, any_vrf=True
+        )
+        for i, aggregate in enumerate(aggregates):
+            aggregate.utilization = int(float(coverage.get(i, 0)) / aggregate.prefix.size * 100)
+
+    return aggregates
@@ -5,22 +5,28 @@ import netaddr
 
 from django.conf import settings
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.db.models import Count, Q
+from django.core.exceptions import ValidationError
+from django.db.models import BooleanField, Case, Count, F, Value, When
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
 from django.views.generic import View
 
 from dcim.models import Device
+from extras.models import CustomFieldValue
 from utilities.paginator import EnhancedPaginator
 from utilities.views import (
     BulkCreateView, BulkDeleteView, BulkEditView, BulkImportView, ObjectDeleteView, ObjectEditView, ObjectListView,
 )
 from . import filters, forms, tables
+from .analysis import IPv4Space
+from .audit import find_duplicates_of
 from .constants import IPADDRESS_ROLE_ANYCAST
+from .intervals import get_available_networks
 from .models import (
-    Aggregate, IPAddress, PREFIX_STATUS_ACTIVE, PREFIX_STATUS_DEPRECATED, PREFIX_STATUS_RESERVED, Prefix, RIR, Role,
-    Service, VLAN, VLANGroup, VRF,
+    Aggregate, AggregateStatistic, IPAddress, Prefix, RIR, Role, Service, VLAN, VLANGroup, VRF, annotate_vrf_summaries,
 )
+from .radix import prefix_index
+from .utilization import annotate_aggregate_utilization, annotate_prefix_utilization
 
 
 def add_available_prefixes(parent, prefix_list):
@@ -29,8 +35,8 @@ def add_available_prefixes(parent, prefix_list):
     """
 
     # Find all unallocated space
-    available_prefixes = netaddr.IPSet(parent) ^ netaddr.IPSet([p.prefix for p in prefix_list])
-    available_prefixes = [Prefix(prefix=p) for p in available_prefixes.iter_cidrs()]
+    available_prefixes = get_available_networks(parent, [p.prefix for p in prefix_list])
+    available_prefixes = [Prefix(prefix=p) for p in available_prefixes]
 
     # Concatenate and sort complete list of children
     prefix_list = list(prefix_list) + available_prefixes
@@ -39,52 +45,106 @@ def add_available_prefixes(parent, prefix_list):
     return prefix_list
 
 
-def add_available_ipaddresses(prefix, ipaddress_list, is_pool=False):
+def get_ipaddress_window(prefix, queryset, start=None, per_page=50, is_pool=False):
     """
-    Annotate ranges of available IP addresses within a given prefix. If is_pool is True, the first and last IP will be
-    considered usable (regardless of mask length).
+    Retrieve a single page of the IP addresses within a prefix, interleaved with (count, first address) tuples
+    representing ranges of available IP addresses. If is_pool is True, the first and last IP will be considered usable
+    (regardless of mask length).
+
+    Pages are keyed by address rather than offset: each page begins at the given start address (or at the beginning of
+    the prefix) and holds up to per_page rows. Only the IPs within the page and those immediately adjacent to it are
+    retrieved. Returns a tuple of the rows, the start address of the previous page, and the start address of the next
+    page (None where no such page exists).
     """
-
-    output = []
-    prev_ip = None
-
     # Ignore the network and broadcast addresses for non-pool IPv4 prefixes larger than /31.
     if prefix.version == 4 and prefix.prefixlen < 31 and not is_pool:
-        first_ip_in_prefix = netaddr.IPAddress(prefix.first + 1)
-        last_ip_in_prefix = netaddr.IPAddress(prefix.last - 1)
+        first_usable, last_usable = prefix.first + 1, prefix.last - 1
     else:
-        first_ip_in_prefix = netaddr.IPAddress(prefix.first)
-        last_ip_in_prefix = netaddr.IPAddress(prefix.last)
-
-    if not ipaddress_list:
-        return [(
-            int(last_ip_in_prefix - first_ip_in_prefix + 1),
-            '{}/{}'.format(first_ip_in_prefix, prefix.prefixlen)
-        )]
-
-    # Account for any available IPs before the first real IP
-    if ipaddress_list[0].address.ip > first_ip_in_prefix:
-        skipped_count = int(ipaddress_list[0].address.ip - first_ip_in_prefix)
-        first_skipped = '{}/{}'.format(first_ip_in_prefix, prefix.prefixlen)
-        output.append((skipped_count, first_skipped))
-
-    # Iterate through existing IPs and annotate free ranges
-    for ip in ipaddress_list:
-        if prev_ip:
-            diff = int(ip.address.ip - prev_ip.address.ip)
-            if diff > 1:
-                first_skipped = '{}/{}'.format(prev_ip.address.ip + 1, prefix.prefixlen)
-                output.append((diff - 1, first_skipped))
-        output.append(ip)
-        prev_ip = ip
-
-    # Include any remaining available IPs
-    if prev_ip.address.ip < last_ip_in_prefix:
-        skipped_count = int(last_ip_in_prefix - prev_ip.address.ip)
-        first_skipped = '{}/{}'.format(prev_ip.address.ip + 1, prefix.prefixlen)
-        output.append((skipped_count, first_skipped))
-
-    return output
+        first_usable, last_usable = prefix.first, prefix.last
+    start = prefix.first if start is None else min(max(int(start), prefix.first), prefix.last)
+
+    def get_gap(first, last):
+        first, last = max(first, first_usable), min(last, last_usable)
+        if first <= last:
+            return last - first + 1, '{}/{}'.format(netaddr.IPAddress(first, prefix.version), prefix.prefixlen)
+        return None
+
+    # Walk forward from the start address to assemble the current page. Duplicate IPs are never split across pages.
+    rows = []
+    next_start = None
+    position = start
+    last_host = None
+    for ipaddress in queryset.filter(host__gte=str(netaddr.IPAddress(start, prefix.version))).iterator():
+        host = ipaddress.address.value
+        gap = get_gap(position, host - 1)
+        if gap:
+            if len(rows) >= per_page:
+                next_start = position
+                break
+            rows.append(gap)
+            position = host
+        if len(rows) >= per_page and host != last_host:
+            next_start = position
+            break
+        rows.append(ipaddress)
+        position = host + 1
+        last_host = host
+    else:
+        gap = get_gap(position, prefix.last)
+        if gap:
+            if len(rows) >= per_page:
+                next_start = position
+            else:
+                rows.append(gap)
+
+    # Walk backward from the start address to find the beginning of the previous page.
+    previous_start = None
+    count = 0
+    position = start - 1
+    last_host = None
+    if start > prefix.first:
+        for record in queryset.filter(host__lt=str(netaddr.IPAddress(start, prefix.version))).reverse().records(
+            related=False
+        ):
+            host = record.value
+            gap = get_gap(host + 1, position)
+            if gap:
+                if count >= per_page:
+                    break
+                count += 1
+                previous_start = max(host + 1, first_usable)
+            if count >= per_page and host != last_host:
+                break
+            count += 1
+            previous_start = host
+            position = host - 1
+            last_host = host
+        else:
+            if count < per_page and get_gap(prefix.first, position):
+                previous_start = max(prefix.first, first_usable)
+        if previous_start is not None and previous_start <= first_usable:
+            previous_start = prefix.first
+
+    def to_address(value):
+        return str(netaddr.IPAddress(value, prefix.version)) if value is not None else None
+
+    return rows, to_address(previous_start), to_address(next_start)
+
+
+class UniqueIPSpaceImportView(BulkImportView):
+    """
+    Import Prefixes or IPAddresses, checking all imported objects for duplicates within their VRFs using a single query
+    rather than one query per row.
+    """
+    def _get_obj_form(self, data):
+        obj_form = super(UniqueIPSpaceImportView, self)._get_obj_form(data)
+        obj_form.instance.check_duplicates = False
+        return obj_form
+
+    def _validate_objs(self, obj_forms):
+        duplicates = find_duplicates_of([obj_form.instance for obj_form in obj_forms])
+        for i, duplicate in sorted(duplicates.items()):
+            obj_forms[i].add_error(None, obj_forms[i].instance.get_duplicate_error(duplicate))
 
 
 #
@@ -95,22 +155,30 @@ class VRFListView(ObjectListView):
     queryset = VRF.objects.select_related('tenant')
     filter = filters.VRFFilter
     filter_form = forms.VRFFilterForm
-    table = tables.VRFTable
+    table = tables.VRFDetailTable
     template_name = 'ipam/vrf_list.html'
 
+    def annotate_page(self, request, objects):
+        # Retrieve (or compute) the summaries of all VRFs on the current page at once
+        annotate_vrf_summaries(objects)
+
 
 class VRFView(View):
 
     def get(self, request, pk):
 
-        vrf = get_object_or_404(VRF.objects.all(), pk=pk)
+        vrf = get_object_or_404(VRF.objects.select_related('summary'), pk=pk)
+        summary = vrf.get_summary()
+
+        # Top-level prefixes table
         prefix_table = tables.PrefixTable(
-            list(Prefix.objects.filter(vrf=vrf).select_related('site', 'role')), orderable=False
+            list(Prefix.objects.filter(vrf=vrf, depth=0).select_related('site', 'role')), orderable=False
         )
         prefix_table.exclude = ('vrf',)
 
         return render(request, 'ipam/vrf.html', {
             'vrf': vrf,
+            'summary': summary,
             'prefix_table': prefix_table,
         })
 
@@ -179,40 +247,13 @@ class RIRListView(ObjectListView):
             family = 4
             denominator = 1
 
+        # Retrieve the stored space statistics of all RIRs at once
+        rir_totals = AggregateStatistic.objects.get_rir_totals(family)
+
         rirs = []
         for rir in self.queryset:
 
-            stats = {
-                'total': 0,
-                'active': 0,
-                'reserved': 0,
-                'deprecated': 0,
-                'available': 0,
-            }
-            aggregate_list = Aggregate.objects.filter(family=family, rir=rir)
-            for aggregate in aggregate_list:
-
-                queryset = Prefix.objects.filter(prefix__net_contained_or_equal=str(aggregate.prefix))
-
-                # Find all consumed space for each prefix status (we ignore containers for this purpose).
-                active_prefixes = netaddr.cidr_merge([p.prefix for p in queryset.filter(status=PREFIX_STATUS_ACTIVE)])
-                reserved_prefixes = netaddr.cidr_merge([p.prefix for p in queryset.filter(status=PREFIX_STATUS_RESERVED)])
-                deprecated_prefixes = netaddr.cidr_merge([p.prefix for p in queryset.filter(status=PREFIX_STATUS_DEPRECATED)])
-
-                # Find all available prefixes by subtracting each of the existing prefix sets from the aggregate prefix.
-                available_prefixes = (
-                    netaddr.IPSet([aggregate.prefix]) -
-                    netaddr.IPSet(active_prefixes) -
-                    netaddr.IPSet(reserved_prefixes) -
-                    netaddr.IPSet(deprecated_prefixes)
-                )
-
-                # Add the size of each metric to the RIR total.
-                stats['total'] += aggregate.prefix.size / denominator
-                stats['active'] += netaddr.IPSet(active_prefixes).size / denominator
-                stats['reserved'] += netaddr.IPSet(reserved_prefixes).size / denominator
-                stats['deprecated'] += netaddr.IPSet(deprecated_prefixes).size / denominator
-                stats['available'] += available_prefixes.size / denominator
+            stats = {key: value / denominator for key, value in rir_totals[rir.pk].items()}
 
             # Calculate the percentage of total space for each prefix status.
             total = float(stats['total'])
@@ -282,6 +323,10 @@ class AggregateListView(ObjectListView):
     table = tables.AggregateDetailTable
     template_name = 'ipam/aggregate_list.html'
 
+    def annotate_page(self, request, objects):
+        # Compute the utilization of all aggregates on the current page at once
+        annotate_aggregate_utilization(objects)
+
     def extra_context(self):
         ipv4_total = 0
         ipv6_total = 0
@@ -423,10 +468,28 @@ class PrefixListView(ObjectListView):
     table = tables.PrefixDetailTable
     template_name = 'ipam/prefix_list.html'
 
+    def annotate_page(self, request, objects):
+        # Compute the utilization of all prefixes on the current page at once
+        annotate_prefix_utilization(objects)
+
     def alter_queryset(self, request):
         # Show only top-level prefixes by default (unless searching)
-        limit = None if request.GET.get('expand') or request.GET.get('q') else 0
-        return self.queryset.annotate_depth(limit=limit)
+        expand = request.GET.get('expand') or request.GET.get('q')
+
+        # If the list has been filtered, the hierarchy must be derived relative to the remaining prefixes
+        filtered = any(
+            (k in self.filter.base_filters or k.startswith('cf_')) and request.GET.get(k) for k in request.GET
+        )
+        if filtered and 'depth' not in request.GET:
+            return self.queryset.annotate_depth(limit=None if expand else 0)
+
+        # Otherwise, rely on the stored depth of each prefix so that filtering and pagination occur within the database
+        queryset = self.queryset.annotate(relative_depth=F('depth'), has_children=Case(
+            When(children__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField()
+        ))
+        if not expand and 'depth' not in request.GET:
+            queryset = queryset.filter(depth=0)
+        return queryset
 
 
 class PrefixView(View):
@@ -447,15 +510,16 @@ class PrefixView(View):
             vrf=prefix.vrf, address__net_host_contained=str(prefix.prefix)
         ).count()
 
-        # Parent prefixes table
-        parent_prefixes = Prefix.objects.filter(
-            Q(vrf=prefix.vrf) | Q(vrf__isnull=True)
-        ).filter(
-            prefix__net_contains=str(prefix.prefix)
+        # Parent prefixes table. Every parent contains this prefix, so each is nested within those preceding it.
+        parent_prefixes = list(Prefix.objects.filter(
+            pk__in=prefix_index.get_parents(prefix)
         ).select_related(
             'site', 'role'
-        ).annotate_depth()
-        parent_prefix_table = tables.PrefixTable(list(parent_prefixes), orderable=False)
+        ))
+        parent_prefixes.sort(key=lambda p: p.prefix.prefixlen)
+        for depth, p in enumerate(parent_prefixes):
+            p.relative_depth = depth
+        parent_prefix_table = tables.PrefixTable(parent_prefixes, orderable=False)
         parent_prefix_table.exclude = ('vrf',)
 
         # Duplicate prefixes table
@@ -470,11 +534,15 @@ class PrefixView(View):
         duplicate_prefix_table.exclude = ('vrf',)
 
         # Child prefixes table
-        child_prefixes = Prefix.objects.filter(
-            vrf=prefix.vrf, prefix__net_contained=str(prefix.prefix)
+        child_prefixes = list(Prefix.objects.filter(
+            pk__in=prefix_index.get_children(prefix)
         ).select_related(
             'site', 'role'
-        ).annotate_depth(limit=0)
+        ))
+        for p in child_prefixes:
+            # Display immediate children without indentation
+            p.relative_depth = 0
+            p.has_children = bool(p.children)
         if child_prefixes:
             child_prefixes = add_available_prefixes(prefix.prefix, child_prefixes)
         child_prefix_table = tables.PrefixTable(child_prefixes)
@@ -518,18 +586,28 @@ class PrefixIPAddressesView(View):
         ).select_related(
             'vrf', 'interface__device', 'primary_ip4_for', 'primary_ip6_for'
         )
-        ipaddresses = add_available_ipaddresses(prefix.prefix, ipaddresses, prefix.is_pool)
 
-        ip_table = tables.IPAddressTable(ipaddresses)
+        # Retrieve only the current page of IPs, keyed by address
+        try:
+            start = netaddr.IPAddress(request.GET['start']) if request.GET.get('start') else None
+        except (netaddr.AddrFormatError, ValueError):
+            start = None
+        if start is not None and start.version != prefix.family:
+            start = None
+        try:
+            per_page = int(request.GET.get('per_page', settings.PAGINATE_COUNT))
+        except ValueError:
+            per_page = settings.PAGINATE_COUNT
+        if per_page < 1:
+            per_page = settings.PAGINATE_COUNT
+        rows, previous_start, next_start = get_ipaddress_window(
+            prefix.prefix, ipaddresses, start, per_page, prefix.is_pool
+        )
+
+        ip_table = tables.IPAddressTable(rows, orderable=False)
         if request.user.has_perm('ipam.change_ipaddress') or request.user.has_perm('ipam.delete_ipaddress'):
             ip_table.base_columns['pk'].visible = True
 
-        paginate = {
-            'klass': EnhancedPaginator,
-            'per_page': request.GET.get('per_page', settings.PAGINATE_COUNT)
-        }
-        RequestConfig(request, paginate).configure(ip_table)
-
         # Compile permissions list for rendering the object table
         permissions = {
             'add': request.user.has_perm('ipam.add_ipaddress'),
@@ -540,6 +618,9 @@ class PrefixIPAddressesView(View):
         return render(request, 'ipam/prefix_ipaddresses.html', {
             'prefix': prefix,
             'ip_table': ip_table,
+            'previous_start': previous_start,
+            'next_start': next_start,
+            'select_all_count': ipaddresses.count() if previous_start or next_start else None,
             'permissions': permissions,
             'bulk_querystring': 'vrf_id={}&parent={}'.format(prefix.vrf or '0', prefix.prefix),
         })
@@ -564,7 +645,7 @@ class PrefixDeleteView(PermissionRequiredMixin, ObjectDeleteView):
     default_return_url = 'ipam:prefix_list'
 
 
-class PrefixBulkImportView(PermissionRequiredMixin, BulkImportView):
+class PrefixBulkImportView(PermissionRequiredMixin, UniqueIPSpaceImportView):
     permission_required = 'ipam.add_prefix'
     model_form = forms.PrefixCSVForm
     table = tables.PrefixTable
@@ -590,6 +671,39 @@ class PrefixBulkDeleteView(PermissionRequiredMixin, BulkDeleteView):
     default_return_url = 'ipam:prefix_list'
 
 
+class IPv4SpaceReportView(View):
+    """
+    Analyze the utilization of an IPv4 prefix (within a VRF or the global table), divided into blocks of a given size.
+    """
+
+    def get(self, request):
+
+        form = forms.IPv4SpaceReportForm(request.GET or None)
+        report = None
+        block_table = None
+
+        if form.is_valid():
+            vrf = form.cleaned_data['vrf_id']
+            parent = form.cleaned_data['parent']
+            space = IPv4Space.load(vrf=vrf, parent=parent)
+            report = space.get_report(parent, form.cleaned_data['prefix_length'], form.cleaned_data['threshold'] or 0)
+            for block in report['blocks']:
+                block['vrf_id'] = vrf.pk if vrf else None
+
+            block_table = tables.IPv4SpaceBlockTable(report['blocks'])
+            paginate = {
+                'klass': EnhancedPaginator,
+                'per_page': request.GET.get('per_page', settings.PAGINATE_COUNT)
+            }
+            RequestConfig(request, paginate).configure(block_table)
+
+        return render(request, 'ipam/ipv4_space_report.html', {
+            'form': form,
+            'report': report,
+            'block_table': block_table,
+        })
+
+
 #
 # IP addresses
 #
@@ -601,6 +715,24 @@ class IPAddressListView(ObjectListView):
     table = tables.IPAddressDetailTable
     template_name = 'ipam/ipaddress_list.html'
 
+    def get(self, request):
+        # Include the parent prefix of each IP in CSV exports only upon request, as it cannot be imported
+        if 'export' not in request.GET or request.GET.get('parent_prefix'):
+            self.queryset = self.queryset.annotate_parent_prefix()
+        return super(IPAddressListView, self).get(request)
+
+    def get_csv_headers(self, request):
+        headers = super(IPAddressListView, self).get_csv_headers(request)
+        if request.GET.get('parent_prefix'):
+            headers = headers + IPAddress.csv_parent_headers
+        return headers
+
+    def get_csv_objects(self, request):
+        # Export IPAddressRecords rather than model instances, unless parent prefixes are to be included
+        if request.GET.get('parent_prefix'):
+            return self.queryset
+        return self.queryset.records()
+
 
 class IPAddressView(View):
 
@@ -674,8 +806,75 @@ class IPAddressBulkCreateView(PermissionRequiredMixin, BulkCreateView):
     template_name = 'ipam/ipaddress_bulk_add.html'
     default_return_url = 'ipam:ipaddress_list'
 
-
-class IPAddressBulkImportView(PermissionRequiredMixin, BulkImportView):
+    def create_objects(self, request, pattern, pattern_form):
+        """
+        Validate the fields shared by all new IPAddresses once, check every expanded address for duplicates with a
+        single query, and create the IPAddresses (and their custom field values) with bulk_create(). All invalid and
+        duplicate addresses are reported.
+        """
+        addresses = list(pattern)
+
+        # Validate the shared fields using the first address. Errors on the address itself are ignored here, as each
+        # address is validated below.
+        model_form = self.model_form(request.POST.copy())
+        model_form.data[self.pattern_target] = addresses[0]
+        model_form.is_valid()
+        if any(field != self.pattern_target for field in model_form.errors):
+            return model_form, None
+        template = model_form.instance
+
+        vrf = template.vrf
+        enforce_unique = (vrf is None and settings.ENFORCE_GLOBAL_UNIQUE) or (vrf is not None and vrf.enforce_unique)
+
+        # Validate each address, and check for addresses repeated within the pattern (if unique IP space is enforced)
+        address_field = model_form.fields[self.pattern_target]
+        fields = {
+            f.attname: getattr(template, f.attname) for f in IPAddress._meta.concrete_fields if not f.primary_key
+        }
+        new_objs = []
+        hosts = set()
+        for value in addresses:
+            try:
+                address = address_field.clean(value)
+            except ValidationError as e:
+                pattern_form.add_error('pattern', ["{}: {}".format(value, message) for message in e.messages])
+                continue
+            if enforce_unique and address.ip in hosts:
+                pattern_form.add_error('pattern', "Duplicate IP address in pattern: {}".format(address))
+                continue
+            hosts.add(address.ip)
+            new_objs.append(IPAddress(**dict(fields, address=address, family=address.version)))
+
+        # Check for existing duplicates (if unique IP space is enforced)
+        if hosts and enforce_unique:
+            duplicates = IPAddress.objects.filter(vrf=vrf, host__in=[str(host) for host in hosts])
+            for duplicate in duplicates:
+                pattern_form.add_error('pattern', "Duplicate IP address found in {}: {}".format(
+                    "VRF {}".format(vrf) if vrf else "global table", duplicate
+                ))
+
+        if pattern_form.errors:
+            return model_form, None
+
+        IPAddress.objects.bulk_create(new_objs)
+
+        # Save custom field values for all new IPAddresses
+        custom_field_values = []
+        for field_name in model_form.custom_fields:
+            value = model_form.cleaned_data[field_name]
+            if value in [None, '']:
+                continue
+            custom_field = model_form.fields[field_name].model
+            serialized_value = custom_field.serialize_value(value)
+            custom_field_values.extend(CustomFieldValue(
+                field=custom_field, obj_type=model_form.obj_type, obj_id=obj.pk, serialized_value=serialized_value
+            ) for obj in new_objs)
+        CustomFieldValue.objects.bulk_create(custom_field_values)
+
+        return model_form, new_objs
+
+
+class IPAddressBulkImportView(PermissionRequiredMixin, UniqueIPSpaceImportView):
     permission_required = 'ipam.add_ipaddress'
     model_form = forms.IPAddressCSVForm
     table = tables.IPAddressTable
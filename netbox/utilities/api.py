@@ -5,7 +5,7 @@ from django.contrib.contenttypes.models import ContentType
 
 from rest_framework import authentication, exceptions
 from rest_framework.compat import is_authenticated
-from rest_framework.exceptions import APIException
+from rest_framework.exceptions import APIException, ParseError
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import BasePermission, DjangoModelPermissions, SAFE_METHODS
 from rest_framework.serializers import Field, ModelSerializer, ValidationError
@@ -222,3 +222,19 @@ def get_view_name(view_cls, suffix=None):
         return name
 
     return drf_get_view_name(view_cls, suffix)
+
+
+def get_requested_count(request):
+    """
+    Return the number of objects to be created as requested by the `count` query parameter (default 1). Raise a
+    ParseError (400) if the count is not a positive integer, or if it exceeds MAX_PAGE_SIZE.
+    """
+    try:
+        count = int(request.query_params.get('count', 1))
+    except ValueError:
+        count = 0
+    if count < 1:
+        raise ParseError("The count must be a positive integer.")
+    if settings.MAX_PAGE_SIZE and count > settings.MAX_PAGE_SIZE:
+        raise ParseError("The count may not exceed {}.".format(settings.MAX_PAGE_SIZE))
+    return count
@@ -102,9 +102,9 @@ class ObjectListView(View):
                                .format(et.name))
         # Fall back to built-in CSV export
         elif 'export' in request.GET and hasattr(model, 'to_csv'):
-            headers = getattr(model, 'csv_headers', None)
+            headers = self.get_csv_headers(request)
             output = ','.join(headers) + '\n' if headers else ''
-            output += '\n'.join([obj.to_csv() for obj in self.queryset])
+            output += '\n'.join([obj.to_csv() for obj in self.get_csv_objects(request)])
             response = HttpResponse(
                 output,
                 content_type='text/csv'
@@ -132,6 +132,9 @@ class ObjectListView(View):
         }
         RequestConfig(request, paginate).configure(table)
 
+        # Provide a hook to annotate the objects displayed on the current page
+        self.annotate_page(request, [row.record for row in table.page.object_list])
+
         context = {
             'table': table,
             'permissions': permissions,
@@ -146,6 +149,19 @@ class ObjectListView(View):
         # .all() is necessary to avoid caching queries
         return self.queryset.all()
 
+    def annotate_page(self, request, objects):
+        pass
+
+    def get_csv_headers(self, request):
+        return getattr(self.queryset.model, 'csv_headers', None)
+
+    def get_csv_objects(self, request):
+        """
+        Provide a hook to substitute the objects exported as CSV, each of which must provide a to_csv() method (e.g. to
+        export lightweight records in place of model instances).
+        """
+        return self.queryset
+
     def extra_context(self):
         return {}
 
@@ -326,30 +342,14 @@ class BulkCreateView(View):
         if pattern_form.is_valid():
 
             pattern = pattern_form.cleaned_data['pattern']
-            new_objs = []
 
             try:
                 with transaction.atomic():
 
-                    # Create objects from the expanded. Abort the transaction on the first validation error.
-                    for value in pattern:
-
-                        # Reinstantiate the model form each time to avoid overwriting the same instance. Use a mutable
-                        # copy of the POST QueryDict so that we can update the target field value.
-                        model_form = self.model_form(request.POST.copy())
-                        model_form.data[self.pattern_target] = value
-
-                        # Validate each new object independently.
-                        if model_form.is_valid():
-                            obj = model_form.save()
-                            new_objs.append(obj)
-                        else:
-                            # Copy any errors on the pattern target field to the pattern form.
-                            errors = model_form.errors.as_data()
-                            if errors.get(self.pattern_target):
-                                pattern_form.add_error('pattern', errors[self.pattern_target])
-                            # Raise an IntegrityError to break the for loop and abort the transaction.
-                            raise IntegrityError()
+                    model_form, new_objs = self.create_objects(request, pattern, pattern_form)
+                    if new_objs is None:
+                        # Raise an IntegrityError to abort the transaction.
+                        raise IntegrityError()
 
                     # If we make it to this point, validation has succeeded on all new objects.
                     msg = "Added {} {}".format(len(new_objs), model._meta.verbose_name_plural)
@@ -370,6 +370,34 @@ class BulkCreateView(View):
             'return_url': reverse(self.default_return_url),
         })
 
+    def create_objects(self, request, pattern, pattern_form):
+        """
+        Create an object from each value of the expanded pattern. Return the model form to be displayed along with the
+        list of new objects, or None if validation failed (in which case the transaction is aborted).
+        """
+        new_objs = []
+
+        # Create objects from the expanded. Abort on the first validation error.
+        for value in pattern:
+
+            # Reinstantiate the model form each time to avoid overwriting the same instance. Use a mutable copy of the
+            # POST QueryDict so that we can update the target field value.
+            model_form = self.model_form(request.POST.copy())
+            model_form.data[self.pattern_target] = value
+
+            # Validate each new object independently.
+            if model_form.is_valid():
+                obj = model_form.save()
+                new_objs.append(obj)
+            else:
+                # Copy any errors on the pattern target field to the pattern form.
+                errors = model_form.errors.as_data()
+                if errors.get(self.pattern_target):
+                    pattern_form.add_error('pattern', errors[self.pattern_target])
+                return model_form, None
+
+        return model_form, new_objs
+
 
 class BulkImportView(View):
     """
@@ -395,12 +423,26 @@ class BulkImportView(View):
 
         return ImportForm(*args, **kwargs)
 
+    def _get_obj_form(self, data):
+        """
+        Provide a hook to modify the model form bound to each row of CSV data before it is validated.
+        """
+        return self.model_form(data)
+
     def _save_obj(self, obj_form):
         """
         Provide a hook to modify the object immediately before saving it (e.g. to encrypt secret data).
         """
         return obj_form.save()
 
+    def _validate_objs(self, obj_forms):
+        """
+        Provide a hook to validate all imported objects together once each has been saved (e.g. to check them for
+        duplicates with a single query). Errors should be added to the individual forms, in which case the import is
+        rolled back.
+        """
+        pass
+
     def get(self, request):
 
         return render(request, self.template_name, {
@@ -421,16 +463,26 @@ class BulkImportView(View):
 
                 # Iterate through CSV data and bind each row to a new model form instance.
                 with transaction.atomic():
+                    obj_forms = []
                     for row, data in enumerate(form.cleaned_data['csv'], start=1):
-                        obj_form = self.model_form(data)
+                        obj_form = self._get_obj_form(data)
                         if obj_form.is_valid():
                             obj = self._save_obj(obj_form)
                             new_objs.append(obj)
+                            obj_forms.append(obj_form)
                         else:
                             for field, err in obj_form.errors.items():
                                 form.add_error('csv', "Row {} {}: {}".format(row, field, err[0]))
                             raise ValidationError("")
 
+                    # Validate the imported objects together
+                    self._validate_objs(obj_forms)
+                    for row, obj_form in enumerate(obj_forms, start=1):
+                        for field, err in obj_form.errors.items():
+                            form.add_error('csv', "Row {} {}: {}".format(row, field, err[0]))
+                    if form.errors:
+                        raise ValidationError("")
+
                 # Compile a table containing the imported objects
                 obj_table = self.table(new_objs)
 